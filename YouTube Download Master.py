@@ -18,35 +18,74 @@
 ╚══════════════════════════════════════════════════════════════════════════════╝
 
 REQUIREMENTS / ТРЕБОВАНИЯ:
-  - Python 3.7+
+  - Python 3.8+
   - yt-dlp (pip install yt-dlp)
   - ffmpeg in PATH
   - [optional] pywin32 for better dialogs: pip install pywin32
 
 RUN / ЗАПУСК:
   python youtube_channel_downloader.py
+  python youtube_channel_downloader.py URL -m channel -o DIR    (headless / без GUI, см. --help)
 """
 
 import os
 import sys
+import signal
+import argparse
 import re
 import json
+import time
+import shlex
+import shutil
+import queue
+import random
+import asyncio
+import http.server
+import codecs
+import hashlib
 import subprocess
 import threading
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-from tkinter import font as tkfont
+import collections
 from pathlib import Path
 
+# tkinter загружается только для окна приложения (см. load_tkinter):
+# консольный режим и DownloadEngine работают без него
+tk = ttk = messagebox = scrolledtext = tkfont = None
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  КОНСТАНТЫ
 # ══════════════════════════════════════════════════════════════════════════════
 
+# ProcessSupervisor запускает процессы из цикла asyncio в фоновом потоке: это
+# работает с 3.8 (ThreadedChildWatcher в Unix, ProactorEventLoop в Windows)
+MIN_PYTHON = (3, 8)
+
 CONFIG_FILE = Path.home() / ".youtube_downloader_config.json"
+JOBS_FILE = Path.home() / ".youtube_downloader_jobs.json"
+
+# Кэш (списки роликов каналов/плейлистов и т.п.)
+CACHE_DIR = Path.home() / ".youtube_downloader_cache"
+LISTING_CACHE_DIR = CACHE_DIR / "listings"
+LISTING_FULL_REFRESH_INTERVAL = 7 * 24 * 3600  # полное перечисление канала раз в неделю
+# Ответы yt-dlp о роликах (info JSON): ссылки на потоки YouTube действуют около 6 часов
+INFO_CACHE_DIR = CACHE_DIR / "info"
+INFO_CACHE_TTL = 4 * 3600
+# Содержимое папок медиатеки по mtime папки (повторная сверка архива не перечитывает неизменные папки)
+LIBRARY_CACHE_DIR = CACHE_DIR / "library"
+
+# Команды запуска yt-dlp и ffmpeg (бенчмарки подменяют их заглушками из benchmarks/)
+YTDLP_COMMAND = ["yt-dlp"]
+FFMPEG_COMMAND = ["ffmpeg"]
 
 # Флаги для subprocess (Windows: скрыть консоль)
 SUBPROCESS_FLAGS = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+# Процессы загрузки запускаются в своей группе: при остановке завершается всё
+# дерево — yt-dlp вместе с запущенными им ffmpeg и aria2c
+if sys.platform == 'win32':
+    PROCESS_GROUP_KWARGS = {"creationflags": SUBPROCESS_FLAGS | subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    PROCESS_GROUP_KWARGS = {"start_new_session": True}
 
 # Кроссплатформенные шрифты
 FONT_FAMILY = ('Segoe UI', 'Helvetica', 'Arial', 'sans-serif')
@@ -57,25 +96,114 @@ SUBPROCESS_TIMEOUT = 15  # секунд для проверки зависимо
 PROCESS_TERMINATE_TIMEOUT = 3  # секунд на graceful termination
 PROCESS_KILL_TIMEOUT = 2  # секунд на принудительное завершение
 
-# Константы для режима restart
-MAX_CONSECUTIVE_EMPTY_RUNS = 3  # Количество пустых запусков перед остановкой
+# Параллельные загрузки (каналы/плейлисты)
+MAX_PARALLEL_DOWNLOADS = 8
+# Адаптивное число воркеров: окно оценки скорости (сек), прирост скорости
+# для добавления воркера, минимальный интервал между снижениями (сек)
+ADAPTIVE_WINDOW = 15
+ADAPTIVE_GAIN = 1.10
+ADAPTIVE_BACKOFF_INTERVAL = 5
+ADAPTIVE_DECISIONS_SHOWN = 6
+
+# Максимальное число одновременно выполняемых заданий очереди
+MAX_CONCURRENT_JOBS = 4
 
 # Лимит строк в логе (для экономии памяти)
 LOG_MAX_LINES = 5000
 
-# Предкомпилированные regex для парсинга прогресса
+# Буфер лога: UI забирает накопленные строки пачкой с фиксированной частотой
+LOG_REFRESH_MS = 66  # ~15 обновлений в секунду
+LOG_SINK_CAPACITY = 20000  # при переполнении отбрасываются самые старые строки
+LOG_MAX_LINES_PER_FRAME = 2000
+
+# Журнал событий (JSONL): файл ротируется по размеру, хранится EVENT_LOG_BACKUPS старых
+EVENT_LOG_DIR = Path.home() / ".youtube_downloader_logs"
+EVENT_LOG_NAME = "events.jsonl"
+EVENT_LOG_MAX_BYTES = 10 * 1024 * 1024
+EVENT_LOG_BACKUPS = 5
+EVENT_LOG_BUFFER = 64 * 1024
+EVENT_LOG_FLUSH_INTERVAL = 1.0  # секунд: дольше события в буфере не задерживаются
+
+# Отчёт о сеансе: скорость считается по интервалам THROUGHPUT_INTERVAL секунд
+REPORT_DIR = EVENT_LOG_DIR / "reports"
+THROUGHPUT_INTERVAL = 5
+REPORT_SLOWEST = 5
+REPORT_HISTOGRAM_BOUNDS = (10, 30, 60, 120, 300, 600)  # секунд на ролик
+REPORT_HISTOGRAM_WIDTH = 30
+# Планирование: процессов yt-dlp, выбирающих форматы одновременно, и отчётов для оценки скорости
+PLAN_WORKERS = 4
+PLAN_RECENT_REPORTS = 5
+
+# Метрики Prometheus: по умолчанию сервер доступен только с этой машины
+METRICS_HOST = "127.0.0.1"
+METRICS_LIMITS = {
+    "metrics_port": (0, 65535),  # 0 — сервер метрик выключен
+}
+
+# Свободное место в папке загрузки: ниже порога новые ролики не начинаются
+DISK_LIMITS = {
+    "min_free_space": (0, 1024),  # ГиБ, 0 — не следить
+}
+DISK_CHECK_INTERVAL = 10  # секунд между проверками свободного места
+# Ошибки записи из-за нехватки места (Linux/macOS и Windows)
+DISK_FULL_PATTERNS = ("no space left on device", "not enough space on the disk")
+
+# Машиночитаемый прогресс: yt-dlp печатает JSON-объект на каждый тик загрузки
+PROGRESS_EVENT_PREFIX = "[ytdm] "
+PROGRESS_TEMPLATE = "download:" + PROGRESS_EVENT_PREFIX + (
+    '{"status":%(progress.status|null)j'
+    ',"downloaded_bytes":%(progress.downloaded_bytes|null)j'
+    ',"total_bytes":%(progress.total_bytes|null)j'
+    ',"total_bytes_estimate":%(progress.total_bytes_estimate|null)j'
+    ',"speed":%(progress.speed|null)j'
+    ',"eta":%(progress.eta|null)j'
+    ',"fragment_index":%(progress.fragment_index|null)j'
+    ',"fragment_count":%(progress.fragment_count|null)j'
+    ',"filename":%(progress.filename|null)j'
+    ',"text":%(progress._default_template|null)j'
+    ',"id":%(info.id|null)j'
+    ',"playlist_index":%(info.playlist_index|null)j}'
+)
+
+# Счётчик позиции в плейлисте: "[download] Downloading item 3 of 10"
+ITEM_LINE_PREFIXES = ('[download] Downloading item ', '[download] Downloading video ')
 PROGRESS_REGEX = re.compile(r'[Dd]ownloading\s+(?:item|video)\s+(\d+)\s+of\s+(\d+)')
 
-# Паттерны реально скачанного контента
-DOWNLOAD_COMPLETE_PATTERNS = [
-    '[download] 100%',
-    'has already been downloaded',
-]
+# Вехи, которые yt-dlp сообщает только текстом (без события прогресса)
+ALREADY_DOWNLOADED_SUFFIX = 'has already been downloaded'
+ARCHIVE_SKIP_SUFFIX = 'has already been recorded in the archive'
 
-# Паттерны пропуска из-за архива (НЕ считается как новое скачивание)
-ARCHIVE_SKIP_PATTERNS = [
-    'has already been recorded in the archive'
-]
+# Этапы ролика после загрузки: склейка форматов и прочая постобработка yt-dlp
+MERGER_PREFIX = '[Merger] '
+POSTPROCESSOR_PREFIXES = ('[ExtractAudio]', '[Fixup', '[Metadata]', '[EmbedThumbnail]', '[EmbedSubtitle]',
+                          '[VideoConvertor]', '[VideoRemuxer]', '[ThumbnailsConvertor]', '[SponsorBlock]',
+                          '[ModifyChapters]', '[SplitChapters]')
+
+# Строка состояния внешнего загрузчика aria2c:
+# "[#2089b0 400.0KiB/33.2MiB(1%) CN:8 DL:1.2MiB ETA:27s]"
+ARIA2C_READOUT_REGEX = re.compile(
+    r'^\[#\w+ (?P<done>[\d.]+[KMGT]?i?B)/(?P<total>[\d.]+[KMGT]?i?B)(?:\((?P<percent>\d+)%\))?'
+    r' CN:(?P<connections>\d+)(?: DL:(?P<speed>[\d.]+[KMGT]?i?B))?(?: ETA:(?P<eta>[\dhms]+))?\]')
+ARIA2C_SIZE_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3, 'TiB': 1024 ** 4}
+
+# Виды строк вывода yt-dlp (см. classify_output_line)
+LINE_TEXT = "text"
+LINE_PROGRESS = "progress"
+LINE_ITEM = "item"
+LINE_ALREADY = "already"
+LINE_ARCHIVE_SKIP = "archive_skip"
+
+# Итог обработки строки для логики загрузки
+OUTPUT_COMPLETE = "complete"
+OUTPUT_SKIP = "skip"
+
+
+def load_tkinter():
+    """Импортировать tkinter (только при запуске GUI)."""
+    global tk, ttk, messagebox, scrolledtext, tkfont
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext
+    from tkinter import font as tkfont
 
 
 def get_available_font(preferred_fonts, size, style=''):
@@ -173,8 +301,44 @@ TRANSLATIONS = {
         
         # Опции
         "options_label": "⚙️ Опции:",
+        "performance_label": "🚀 Производительность:",
+        "performance_auto": "авто (по качеству видео)",
+        "concurrent_fragments_label": "Фрагментов одновременно:",
+        "http_chunk_size_label": "HTTP-блок (МиБ, 0 — нет):",
+        "buffer_size_label": "буфер (КиБ, 0 — по умолчанию):",
+        "performance_hint": "Ускоряет скачивание одного большого ролика (4K/8K): части файла загружаются параллельно",
+        "external_downloader": "aria2c (несколько соединений на файл)",
+        "aria2_connections_label": "соединений:",
+        "aria2_split_size_label": "часть от (МиБ):",
+        "aria2c_unavailable": "⚠️ aria2c не найден в PATH — используется встроенный загрузчик yt-dlp",
+        "aria2c_found": "  ✅ aria2c: ",
+        "aria2c_not_found": "  ℹ️ aria2c: не установлен (необязательно — загрузка в несколько соединений)",
+        "audio_pipeline": "Перекодировать параллельно со следующей загрузкой",
+        "transcode_workers_label": "процессов ffmpeg (0 — по числу ядер):",
+        "transcode_done": "🎛 Перекодировано: {name} ({seconds:.1f} с)",
+        "transcode_failed": "❌ Ошибка перекодирования {name}: {error}",
+        "transcode_waiting": "⏳ Ожидание перекодирования: {count} файл(ов)",
+        "transcode_failed_total": "⚠️ Не удалось перекодировать файлов: {count} (скачанные файлы оставлены в папке)",
+        "media_library_label": "🎞 Медиатека (папка с уже скачанными видео, необязательно):",
+        "media_library_hint": "Аудио роликов, которые уже есть в медиатеке, извлекается локально — без повторной загрузки",
+        "library_not_found": "⚠️ Папка медиатеки не найдена: {path} — все ролики будут скачаны",
+        "library_scanned": "🎞 Медиатека: файлов {files}, найдено роликов {found} из {pending} — аудио извлекается локально ({seconds:.1f} с)",
         "restart_each_video": "🔄 Перезапускать процесс после каждого ролика",
         "restart_each_video_hint": "(помогает при долгих загрузках и ошибках соединения)",
+        "embedded_engine": "🧩 Встроенный движок yt-dlp (Python-модуль)",
+        "embedded_engine_hint": "(без запуска процесса и повторного сканирования на каждый ролик)",
+        "parallel_downloads": "⚡ Параллельных загрузок:",
+        "parallel_downloads_hint": "(для каналов и плейлистов; 1 — по очереди)",
+        "adaptive_parallel": "авто",
+        "adaptive_parallel_hint": "(подбирать число загрузок по скорости, не больше указанного)",
+        "archive_backend_label": "📜 Индекс архива:",
+        "archive_backend_text": "в памяти (archive.txt)",
+        "archive_backend_sqlite": "SQLite (archive.sqlite3 + archive.txt)",
+        "retry_attempts_label": "🔄 Повторов в yt-dlp:",
+        "retry_max_sleep_label": "пауза до (сек):",
+        "retry_budget_label": "бюджет повторов:",
+        "breaker_cooldown_label": "пауза при 429 (сек):",
+        "min_free_space_label": "мин. свободно (ГиБ):",
         
         # Поля ввода
         "url_label_channel": "🔗 URL канала:",
@@ -193,6 +357,46 @@ TRANSLATIONS = {
         "start_btn": "▶️  НАЧАТЬ ЗАГРУЗКУ",
         "stop_btn": "⏹️  ОСТАНОВИТЬ",
         "clear_log_btn": "🗑️  Очистить лог",
+        "event_log_check": "📝 Журнал событий (JSONL)",
+        "event_log_error": "⚠️ Журнал событий не записан ({path}): {error}",
+        "report_title": "📊 Отчёт о сеансе",
+        "report_volume": "   Скачано: {size} за {duration} • роликов: {videos}, с ошибкой: {failed}, пропущено: {skipped}",
+        "report_speed": "   Скорость: средняя {average}/s, пиковая {peak}/s",
+        "report_phases": "   Время: перечисление {enumeration} • загрузка {download} • склейка {merge} • "
+                         "постобработка {postprocess} • перекодирование {transcode}",
+        "report_hint_network": "   ⇒ Больше всего времени уходит на загрузку — ограничивает сеть (или YouTube)",
+        "report_hint_disk": "   ⇒ Больше всего времени уходит на склейку форматов — ограничивает диск",
+        "report_hint_cpu": "   ⇒ Больше всего времени уходит на постобработку и перекодирование — ограничивает процессор",
+        "report_info_cache": "   Кэш info JSON: из кэша {hits}, извлечено заново {misses}",
+        "report_histogram": "   Время на ролик:",
+        "report_slowest": "   Самые долгие ролики:",
+        "report_saved": "   Отчёт сохранён: {path}",
+        "report_save_error": "⚠️ Отчёт не сохранён: {error}",
+        "plan_btn": "🧮 Оценить",
+        "plan_title": "🧮 План загрузки (ничего не скачивается)",
+        "plan_nothing": "✅ Всё уже в архиве — скачивать нечего",
+        "plan_resolving": "🔎 Выбор форматов: роликов {count}, процессов yt-dlp одновременно: {workers}...",
+        "plan_result": "   Ожидаемый объём: {size} • длительность роликов: {duration} • роликов: {resolved}, "
+                       "без известного размера: {unknown}, с ошибкой: {failed}",
+        "plan_cached": "   Из кэша: {cached}, извлечено: {extracted} за {seconds:.1f} с",
+        "plan_eta": "   ⏱️ Оценка времени: {eta} при {rate}/s (средняя скорость последних сеансов)",
+        "plan_eta_unknown": "   ⏱️ Время не оценить: ещё нет отчётов о сеансах с измеренной скоростью",
+        "scan_archive_btn": "🔍 Сверить архив",
+        "archive_scan_title": "🔍 Сверка архива с файлами в {path} (без обращения к сети)",
+        "archive_scan_stats": "   Папок: {dirs} (без изменений: {reused}), файлов: {files} — за {seconds:.1f} с",
+        "archive_scan_result": "   Роликов на диске: {disk}, в архиве: {archived} • нет в архиве: {unrecorded}, "
+                               "в архиве, но нет на диске: {missing}",
+        "archive_scan_partials": "🧩 Недокачанных файлов: {count} ({size}), у {stale} из них ролик уже скачан — "
+                                 "их можно удалить",
+        "archive_scan_more": "   ...и ещё {count}",
+        "archive_scan_verified": "ℹ️ Архив не изменён (только проверка)",
+        "archive_scan_added": "✅ Добавлено в архив: {count}",
+        "archive_scan_rebuilt": "✅ Архив пересобран по файлам на диске: записей {count}",
+        "archive_scan_no_folder": "❌ Папка не найдена: {path}",
+        "metrics_port_label": "📈 Метрики, порт:",
+        "metrics_port_hint": "(0 — выкл.)",
+        "metrics_started": "📈 Метрики Prometheus: {url}",
+        "metrics_error": "⚠️ Сервер метрик не запущен ({address}): {error}",
         "update_ytdlp_btn": "🔄 Обновить до master",
         
         # Статус зависимостей
@@ -206,6 +410,7 @@ TRANSLATIONS = {
         # Лог
         "log_frame": "📋 Лог выполнения",
         "welcome_line2": "Выбор качества • Без лишнего перекодирования",
+        "log_lines_dropped": "… пропущено строк лога: {count}",
         
         # Счётчик прогресса
         "progress_label": "📊 Прогресс:",
@@ -224,6 +429,8 @@ TRANSLATIONS = {
         "pywin32_found": "  ✅ pywin32: установлен (диалоги через COM API)",
         "pywin32_not_found": "  ⚠️ pywin32: не установлен",
         "pywin32_install_hint": "     Для лучших диалогов: pip install pywin32",
+        "ytdlp_module_found": "  ✅ yt_dlp (модуль Python): встроенный движок доступен",
+        "ytdlp_module_not_found": "  ⚠️ yt_dlp (модуль Python): не установлен, встроенный движок недоступен",
         
         # Обновление yt-dlp
         "updating_ytdlp": "🔄 Обновление yt-dlp до master...",
@@ -255,6 +462,7 @@ TRANSLATIONS = {
         "starting_download": "▶️  Запуск загрузки...",
         "stopping_download": "⏹️  Остановка загрузки...",
         "stop_hint": "   При следующем запуске загрузка продолжится с того же места",
+        "stopping_processes": "⏹ Остановка: завершается процессов: {count}",
         "download_success": "✅ ЗАГРУЗКА УСПЕШНО ЗАВЕРШЕНА!",
         "download_exit_code": "⚠️ Процесс завершился с кодом: ",
         "download_exit_hint": "   Это может быть нормально если часть видео уже была скачана",
@@ -276,9 +484,66 @@ TRANSLATIONS = {
         "setting_bitrate": "  📊 Битрейт:    ",
         "setting_order": "  📊 Порядок:    старые → новые (playlist_reverse)",
         "setting_order_single": "  📊 Порядок:    не применимо (один файл)",
-        "setting_retries": "  🔄 Ретраи:     infinite (пауза 5 сек между попытками)",
+        "setting_retries": "  🔄 Ретраи:     {attempts} внутри yt-dlp (пауза до {max_sleep} сек), повторов роликов — до {budget}",
         "setting_restart": "  🔁 Рестарт:    после каждого ролика",
         "setting_no_restart": "  🔁 Рестарт:    выключен (один процесс)",
+        "setting_engine_embedded": "  🧩 Движок:     встроенный (yt_dlp API, изоляция ошибок по роликам)",
+        "embedded_engine_unavailable": "⚠️ Модуль yt_dlp не установлен — используется внешний процесс yt-dlp",
+        "setting_parallel": "  ⚡ Параллельно: {count} загрузок (список сканируется один раз)",
+        "setting_adaptive": "  ⚙️ Авто:       число загрузок подбирается по скорости (1–{maximum})",
+        "setting_performance": "  🚀 Фрагменты:  {fragments} одновременно, HTTP-блок {chunk}, буфер {buffer}{auto}",
+        "performance_auto_suffix": " (авто)",
+        "setting_aria2c": "  🧲 Загрузчик:  aria2c, {connections} соединений на файл, части от {split} МиБ",
+        "setting_audio_pipeline": "  🎛 Перекодирование: параллельно загрузке, процессов ffmpeg: {workers}",
+        "setting_library": "  🎞 Медиатека:  ",
+        "enumerating": "🔎 Сканирование списка роликов...",
+        "enumerated": "📋 Найдено роликов: {total}, уже в архиве: {archived}, к загрузке: {pending}",
+        "enumerate_empty": "⚠️ Не удалось получить список роликов",
+        "listing_full": "🔎 Полное сканирование списка: {seconds:.1f} с",
+        "listing_incremental": "⚡ Список из кэша: {cached} роликов, новых: {new} ({seconds:.1f} с)",
+        "cli_next_run": "⏰ Следующая синхронизация через {minutes:g} мин",
+        "retry_scheduled": "🔄 Повтор #{attempt} через {seconds} сек (ошибка: {kind}, осталось повторов: {remaining})",
+        "retry_budget_exhausted": "⚠️ Исчерпан бюджет повторов ({budget}) — неудачные ролики больше не повторяются",
+        "breaker_open": "⛔ YouTube ограничивает запросы — пауза всех загрузок на {seconds} сек",
+        "breaker_closed": "✅ Ограничение снято — загрузки продолжаются",
+        "disk_paused": "💾 На диске осталось {free} (порог {minimum}) — новые ролики не начинаются, пока место не освободится",
+        "disk_resumed": "✅ На диске снова {free} — загрузка продолжается",
+        "disk_space_short": "На диске папки загрузки свободно {free}, а загрузке, по оценке, нужно около "
+                            "{needed} (плюс {minimum} запаса).",
+        "disk_space_low": "На диске папки загрузки свободно {free} — меньше порога {minimum}. "
+                          "Загрузка будет ждать, пока место не освободится.",
+        "disk_space_confirm": "\n\nПродолжить?",
+        "adaptive_up": "⚙️ Загрузок: {old} → {new} (скорость растёт: {rate}/s)",
+        "adaptive_down": "⚙️ Загрузок: {old} → {new} (YouTube ограничивает запросы)",
+        "adaptive_status": "загрузок {limit}/{maximum}  •  {rate}/s  •  решения: {decisions}",
+        
+        # Очередь заданий
+        "queue_frame": "📋 Очередь заданий",
+        "queue_col_priority": "Приоритет",
+        "queue_col_status": "Статус",
+        "queue_col_mode": "Режим",
+        "job_status_pending": "⏳ ожидает",
+        "job_status_running": "⬇️ загрузка",
+        "job_status_done": "✅ готово",
+        "job_status_failed": "❌ ошибка",
+        "queue_priority": "Приоритет:",
+        "queue_concurrency": "Одновременно:",
+        "queue_add_btn": "➕ В очередь",
+        "queue_import_btn": "📂 Из файла...",
+        "queue_remove_btn": "🗑️ Удалить",
+        "queue_clear_btn": "🧹 Убрать завершённые",
+        "queue_run_btn": "▶️ Запустить очередь",
+        "queue_hint": "Каждое задание хранит свои настройки. Файл: по строке на URL, опции key=value (mode, quality, outdir, priority...)",
+        "select_jobs_file_title": "Выберите файл со списком заданий",
+        "job_added": "➕ Задание #{id} добавлено в очередь: {url}",
+        "jobs_imported": "📂 Добавлено заданий из файла: {count}",
+        "jobs_import_error": "❌ Ошибка в файле заданий: {error}",
+        "queue_empty": "ℹ️ В очереди нет ожидающих заданий",
+        "job_started": "▶️ Задание #{id}: {mode} — {url}",
+        "job_finished_ok": "✅ Задание #{id} завершено",
+        "job_finished_failed": "❌ Задание #{id} завершилось с ошибкой",
+        "queue_done": "🏁 Очередь выполнена: успешно {done}, с ошибками {failed}",
+        "parallel_failed": "⚠️ Не удалось скачать роликов: {count} (будут повторены при следующем запуске)",
         "audio_no_compression": " (без сжатия)",
         
         # Структура папок
@@ -360,8 +625,44 @@ TRANSLATIONS = {
         
         # Options
         "options_label": "⚙️ Options:",
+        "performance_label": "🚀 Performance:",
+        "performance_auto": "auto (by video quality)",
+        "concurrent_fragments_label": "Fragments at once:",
+        "http_chunk_size_label": "HTTP chunk (MiB, 0 — off):",
+        "buffer_size_label": "buffer (KiB, 0 — default):",
+        "performance_hint": "Speeds up a single large video (4K/8K): parts of the file are downloaded in parallel",
+        "external_downloader": "aria2c (several connections per file)",
+        "aria2_connections_label": "connections:",
+        "aria2_split_size_label": "part from (MiB):",
+        "aria2c_unavailable": "⚠️ aria2c not found in PATH — using the built-in yt-dlp downloader",
+        "aria2c_found": "  ✅ aria2c: ",
+        "aria2c_not_found": "  ℹ️ aria2c: not installed (optional — multi-connection downloads)",
+        "audio_pipeline": "Transcode in parallel with the next download",
+        "transcode_workers_label": "ffmpeg processes (0 — one per core):",
+        "transcode_done": "🎛 Transcoded: {name} ({seconds:.1f} s)",
+        "transcode_failed": "❌ Transcoding failed for {name}: {error}",
+        "transcode_waiting": "⏳ Waiting for transcoding: {count} file(s)",
+        "transcode_failed_total": "⚠️ Files not transcoded: {count} (downloaded files left in the folder)",
+        "media_library_label": "🎞 Media library (folder with already downloaded videos, optional):",
+        "media_library_hint": "Audio of videos already in the library is extracted locally — without downloading again",
+        "library_not_found": "⚠️ Media library folder not found: {path} — all videos will be downloaded",
+        "library_scanned": "🎞 Media library: {files} files, {found} of {pending} videos found — extracting audio locally ({seconds:.1f} s)",
         "restart_each_video": "🔄 Restart process after each video",
         "restart_each_video_hint": "(helps with long downloads and connection errors)",
+        "embedded_engine": "🧩 Embedded yt-dlp engine (Python module)",
+        "embedded_engine_hint": "(no new process and no re-scan for every video)",
+        "parallel_downloads": "⚡ Parallel downloads:",
+        "parallel_downloads_hint": "(for channels and playlists; 1 — one by one)",
+        "adaptive_parallel": "auto",
+        "adaptive_parallel_hint": "(tune the download count by throughput, up to this number)",
+        "archive_backend_label": "📜 Archive index:",
+        "archive_backend_text": "in memory (archive.txt)",
+        "archive_backend_sqlite": "SQLite (archive.sqlite3 + archive.txt)",
+        "retry_attempts_label": "🔄 yt-dlp retries:",
+        "retry_max_sleep_label": "pause up to (sec):",
+        "retry_budget_label": "retry budget:",
+        "breaker_cooldown_label": "pause on 429 (sec):",
+        "min_free_space_label": "min free (GiB):",
         
         # Input fields
         "url_label_channel": "🔗 Channel URL:",
@@ -380,6 +681,46 @@ TRANSLATIONS = {
         "start_btn": "▶️  START DOWNLOAD",
         "stop_btn": "⏹️  STOP",
         "clear_log_btn": "🗑️  Clear log",
+        "event_log_check": "📝 Event log (JSONL)",
+        "event_log_error": "⚠️ Event log was not written ({path}): {error}",
+        "report_title": "📊 Session report",
+        "report_volume": "   Downloaded: {size} in {duration} • videos: {videos}, failed: {failed}, skipped: {skipped}",
+        "report_speed": "   Throughput: average {average}/s, peak {peak}/s",
+        "report_phases": "   Time: enumeration {enumeration} • download {download} • merge {merge} • "
+                         "post-processing {postprocess} • transcoding {transcode}",
+        "report_hint_network": "   ⇒ Most time goes to downloading — limited by the network (or YouTube)",
+        "report_hint_disk": "   ⇒ Most time goes to merging formats — limited by the disk",
+        "report_hint_cpu": "   ⇒ Most time goes to post-processing and transcoding — limited by the CPU",
+        "report_info_cache": "   Info JSON cache: hits {hits}, misses {misses}",
+        "report_histogram": "   Time per video:",
+        "report_slowest": "   Slowest videos:",
+        "report_saved": "   Report saved: {path}",
+        "report_save_error": "⚠️ Report was not saved: {error}",
+        "plan_btn": "🧮 Estimate",
+        "plan_title": "🧮 Download plan (nothing is downloaded)",
+        "plan_nothing": "✅ Everything is already in the archive — nothing to download",
+        "plan_resolving": "🔎 Resolving formats: {count} videos, {workers} yt-dlp processes at once...",
+        "plan_result": "   Expected size: {size} • total duration: {duration} • videos: {resolved}, "
+                       "size unknown: {unknown}, failed: {failed}",
+        "plan_cached": "   From cache: {cached}, extracted: {extracted} in {seconds:.1f} s",
+        "plan_eta": "   ⏱️ Estimated time: {eta} at {rate}/s (average of recent sessions)",
+        "plan_eta_unknown": "   ⏱️ Time cannot be estimated: no session reports with measured throughput yet",
+        "scan_archive_btn": "🔍 Check archive",
+        "archive_scan_title": "🔍 Checking the archive against files in {path} (no network requests)",
+        "archive_scan_stats": "   Folders: {dirs} (unchanged: {reused}), files: {files} — in {seconds:.1f} s",
+        "archive_scan_result": "   Videos on disk: {disk}, in archive: {archived} • not in archive: {unrecorded}, "
+                               "in archive but not on disk: {missing}",
+        "archive_scan_partials": "🧩 Partial files: {count} ({size}), {stale} of them belong to already downloaded "
+                                 "videos — they can be deleted",
+        "archive_scan_more": "   ...and {count} more",
+        "archive_scan_verified": "ℹ️ Archive unchanged (check only)",
+        "archive_scan_added": "✅ Added to archive: {count}",
+        "archive_scan_rebuilt": "✅ Archive rebuilt from files on disk: {count} entries",
+        "archive_scan_no_folder": "❌ Folder not found: {path}",
+        "metrics_port_label": "📈 Metrics port:",
+        "metrics_port_hint": "(0 — off)",
+        "metrics_started": "📈 Prometheus metrics: {url}",
+        "metrics_error": "⚠️ Metrics server not started ({address}): {error}",
         "update_ytdlp_btn": "🔄 Update to master",
         
         # Dependencies status
@@ -393,6 +734,7 @@ TRANSLATIONS = {
         # Log
         "log_frame": "📋 Execution log",
         "welcome_line2": "Quality selection • No unnecessary re-encoding",
+        "log_lines_dropped": "… log lines skipped: {count}",
         
         # Progress counter
         "progress_label": "📊 Progress:",
@@ -411,6 +753,8 @@ TRANSLATIONS = {
         "pywin32_found": "  ✅ pywin32: installed (COM API dialogs)",
         "pywin32_not_found": "  ⚠️ pywin32: not installed",
         "pywin32_install_hint": "     For better dialogs: pip install pywin32",
+        "ytdlp_module_found": "  ✅ yt_dlp (Python module): embedded engine available",
+        "ytdlp_module_not_found": "  ⚠️ yt_dlp (Python module): not installed, embedded engine unavailable",
         
         # yt-dlp update
         "updating_ytdlp": "🔄 Updating yt-dlp to master...",
@@ -442,6 +786,7 @@ TRANSLATIONS = {
         "starting_download": "▶️  Starting download...",
         "stopping_download": "⏹️  Stopping download...",
         "stop_hint": "   Next run will continue from where it stopped",
+        "stopping_processes": "⏹ Stopping: {count} process(es) left",
         "download_success": "✅ DOWNLOAD COMPLETED SUCCESSFULLY!",
         "download_exit_code": "⚠️ Process finished with code: ",
         "download_exit_hint": "   This may be normal if some videos were already downloaded",
@@ -463,9 +808,66 @@ TRANSLATIONS = {
         "setting_bitrate": "  📊 Bitrate:    ",
         "setting_order": "  📊 Order:      oldest → newest (playlist_reverse)",
         "setting_order_single": "  📊 Order:      not applicable (single file)",
-        "setting_retries": "  🔄 Retries:    infinite (5 sec pause between attempts)",
+        "setting_retries": "  🔄 Retries:    {attempts} inside yt-dlp (pause up to {max_sleep} sec), video retries — up to {budget}",
         "setting_restart": "  🔁 Restart:    after each video",
         "setting_no_restart": "  🔁 Restart:    disabled (single process)",
+        "setting_engine_embedded": "  🧩 Engine:     embedded (yt_dlp API, per-video error isolation)",
+        "embedded_engine_unavailable": "⚠️ yt_dlp module is not installed — using external yt-dlp process",
+        "setting_parallel": "  ⚡ Parallel:   {count} downloads (list is scanned once)",
+        "setting_adaptive": "  ⚙️ Auto:       download count follows throughput (1–{maximum})",
+        "setting_performance": "  🚀 Fragments:  {fragments} at once, HTTP chunk {chunk}, buffer {buffer}{auto}",
+        "performance_auto_suffix": " (auto)",
+        "setting_aria2c": "  🧲 Downloader: aria2c, {connections} connections per file, parts from {split} MiB",
+        "setting_audio_pipeline": "  🎛 Transcoding: alongside downloads, ffmpeg processes: {workers}",
+        "setting_library": "  🎞 Library:    ",
+        "enumerating": "🔎 Scanning video list...",
+        "enumerated": "📋 Videos found: {total}, already in archive: {archived}, to download: {pending}",
+        "enumerate_empty": "⚠️ Failed to get the video list",
+        "listing_full": "🔎 Full list scan: {seconds:.1f} s",
+        "listing_incremental": "⚡ List from cache: {cached} videos, new: {new} ({seconds:.1f} s)",
+        "cli_next_run": "⏰ Next sync in {minutes:g} min",
+        "retry_scheduled": "🔄 Retry #{attempt} in {seconds} sec (error: {kind}, retries left: {remaining})",
+        "retry_budget_exhausted": "⚠️ Retry budget ({budget}) exhausted — failed videos are no longer retried",
+        "breaker_open": "⛔ YouTube is rate-limiting — pausing all downloads for {seconds} sec",
+        "breaker_closed": "✅ Rate limit lifted — downloads resume",
+        "disk_paused": "💾 Only {free} left on disk (threshold {minimum}) — no new videos start until space is freed",
+        "disk_resumed": "✅ {free} free on disk again — downloads resume",
+        "disk_space_short": "The download folder's disk has {free} free, and the download is estimated to need "
+                            "about {needed} (plus {minimum} reserve).",
+        "disk_space_low": "The download folder's disk has {free} free — below the {minimum} threshold. "
+                          "The download will wait until space is freed.",
+        "disk_space_confirm": "\n\nContinue?",
+        "adaptive_up": "⚙️ Downloads: {old} → {new} (throughput rising: {rate}/s)",
+        "adaptive_down": "⚙️ Downloads: {old} → {new} (YouTube is rate-limiting)",
+        "adaptive_status": "downloads {limit}/{maximum}  •  {rate}/s  •  decisions: {decisions}",
+        
+        # Job queue
+        "queue_frame": "📋 Job Queue",
+        "queue_col_priority": "Priority",
+        "queue_col_status": "Status",
+        "queue_col_mode": "Mode",
+        "job_status_pending": "⏳ pending",
+        "job_status_running": "⬇️ running",
+        "job_status_done": "✅ done",
+        "job_status_failed": "❌ failed",
+        "queue_priority": "Priority:",
+        "queue_concurrency": "At once:",
+        "queue_add_btn": "➕ Add to queue",
+        "queue_import_btn": "📂 From file...",
+        "queue_remove_btn": "🗑️ Remove",
+        "queue_clear_btn": "🧹 Clear finished",
+        "queue_run_btn": "▶️ Run queue",
+        "queue_hint": "Each job keeps its own settings. File: one URL per line, key=value options (mode, quality, outdir, priority...)",
+        "select_jobs_file_title": "Select a job list file",
+        "job_added": "➕ Job #{id} added to the queue: {url}",
+        "jobs_imported": "📂 Jobs added from file: {count}",
+        "jobs_import_error": "❌ Error in the job file: {error}",
+        "queue_empty": "ℹ️ No pending jobs in the queue",
+        "job_started": "▶️ Job #{id}: {mode} — {url}",
+        "job_finished_ok": "✅ Job #{id} finished",
+        "job_finished_failed": "❌ Job #{id} failed",
+        "queue_done": "🏁 Queue finished: {done} succeeded, {failed} failed",
+        "parallel_failed": "⚠️ Failed to download videos: {count} (will be retried on next run)",
         "audio_no_compression": " (no compression)",
         
         # Folder structure
@@ -497,6 +899,32 @@ VIDEO_QUALITIES = [
     ("144p", "quality_144p", 144),
 ]
 
+# Загрузка одного ролика по частям: (минимальная высота кадра, одновременных
+# фрагментов DASH/HLS, HTTP-блок в МиБ, буфер в КиБ); 0 — значение yt-dlp
+PERFORMANCE_PROFILES = [
+    (2160, 8, 10, 64),
+    (1440, 6, 10, 32),
+    (1080, 4, 10, 16),
+    (0, 2, 0, 0),
+]
+
+# Допустимые значения ручных настроек производительности: (минимум, максимум)
+PERFORMANCE_LIMITS = {
+    "concurrent_fragments": (1, 16),
+    "http_chunk_size": (0, 100),
+    "buffer_size": (0, 1024),
+}
+
+# Авто-режим: не больше стольких соединений на все параллельные загрузки
+MAX_TOTAL_CONNECTIONS = 16
+
+# Внешний загрузчик aria2c: соединений на файл и минимальный размер части (МиБ)
+ARIA2C_EXE = "aria2c"
+ARIA2C_LIMITS = {
+    "aria2_connections": (1, 16),
+    "aria2_split_size": (1, 1024),
+}
+
 AUDIO_FORMATS = ["wav", "mp3", "ogg"]
 
 AUDIO_BITRATES = [
@@ -527,6 +955,28 @@ class SettingsManager:
         "audio_bitrate": "max",
         "audio_source": "audio_video",
         "restart_each_video": False,
+        "embedded_engine": False,
+        "parallel_downloads": 1,
+        "adaptive_parallel": False,
+        "archive_backend": "text",
+        "job_concurrency": 1,
+        "retry_attempts": 10,
+        "retry_max_sleep": 300,
+        "retry_budget": 100,
+        "breaker_cooldown": 300,
+        "performance_auto": True,
+        "concurrent_fragments": 4,
+        "http_chunk_size": 10,
+        "buffer_size": 16,
+        "external_downloader": False,
+        "aria2_connections": 8,
+        "aria2_split_size": 1,
+        "audio_pipeline": True,
+        "transcode_workers": 0,
+        "media_library": "",
+        "event_log": True,
+        "metrics_port": 0,
+        "min_free_space": 2,
     }
     
     def __init__(self, config_path=CONFIG_FILE):
@@ -556,188 +1006,4671 @@ class SettingsManager:
             return False
 
 
+def clamp_int_option(options, limits, name):
+    """Целочисленная настройка, приведённая к диапазону limits[name] = (минимум, максимум)."""
+    low, high = limits[name]
+    try:
+        value = int(options.get(name))
+    except (TypeError, ValueError):
+        value = SettingsManager.DEFAULT_SETTINGS[name]
+    return min(max(value, low), high)
+
+
 # ══════════════════════════════════════════════════════════════════════════════
-#  КОНТЕКСТНОЕ МЕНЮ / CONTEXT MENU
+#  ВСТРОЕННЫЙ ДВИЖОК yt-dlp (Python API)
 # ══════════════════════════════════════════════════════════════════════════════
 
-class ContextMenuManager:
-    """Менеджер контекстных меню для текстовых полей."""
-    
-    def __init__(self, lang="en"):
-        self.t = TRANSLATIONS[lang]
-    
-    def bind_entry(self, entry_widget):
-        """Привязать контекстное меню к полю ввода Entry."""
-        menu = tk.Menu(entry_widget, tearoff=0)
-        
-        menu.add_command(label=self.t["ctx_cut"], accelerator="Ctrl+X",
-                        command=lambda: self._cut(entry_widget))
-        menu.add_command(label=self.t["ctx_copy"], accelerator="Ctrl+C",
-                        command=lambda: self._copy(entry_widget))
-        menu.add_command(label=self.t["ctx_paste"], accelerator="Ctrl+V",
-                        command=lambda: self._paste(entry_widget))
-        menu.add_separator()
-        menu.add_command(label=self.t["ctx_select_all"], accelerator="Ctrl+A",
-                        command=lambda: self._select_all_entry(entry_widget))
-        menu.add_separator()
-        menu.add_command(label=self.t["ctx_clear"],
-                        command=lambda: self._clear_entry(entry_widget))
-        
-        entry_widget.bind("<Button-3>", lambda e: self._show_menu(e, menu, entry_widget))
-        
-        entry_widget.bind("<Control-a>", lambda e: self._select_all_entry(entry_widget) or "break")
-        entry_widget.bind("<Control-A>", lambda e: self._select_all_entry(entry_widget) or "break")
-    
-    def bind_text(self, text_widget, readonly=False):
-        """Привязать контекстное меню к текстовому полю Text/ScrolledText."""
-        menu = tk.Menu(text_widget, tearoff=0)
-        
-        if not readonly:
-            menu.add_command(label=self.t["ctx_cut"], accelerator="Ctrl+X",
-                            command=lambda: self._cut_text(text_widget))
-        
-        menu.add_command(label=self.t["ctx_copy"], accelerator="Ctrl+C",
-                        command=lambda: self._copy_text(text_widget))
-        
-        if not readonly:
-            menu.add_command(label=self.t["ctx_paste"], accelerator="Ctrl+V",
-                            command=lambda: self._paste_text(text_widget))
-        
-        menu.add_separator()
-        menu.add_command(label=self.t["ctx_select_all"], accelerator="Ctrl+A",
-                        command=lambda: self._select_all_text(text_widget))
-        
-        if not readonly:
-            menu.add_separator()
-            menu.add_command(label=self.t["ctx_clear"],
-                            command=lambda: self._clear_text(text_widget))
-        
-        text_widget.bind("<Button-3>", lambda e: self._show_menu(e, menu, text_widget))
-        
-        text_widget.bind("<Control-a>", lambda e: self._select_all_text(text_widget) or "break")
-        text_widget.bind("<Control-A>", lambda e: self._select_all_text(text_widget) or "break")
-        text_widget.bind("<Control-c>", lambda e: self._copy_text(text_widget))
-        text_widget.bind("<Control-C>", lambda e: self._copy_text(text_widget))
-    
-    def _show_menu(self, event, menu, widget):
-        widget.focus_set()
-        try:
-            menu.tk_popup(event.x_root, event.y_root)
-        finally:
-            menu.grab_release()
-    
-    def _cut(self, widget):
-        widget.event_generate("<<Cut>>")
-    
-    def _copy(self, widget):
-        widget.event_generate("<<Copy>>")
-    
-    def _paste(self, widget):
-        widget.event_generate("<<Paste>>")
-    
-    def _select_all_entry(self, widget):
-        widget.select_range(0, tk.END)
-        widget.icursor(tk.END)
-    
-    def _clear_entry(self, widget):
-        widget.delete(0, tk.END)
-    
-    def _cut_text(self, widget):
-        try:
-            widget.event_generate("<<Cut>>")
-        except Exception:
-            pass
-    
-    def _copy_text(self, widget):
-        try:
-            if widget.tag_ranges(tk.SEL):
-                widget.event_generate("<<Copy>>")
-        except Exception:
-            pass
-    
-    def _paste_text(self, widget):
-        try:
-            widget.event_generate("<<Paste>>")
-        except Exception:
-            pass
-    
-    def _select_all_text(self, widget):
-        widget.tag_add(tk.SEL, "1.0", tk.END)
-        widget.mark_set(tk.INSERT, "1.0")
-        widget.see(tk.INSERT)
-    
-    def _clear_text(self, widget):
-        widget.delete("1.0", tk.END)
+# Результат проверки aria2c (процесс запускается один раз за сеанс)
+_aria2c_probe = {}
+_aria2c_probe_lock = threading.Lock()
 
 
-# ══════════════════════════════════════════════════════════════════════════════
-#  ОКНО ВЫБОРА ЯЗЫКА
-# ══════════════════════════════════════════════════════════════════════════════
+def _probe_aria2c():
+    try:
+        result = subprocess.run([ARIA2C_EXE, "--version"], capture_output=True, text=True,
+                                creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    # "aria2 version 1.36.0" → "1.36.0"
+    return result.stdout.splitlines()[0].split()[-1]
+
+
+def aria2c_version(refresh=False):
+    """Версия aria2c или None, если он не установлен.
+
+    aria2c проверяется при первом вызове (или с refresh=True), дальше
+    результат берётся из кэша — конструктор DownloadEngine не запускает
+    процесс в потоке окна или под блокировкой очереди. Параллельный вызов
+    ждёт уже идущую проверку.
+    """
+    with _aria2c_probe_lock:
+        if refresh or "version" not in _aria2c_probe:
+            _aria2c_probe["version"] = _probe_aria2c()
+        return _aria2c_probe["version"]
+
+
+def import_yt_dlp():
+    """Ленивая загрузка модуля yt_dlp (опциональная зависимость).
+
+    Returns:
+        Модуль yt_dlp или None, если он не установлен
+    """
+    try:
+        import yt_dlp
+        return yt_dlp
+    except ImportError:
+        return None
+
+
+class EngineCancelled(Exception):
+    """Загрузка во встроенном движке прервана пользователем."""
+
+
+class _EngineLogger:
+    """Перенаправляет вывод YoutubeDL в тот же обработчик строк, что и stdout процесса."""
+
+    def __init__(self, on_line):
+        self.on_line = on_line
+
+    def debug(self, msg):
+        # yt-dlp отправляет обычные сообщения в debug, настоящий debug помечен префиксом
+        if not msg.startswith('[debug] '):
+            self._emit(msg)
+
+    def info(self, msg):
+        self._emit(msg)
+
+    def warning(self, msg):
+        self._emit(f"WARNING: {msg}")
+
+    def error(self, msg):
+        self._emit(msg)
+
+    def _emit(self, msg):
+        for line in str(msg).splitlines():
+            line = line.rstrip()
+            if line:
+                self.on_line(line)
+
+
+class EmbeddedYtDlpEngine:
+    """Встроенный движок: yt-dlp через YoutubeDL API в одном долгоживущем потоке.
+
+    Канал/плейлист перечисляется один раз, затем каждый ролик обрабатывается
+    тем же экземпляром YoutubeDL (без запуска процесса, импорта экстракторов
+    и повторного перечисления на каждый ролик). Ошибка одного ролика
+    не прерывает остальные.
+
+    Опции берутся из той же командной строки, что строит _build_command,
+    через yt_dlp.parse_options — оба движка ведут себя одинаково.
+    """
+
+    def __init__(self, cmd, on_line, stop_event):
+        """
+        Args:
+            cmd: Команда yt-dlp из _build_command (последний элемент — URL)
+            on_line: Обработчик строк вывода (как для stdout процесса)
+            stop_event: threading.Event для остановки
+        """
+        self.yt_dlp = import_yt_dlp()
+        if self.yt_dlp is None:
+            raise RuntimeError("yt_dlp module is not installed")
+
+        self.url = cmd[-1]
+        self.on_line = on_line
+        self.stop_event = stop_event
+
+        parsed = self.yt_dlp.parse_options(cmd[len(YTDLP_COMMAND):-1])
+        self.ydl_opts = dict(parsed.ydl_opts)
+        # Ограничение --max-downloads не нужно: ролики и так обрабатываются по одному
+        self.ydl_opts.pop('max_downloads', None)
+        self.ydl_opts['logger'] = _EngineLogger(on_line)
+        self.ydl_opts['progress_hooks'] = [self._progress_hook] + list(self.ydl_opts.get('progress_hooks') or [])
+        self.playlist_reverse = bool(self.ydl_opts.pop('playlistreverse', False))
+
+    def _cancelled_exception(self):
+        return getattr(self.yt_dlp.utils, 'DownloadCancelled', EngineCancelled)
+
+    def _progress_hook(self, status):
+        # Исключение из хука прерывает текущую загрузку внутри yt-dlp
+        if self.stop_event.is_set():
+            raise self._cancelled_exception()("Cancelled by user")
 
-class LanguageSelector:
-    def __init__(self):
-        self.selected_language = None
-        self.root = tk.Tk()
-        self.root.title("Language / Язык")
-        self.root.resizable(False, False)
-        
-        width, height = 400, 200
-        x = (self.root.winfo_screenwidth() // 2) - (width // 2)
-        y = (self.root.winfo_screenheight() // 2) - (height // 2)
-        self.root.geometry(f'{width}x{height}+{x}+{y}')
-        self.root.configure(bg='#2b2b3d')
-        self._create_widgets()
-        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
-    
-    def _create_widgets(self):
-        title_frame = tk.Frame(self.root, bg='#2b2b3d')
-        title_frame.pack(expand=True, fill='both')
-        
-        tk.Label(title_frame, text="Язык / Language", font=get_available_font(FONT_FAMILY, 24, 'bold'),
-                 fg='#ffffff', bg='#2b2b3d').pack(pady=(30, 40))
-        
-        buttons_frame = tk.Frame(title_frame, bg='#2b2b3d')
-        buttons_frame.pack(expand=True)
-        
-        btn_style = {'font': get_available_font(FONT_FAMILY, 18, 'bold'), 'width': 8, 'height': 2,
-                     'cursor': 'hand2', 'relief': 'flat', 'borderwidth': 0}
-        
-        eng_btn = tk.Button(buttons_frame, text="ENG", command=lambda: self._select_language("en"),
-                            bg='#4a90d9', fg='white', activebackground='#357abd', activeforeground='white', **btn_style)
-        eng_btn.pack(side='left', padx=20)
-        eng_btn.bind('<Enter>', lambda e: eng_btn.configure(bg='#357abd'))
-        eng_btn.bind('<Leave>', lambda e: eng_btn.configure(bg='#4a90d9'))
-        
-        rus_btn = tk.Button(buttons_frame, text="RUS", command=lambda: self._select_language("ru"),
-                            bg='#d94a4a', fg='white', activebackground='#bd3737', activeforeground='white', **btn_style)
-        rus_btn.pack(side='left', padx=20)
-        rus_btn.bind('<Enter>', lambda e: rus_btn.configure(bg='#bd3737'))
-        rus_btn.bind('<Leave>', lambda e: rus_btn.configure(bg='#d94a4a'))
-    
-    def _select_language(self, lang):
-        self.selected_language = lang
-        self.root.destroy()
-    
-    def _on_close(self):
-        self.selected_language = None
-        self.root.destroy()
-    
     def run(self):
-        self.root.mainloop()
-        return self.selected_language
+        """Выполнить загрузку. Возвращает код завершения как у процесса yt-dlp."""
+        with self.yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            try:
+                info = ydl.extract_info(self.url, download=False, process=False)
+            except Exception as e:
+                self.on_line(f"ERROR: {e}")
+                return 1
+
+            if self.stop_event.is_set():
+                return 1
+
+            if not info or info.get('_type') not in ('playlist', 'multi_video'):
+                # Одиночное видео — обычная обработка
+                return self._run_item(ydl, info, None)
+
+            return self._run_playlist(ydl, info)
+
+    def _run_playlist(self, ydl, info):
+        # Перечисление выполняется один раз на весь сеанс
+        entries = [e for e in (info.get('entries') or []) if e]
+        indexed = list(enumerate(entries, 1))
+        if self.playlist_reverse:
+            indexed.reverse()
+
+        total = len(indexed)
+        exit_code = 0
+
+        for autonumber, (playlist_index, entry) in enumerate(indexed, 1):
+            if self.stop_event.is_set():
+                return 1
+
+            self.on_line(f"[download] Downloading item {autonumber} of {total}")
+            extra = {
+                'playlist': info.get('title') or info.get('id'),
+                'playlist_id': info.get('id'),
+                'playlist_title': info.get('title'),
+                'playlist_uploader': info.get('uploader'),
+                'playlist_uploader_id': info.get('uploader_id'),
+                'playlist_channel': info.get('channel'),
+                'playlist_channel_id': info.get('channel_id'),
+                'playlist_webpage_url': info.get('webpage_url'),
+                'playlist_count': total,
+                'n_entries': total,
+                'playlist_index': playlist_index,
+                'playlist_autonumber': autonumber,
+                'extractor': info.get('extractor'),
+                'extractor_key': info.get('extractor_key'),
+                'webpage_url': info.get('webpage_url'),
+            }
+            if self._run_item(ydl, entry, extra) != 0:
+                exit_code = 1
+
+        return exit_code
+
+    def _run_item(self, ydl, entry, extra):
+        """Обработать один ролик с изоляцией ошибок."""
+        try:
+            ydl.process_ie_result(entry, download=True, extra_info=extra)
+            return 0
+        except self._cancelled_exception():
+            if self.stop_event.is_set():
+                return 1
+            raise
+        except Exception as e:
+            # Ошибка одного ролика не останавливает весь сеанс
+            self.on_line(f"ERROR: {e}")
+            return 1
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-#  ДИАЛОГИ ВЫБОРА ФАЙЛОВ/ПАПОК
+#  СУПЕРВИЗОР ПРОЦЕССОВ (asyncio)
 # ══════════════════════════════════════════════════════════════════════════════
 
-class NativeDialogs:
-    def __init__(self, lang="en"):
-        self.t = TRANSLATIONS[lang]
-    
-    def _try_win32_folder(self, initial_dir=None):
+# Проверка остановки и таймаутов во время ожидания вывода, секунд
+SUPERVISOR_POLL_INTERVAL = 0.25
+PROCESS_READ_CHUNK = 64 * 1024
+# Процесс без вывода дольше этого считается зависшим (с запасом на паузы повторов и ffmpeg)
+PROCESS_IDLE_TIMEOUT = 3600
+# Конец строки: \n, а также \r, которым aria2c и ffmpeg обновляют строку состояния
+PROCESS_LINE_SPLIT = re.compile(r'\r\n|\r|\n')
+
+
+def signal_process_tree(process, force=False):
+    """Завершить процесс вместе с потомками (процесс запущен с PROCESS_GROUP_KWARGS).
+
+    Args:
+        process: subprocess.Popen или SupervisedProcess
+        force: False — мягкое завершение (SIGTERM), True — принудительное
+    """
+    try:
+        if sys.platform == 'win32':
+            if process.poll() is not None:
+                return
+            # TerminateProcess не трогает потомков — завершаем дерево целиком
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
+        else:
+            # Группа живёт, пока жив хоть один её процесс — сигнал дойдёт и до потомков
+            os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (OSError, subprocess.SubprocessError):
         try:
-            import pythoncom
+            if force:
+                process.kill()
+            else:
+                process.terminate()
+        except OSError:
+            pass
+
+
+def terminate_process_trees(processes, on_remaining=None):
+    """Завершить процессы параллельно: всем сразу мягко, оставшимся — принудительно.
+
+    Сигнал получают все процессы одновременно, поэтому общее время
+    не превышает PROCESS_TERMINATE_TIMEOUT + PROCESS_KILL_TIMEOUT
+    при любом числе воркеров.
+
+    Args:
+        processes: Список subprocess.Popen или SupervisedProcess
+        on_remaining: Вызывается с числом ещё живых процессов при его изменении
+    """
+    for process in processes:
+        signal_process_tree(process)
+    alive = _wait_processes(processes, PROCESS_TERMINATE_TIMEOUT, on_remaining)
+    for process in alive:
+        signal_process_tree(process, force=True)
+    _wait_processes(alive, PROCESS_KILL_TIMEOUT, on_remaining)
+
+
+def _wait_processes(processes, timeout, on_remaining):
+    """Ждать завершения процессов не дольше timeout. Возвращает ещё живые."""
+    deadline = time.time() + timeout
+    alive = list(processes)
+    reported = None
+    while alive:
+        alive = [process for process in alive if process.poll() is None]
+        if on_remaining is not None and len(alive) != reported:
+            reported = len(alive)
+            on_remaining(reported)
+        if not alive or time.time() >= deadline:
+            break
+        time.sleep(0.05)
+    return alive
+
+
+class SupervisedProcess:
+    """Дочерний процесс супервизора с интерфейсом subprocess.Popen (pid, poll, terminate, kill).
+
+    Методы можно вызывать из любого потока: сигналы передаются в цикл
+    супервизора.
+    """
+
+    def __init__(self, loop, process):
+        self._loop = loop
+        self._process = process
+        self.pid = process.pid
+
+    @property
+    def returncode(self):
+        return self._process.returncode
+
+    def poll(self):
+        return self._process.returncode
+
+    def terminate(self):
+        self._signal(self._process.terminate)
+
+    def kill(self):
+        self._signal(self._process.kill)
+
+    def _signal(self, method):
+        def call():
+            try:
+                method()
+            except ProcessLookupError:
+                pass
+        if self._process.returncode is None:
+            self._loop.call_soon_threadsafe(call)
+
+
+class ProcessSupervisor:
+    """Один цикл asyncio в фоновом потоке для всех дочерних процессов (yt-dlp, ffmpeg).
+
+    Процессы запускаются через asyncio.create_subprocess_exec в своей
+    группе, вывод читается без блокировки и делится на строки (\\n и \\r).
+    Цикл сам следит за остановкой и таймаутами и завершает дерево процесса.
+    В run() обработчик строк выполняется в вызывающем потоке (он может
+    блокироваться — чтение других процессов не задерживается), в submit() —
+    в потоке цикла.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def run(self, cmd, on_line, stop_events=(), timeout=None, idle_timeout=None, on_start=None):
+        """Запустить процесс и дождаться его завершения (из любого потока, кроме цикла).
+
+        Args:
+            cmd: Команда (список аргументов)
+            on_line: Обработчик строк вывода (stdout и stderr вместе)
+            stop_events: threading.Event, при установке любого процесс завершается
+            timeout: Предельное время работы, секунд (None — без ограничения)
+            idle_timeout: Предельное время без вывода, секунд (None — без ограничения)
+            on_start: Вызывается с SupervisedProcess сразу после запуска
+                (в потоке цикла — должен быть быстрым)
+
+        Returns:
+            Код завершения процесса
+
+        Raises:
+            OSError: Процесс не удалось запустить
+        """
+        lines = queue.SimpleQueue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._supervise(cmd, lines.put, stop_events, timeout, idle_timeout, on_start), self._loop)
+        while True:
+            line = lines.get()
+            if line is None:
+                break
+            on_line(line)
+        return future.result()
+
+    def submit(self, cmd, on_line, on_exit, **kwargs):
+        """Запустить процесс без ожидания (из любого потока).
+
+        on_line(line) и по завершении on_exit(код или None, исключение или None)
+        вызываются в потоке цикла — они должны быть быстрыми (например,
+        передавать данные в LogSink или UiChannel). Остальные аргументы — как у run().
+        """
+        def put_line(line):
+            if line is not None:
+                on_line(line)
+
+        def done(future):
+            error = future.exception()
+            on_exit(None if error else future.result(), error)
+
+        future = asyncio.run_coroutine_threadsafe(self._supervise(cmd, put_line, **kwargs), self._loop)
+        future.add_done_callback(done)
+
+    async def _supervise(self, cmd, put_line, stop_events=(), timeout=None, idle_timeout=None, on_start=None):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                **PROCESS_GROUP_KWARGS)
+            handle = SupervisedProcess(self._loop, process)
+            if on_start is not None:
+                on_start(handle)
+
+            reason = await self._read_output(process, put_line, stop_events, timeout, idle_timeout)
+            if reason is not None:
+                if reason != "stopped":
+                    # В стиле yt-dlp — попытка считается сетевой ошибкой и повторяется
+                    put_line(f"ERROR: process timed out ({reason}), terminating")
+                await self._terminate(handle)
+            return await process.wait()
+        finally:
+            put_line(None)
+
+    async def _read_output(self, process, put_line, stop_events, timeout, idle_timeout):
+        """Читать вывод до конца. Возвращает причину прерывания или None."""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        started = last_output = self._loop.time()
+        pending = ""
+        while True:
+            if any(event.is_set() for event in stop_events):
+                return "stopped"
+            now = self._loop.time()
+            if timeout is not None and now - started > timeout:
+                return f"{timeout} s"
+            if idle_timeout is not None and now - last_output > idle_timeout:
+                return f"no output for {idle_timeout} s"
+            try:
+                chunk = await asyncio.wait_for(process.stdout.read(PROCESS_READ_CHUNK), SUPERVISOR_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                break
+            last_output = now
+            *lines, pending = PROCESS_LINE_SPLIT.split(pending + decoder.decode(chunk))
+            for line in lines:
+                line = line.rstrip()
+                if line:
+                    put_line(line)
+
+        pending = (pending + decoder.decode(b"", final=True)).rstrip()
+        if pending:
+            put_line(pending)
+        return None
+
+    async def _terminate(self, handle):
+        """Завершить дерево процесса: мягко, затем принудительно."""
+        for force, wait in ((False, PROCESS_TERMINATE_TIMEOUT), (True, PROCESS_KILL_TIMEOUT)):
+            # taskkill на Windows — отдельный процесс, не задерживаем цикл
+            await self._loop.run_in_executor(None, signal_process_tree, handle, force)
+            try:
+                await asyncio.wait_for(handle._process.wait(), wait)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+
+_process_supervisor = None
+_process_supervisor_lock = threading.Lock()
+
+
+def get_process_supervisor():
+    """Общий супервизор процессов (цикл запускается при первом обращении)."""
+    global _process_supervisor
+    with _process_supervisor_lock:
+        if _process_supervisor is None:
+            _process_supervisor = ProcessSupervisor()
+        return _process_supervisor
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Поля одного элемента при flat-перечислении (одна JSON-строка на ролик)
+ENUMERATE_PRINT_TEMPLATE = "%(.{id,title,url,ie_key,playlist_title,playlist_uploader})j"
+
+
+# Символы, недопустимые в именах файлов, — заменяются так же, как это делает yt-dlp
+FILENAME_REPLACEMENTS = str.maketrans({
+    '/': '⧸', '\\': '⧹', ':': '：', '*': '＊', '?': '？', '"': '＂', '<': '＜', '>': '＞', '|': '｜',
+})
+
+
+def template_path_literal(text):
+    """Текст как готовая папка в шаблоне -o: без разделителей пути и с экранированным %."""
+    text = ''.join(ch for ch in text.translate(FILENAME_REPLACEMENTS) if ch.isprintable())
+    # Windows не допускает точку и пробел в конце имени папки
+    text = text.strip().rstrip('. ') or '_'
+    return text.replace('%', '%%')
+
+
+def make_archive_id(entry):
+    """Идентификатор записи в archive.txt (как у yt-dlp: «extractor id»)."""
+    return f"{(entry.get('ie_key') or 'youtube').lower()} {entry['id']}"
+
+
+def enumerate_playlist(url, cookies=None, stop_event=None, on_line=None, known_ids=None):
+    """Перечислить ролики канала/плейлиста (flat, без загрузки и извлечения форматов).
+
+    Если передан known_ids, список читается лениво (--lazy-playlist)
+    и перечисление прекращается на первом уже известном ролике —
+    так для канала скачивается только новая «голова» списка.
+
+    Args:
+        url: URL канала или плейлиста
+        cookies: Путь к cookies.txt (или None)
+        stop_event: threading.Event для прерывания
+        on_line: Обработчик прочих строк вывода (ошибки yt-dlp)
+        known_ids: Множество уже известных ID (или None для полного списка)
+
+    Returns:
+        Кортеж (entries, reached_known, complete): список словарей (id, title,
+        url, ie_key, playlist_title, playlist_uploader) в порядке источника,
+        признак того, что перечисление остановлено на известном ролике, и
+        признак того, что yt-dlp дошёл до конца списка без ошибок (иначе
+        список может быть обрезан сетью, ограничениями или остановкой)
+    """
+    cmd = [*YTDLP_COMMAND, "--flat-playlist", "--ignore-errors",
+           "--print", ENUMERATE_PRINT_TEMPLATE]
+    if known_ids:
+        cmd.append("--lazy-playlist")
+    if cookies:
+        cmd.extend(["--cookies", cookies])
+    cmd.append(url)
+
+    entries = []
+    seen = set()
+    # Установка прерывает перечисление: найден известный ролик
+    reached_known = threading.Event()
+
+    def handle_line(line):
+        if reached_known.is_set():
+            return
+        line = line.strip()
+        if line.startswith('{'):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if entry and entry.get('id') and entry['id'] not in seen:
+                if known_ids and entry['id'] in known_ids:
+                    reached_known.set()
+                    return
+                seen.add(entry['id'])
+                if not entry.get('url') or not entry['url'].startswith('http'):
+                    entry['url'] = f"https://www.youtube.com/watch?v={entry['id']}"
+                entries.append(entry)
+                return
+        if on_line:
+            on_line(line)
+
+    stop_events = (reached_known,) if stop_event is None else (reached_known, stop_event)
+    exit_code = get_process_supervisor().run(cmd, handle_line, stop_events=stop_events,
+                                             idle_timeout=PROCESS_IDLE_TIMEOUT)
+    return entries, reached_known.is_set(), exit_code == 0 and not reached_known.is_set()
+
+
+def order_for_download(entries):
+    """Как --playlist-reverse: от старых к новым, нумерация по порядку обработки."""
+    ordered = [dict(entry) for entry in reversed(entries)]
+    for autonumber, entry in enumerate(ordered, 1):
+        entry['autonumber'] = autonumber
+    return ordered
+
+
+class ListingCache:
+    """Постоянный кэш списков роликов (один JSON-файл на URL).
+
+    Повторная синхронизация канала перечисляет только новые ролики до
+    первого известного ID, остальное берётся из кэша. Раз в
+    LISTING_FULL_REFRESH_INTERVAL список перечитывается целиком
+    (чтобы учесть удалённые и переименованные ролики).
+    """
+
+    def __init__(self, cache_dir=LISTING_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    def _path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def load(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                listing = json.load(f)
+            if listing.get('url') == url and isinstance(listing.get('entries'), list):
+                return listing
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def save(self, url, entries, full_fetched_at):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(url)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'fetched_at': time.time(), 'full_fetched_at': full_fetched_at,
+                           'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def sync(self, url, cookies=None, stop_event=None, on_line=None, incremental=True):
+        """Получить актуальный список роликов.
+
+        Args:
+            incremental: Досинхронизировать только «голову» списка (для каналов,
+                где новые ролики всегда в начале); иначе полное перечисление
+
+        Returns:
+            Кортеж (entries, stats): список в порядке загрузки с autonumber и
+            словарь {'total', 'new', 'cached', 'full', 'seconds'}
+        """
+        started = time.time()
+        cached = self.load(url)
+        cached_entries = cached['entries'] if cached else []
+        can_increment = (incremental and cached_entries and
+                         started - cached.get('full_fetched_at', 0) < LISTING_FULL_REFRESH_INTERVAL)
+
+        if can_increment:
+            known_ids = {entry['id'] for entry in cached_entries}
+            entries, reached_known, complete = enumerate_playlist(url, cookies, stop_event, on_line,
+                                                                  known_ids=known_ids)
+        else:
+            entries, reached_known, complete = enumerate_playlist(url, cookies, stop_event, on_line)
+
+        if complete:
+            # yt-dlp прошёл весь список — это полный список
+            full_fetched_at = started
+        else:
+            # Голова до известного ролика или обрыв (сеть, 429, зависание): старые ролики
+            # берутся из кэша, а срок полного перечисления не сдвигается
+            fetched_ids = {entry['id'] for entry in entries}
+            entries = entries + [entry for entry in cached_entries if entry['id'] not in fetched_ids]
+            full_fetched_at = cached.get('full_fetched_at', 0) if cached else 0
+
+        if stop_event is not None and stop_event.is_set():
+            return [], None
+
+        # Оборванный список не сохраняется: иначе между его «головой» и кэшем
+        # остался бы пропуск, который инкрементальная синхронизация не заполнит
+        if entries and (complete or reached_known):
+            self.save(url, entries, full_fetched_at)
+
+        cached_ids = {entry['id'] for entry in cached_entries}
+        stats = {
+            'total': len(entries),
+            'new': sum(1 for entry in entries if entry['id'] not in cached_ids),
+            'cached': len(cached_ids),
+            'full': full_fetched_at == started,
+            'seconds': time.time() - started,
+        }
+        return order_for_download(entries), stats
+
+
+class InfoJsonCache:
+    """Кэш info JSON роликов: <cache_dir>/<хэш строки формата>/<id>.info.json.
+
+    Файлы пишет сам yt-dlp при загрузке (--write-info-json по шаблону
+    output_template) и планирование (ответ -j). Повторы, рестарты и
+    загрузка после планирования читают их через --load-info-json, не
+    извлекая ролик заново. Ссылки на потоки в info JSON временные,
+    поэтому записи старше ttl не используются и удаляются prune().
+    """
+
+    def __init__(self, cache_dir=INFO_CACHE_DIR, ttl=INFO_CACHE_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def _directory(self, format_selector):
+        digest = hashlib.sha1(format_selector.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / digest
+
+    def _path(self, video_id, format_selector):
+        return self._directory(format_selector) / f"{video_id}.info.json"
+
+    def output_template(self, format_selector):
+        """Шаблон -o "infojson:..." для yt-dlp (расширение .info.json yt-dlp добавит сам)."""
+        return str(self._directory(format_selector)).replace("%", "%%") + os.sep + "%(id)s"
+
+    def fresh_path(self, video_id, format_selector):
+        """Путь к непросроченному info JSON ролика или None."""
+        path = self._path(video_id, format_selector)
+        try:
+            if time.time() - path.stat().st_mtime < self.ttl:
+                return str(path)
+        except OSError:
+            pass
+        return None
+
+    def load(self, video_id, format_selector):
+        """Непросроченный info JSON ролика (словарь) или None."""
+        path = self.fresh_path(video_id, format_selector)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, video_id, format_selector, text):
+        """Сохранить info JSON (строку вывода yt-dlp -j)."""
+        try:
+            path = self._path(video_id, format_selector)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def discard(self, video_id, format_selector):
+        """Удалить info JSON ролика (ссылки в нём больше не годятся)."""
+        try:
+            os.remove(self._path(video_id, format_selector))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Удалить просроченные записи. Returns: число удалённых файлов."""
+        removed = 0
+        deadline = time.time() - self.ttl
+        try:
+            directories = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            return 0
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    stale = [entry.path for entry in entries if entry.stat().st_mtime < deadline]
+            except OSError:
+                continue
+            for path in stale:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+class AdaptiveConcurrency:
+    """Адаптивное число активных воркеров пула (AIMD).
+
+    Раз в ADAPTIVE_WINDOW секунд сравнивает суммарную скорость загрузки
+    с предыдущим окном: пока скорость растёт (в ADAPTIVE_GAIN раз и более)
+    и ошибок нет два окна подряд — добавляет одного воркера. Ошибка ограничения или
+    извлечения сразу вдвое уменьшает число воркеров.
+
+    Args:
+        maximum: Верхняя граница (настройка «Параллельных загрузок»)
+        on_change: Обработчик (old, new, reason, rate) при каждом решении
+    """
+
+    INCREASE = "up"
+    DECREASE = "down"
+
+    def __init__(self, maximum, on_change=None):
+        self.maximum = max(1, int(maximum))
+        self.limit = 1
+        self.on_change = on_change or (lambda old, new, reason, rate: None)
+        self.rate = 0.0
+        self.decisions = collections.deque(maxlen=ADAPTIVE_DECISIONS_SHOWN)
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_bytes = 0
+        self._window_errors = 0
+        self._previous_errors = 0
+        self._last_rate = None
+        self._last_decrease = 0.0
+
+    def record_bytes(self, count):
+        """Учесть скачанные байты (из событий прогресса всех воркеров)."""
+        with self._lock:
+            self._window_bytes += max(0, count)
+            now = time.time()
+            elapsed = now - self._window_start
+            if elapsed < ADAPTIVE_WINDOW:
+                return
+            rate = self._window_bytes / elapsed
+            errors = self._window_errors + self._previous_errors
+            self._previous_errors = self._window_errors
+            self._window_start, self._window_bytes, self._window_errors = now, 0, 0
+            self.rate = rate
+            rising = self._last_rate is None or rate >= self._last_rate * ADAPTIVE_GAIN
+            self._last_rate = rate
+            if errors or not rising or self.limit >= self.maximum:
+                return
+            decision = self._change(self.limit + 1, self.INCREASE)
+        self.on_change(*decision)
+
+    def record_error(self):
+        """Учесть ошибку ограничения или извлечения (429, «not a bot»...)."""
+        with self._lock:
+            self._window_errors += 1
+            now = time.time()
+            if self.limit <= 1 or now - self._last_decrease < ADAPTIVE_BACKOFF_INTERVAL:
+                return
+            self._last_decrease = now
+            # После снижения скорость заново меряется с нуля
+            self._last_rate = None
+            decision = self._change(max(1, self.limit // 2), self.DECREASE)
+        self.on_change(*decision)
+
+    def _change(self, new_limit, reason):
+        old_limit, self.limit = self.limit, new_limit
+        self.decisions.append(f"{'↑' if reason == self.INCREASE else '↓'}{new_limit}")
+        return old_limit, new_limit, reason, self.rate
+
+    def allows(self, worker_id):
+        """Может ли воркер с этим номером (с 1) брать следующий ролик."""
+        return worker_id <= self.limit
+
+
+class ParallelDownloadPool:
+    """Пул параллельных загрузок: список роликов раздаётся N воркерам.
+
+    Каждый воркер берёт следующий ролик из общей очереди, пока очередь
+    не опустеет или не будет запрошена остановка. С controller
+    (AdaptiveConcurrency) workers — верхняя граница, а ролики берут
+    только воркеры с номером не больше текущего controller.limit.
+    """
+
+    def __init__(self, workers, stop_event, controller=None):
+        self.workers = max(1, int(workers))
+        self.stop_event = stop_event
+        self.controller = controller
+
+    def run(self, items, run_item):
+        """Обработать элементы в пуле.
+
+        Args:
+            items: Список элементов (роликов)
+            run_item: Функция (worker_id, item) -> bool (успех)
+
+        Returns:
+            Кортеж (succeeded, failed)
+        """
+        pending = queue.Queue()
+        for item in items:
+            pending.put(item)
+
+        counts = {'ok': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def worker(worker_id):
+            while not self.stop_event.is_set():
+                if self.controller is not None and not self.controller.allows(worker_id):
+                    # Воркер сейчас лишний — ждём, пока контроллер не поднимет предел
+                    if pending.empty():
+                        return
+                    self.stop_event.wait(0.5)
+                    continue
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    ok = run_item(worker_id, item)
+                except Exception:
+                    ok = False
+                with counts_lock:
+                    counts['ok' if ok else 'failed'] += 1
+
+        threads = [threading.Thread(target=worker, args=(i + 1,), daemon=True)
+                   for i in range(min(self.workers, len(items)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return counts['ok'], counts['failed']
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  АРХИВ ЗАГРУЗОК
+# ══════════════════════════════════════════════════════════════════════════════
+
+class ArchiveStore:
+    """Индексированный архив загрузок (формат archive.txt yt-dlp: «extractor id»).
+
+    Проверка наличия — O(1), запись — только дозапись в конец archive.txt
+    (файл остаётся совместимым с --download-archive). Изменения, внесённые
+    в archive.txt другими процессами yt-dlp, подхватываются refresh()
+    с запомненного смещения — файл не перечитывается целиком.
+    """
+
+    def __init__(self, text_path):
+        self.text_path = text_path
+        self._lock = threading.Lock()
+        self._offset = 0
+
+    # --- индекс (реализуется в наследниках)
+
+    def _index_contains(self, archive_id):
+        raise NotImplementedError
+
+    def _index_add_many(self, archive_ids):
+        raise NotImplementedError
+
+    def _index_all(self):
+        raise NotImplementedError
+
+    def _index_reset(self):
+        raise NotImplementedError
+
+    def _save_offset(self):
+        pass
+
+    # --- общий интерфейс
+
+    def __contains__(self, archive_id):
+        with self._lock:
+            return self._index_contains(archive_id)
+
+    def refresh(self):
+        """Подхватить строки, дописанные в archive.txt с прошлого чтения."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.text_path)
+            except OSError:
+                return
+            if size < self._offset:
+                # Файл заменён или обрезан — перестраиваем индекс
+                self._index_reset()
+                self._offset = 0
+            if size == self._offset:
+                return
+
+            with open(self.text_path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Последняя строка может быть ещё не дописана другим процессом
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                return
+            lines = data[:end].decode('utf-8', errors='replace').splitlines()
+            self._index_add_many([line.strip() for line in lines if line.strip()])
+            self._offset += end
+            self._save_offset()
+
+    def add(self, archive_id):
+        """Записать ролик в архив (дозапись с fsync, без дублей)."""
+        with self._lock:
+            if self._index_contains(archive_id):
+                return
+            with open(self.text_path, 'a', encoding='utf-8') as f:
+                f.write(archive_id + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._index_add_many([archive_id])
+
+    def add_many(self, archive_ids):
+        """Записать несколько роликов одной дозаписью (один fsync). Returns: количество новых записей."""
+        with self._lock:
+            new_ids = [archive_id for archive_id in dict.fromkeys(archive_ids)
+                       if not self._index_contains(archive_id)]
+            if not new_ids:
+                return 0
+            with open(self.text_path, 'a', encoding='utf-8') as f:
+                f.write("".join(archive_id + "\n" for archive_id in new_ids))
+                f.flush()
+                os.fsync(f.fileno())
+            self._index_add_many(new_ids)
+            return len(new_ids)
+
+    def replace_all(self, archive_ids):
+        """Заменить содержимое архива (archive.txt переписывается атомарно). Returns: количество записей."""
+        archive_ids = list(dict.fromkeys(archive_ids))
+        with self._lock:
+            tmp_path = self.text_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("".join(archive_id + "\n" for archive_id in archive_ids))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.text_path)
+            self._index_reset()
+            self._index_add_many(archive_ids)
+            self._offset = os.path.getsize(self.text_path)
+            self._save_offset()
+        return len(archive_ids)
+
+    def all_ids(self):
+        """Все записи архива в порядке добавления."""
+        with self._lock:
+            return list(self._index_all())
+
+    def import_text(self, path):
+        """Импортировать записи из другого archive.txt (например, при объединении папок).
+
+        Returns:
+            Количество новых записей
+        """
+        added = 0
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line and line not in self:
+                    self.add(line)
+                    added += 1
+        return added
+
+    def export_text(self, path):
+        """Выгрузить архив в обычный archive.txt. Returns: количество записей."""
+        with self._lock:
+            ids = list(self._index_all())
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for archive_id in ids:
+                f.write(archive_id + "\n")
+        os.replace(tmp_path, path)
+        return len(ids)
+
+    def close(self):
+        pass
+
+
+class TextArchiveStore(ArchiveStore):
+    """Архив в памяти (хеш-множество) поверх archive.txt."""
+
+    def __init__(self, text_path):
+        super().__init__(text_path)
+        self._ids = set()
+        self._order = []
+        self.refresh()
+
+    def _index_contains(self, archive_id):
+        return archive_id in self._ids
+
+    def _index_add_many(self, archive_ids):
+        for archive_id in archive_ids:
+            if archive_id not in self._ids:
+                self._ids.add(archive_id)
+                self._order.append(archive_id)
+
+    def _index_all(self):
+        return self._order
+
+    def _index_reset(self):
+        self._ids.clear()
+        self._order.clear()
+
+
+class SqliteArchiveStore(ArchiveStore):
+    """Архив в SQLite (archive.sqlite3 рядом с archive.txt).
+
+    Индекс переживает перезапуск программы: при открытии читается только
+    хвост archive.txt, дописанный после прошлого сеанса.
+    """
+
+    def __init__(self, text_path):
+        import sqlite3
+        super().__init__(text_path)
+        db_path = os.path.splitext(text_path)[0] + ".sqlite3"
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS archive (id TEXT PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'text_offset'").fetchone()
+        self._offset = int(row[0]) if row else 0
+        self.refresh()
+
+    def _index_contains(self, archive_id):
+        return self._db.execute("SELECT 1 FROM archive WHERE id = ?", (archive_id,)).fetchone() is not None
+
+    def _index_add_many(self, archive_ids):
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO archive (id) VALUES (?)",
+                                 ((archive_id,) for archive_id in archive_ids))
+
+    def _index_all(self):
+        return [row[0] for row in self._db.execute("SELECT id FROM archive ORDER BY rowid")]
+
+    def _index_reset(self):
+        with self._db:
+            self._db.execute("DELETE FROM archive")
+
+    def _save_offset(self):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('text_offset', ?)",
+                             (str(self._offset),))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+ARCHIVE_BACKENDS = {
+    "text": TextArchiveStore,
+    "sqlite": SqliteArchiveStore,
+}
+
+# Открытые архивы держатся весь сеанс (один объект на путь)
+_archive_stores = {}
+_archive_stores_lock = threading.Lock()
+
+
+def open_archive_store(text_path, backend="text"):
+    """Получить архив сеанса для archive.txt (открывается один раз, затем refresh)."""
+    key = (os.path.abspath(text_path), backend)
+    with _archive_stores_lock:
+        store = _archive_stores.get(key)
+        if store is None:
+            store = ARCHIVE_BACKENDS.get(backend, TextArchiveStore)(text_path)
+            _archive_stores[key] = store
+            return store
+    store.refresh()
+    return store
+
+
+def archived_subset(text_path, archive_ids):
+    """Какие из archive_ids уже записаны в archive.txt.
+
+    Файл только читается построчно — без индекса сеанса (open_archive_store)
+    и без создания archive.sqlite3. Нет файла — ничего не записано.
+
+    Raises:
+        OSError: Файл не удалось прочитать
+    """
+    wanted = set(archive_ids)
+    found = set()
+    try:
+        with open(text_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line in wanted:
+                    found.add(line)
+    except FileNotFoundError:
+        pass
+    return found
+
+
+def close_archive_stores():
+    """Закрыть все архивы сеанса (при выходе)."""
+    with _archive_stores_lock:
+        for store in _archive_stores.values():
+            try:
+                store.close()
+            except Exception:
+                pass
+        _archive_stores.clear()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  БУФЕР ЛОГА И СТРОКИ СТАТУСА
+# ══════════════════════════════════════════════════════════════════════════════
+
+def classify_output_line(line):
+    """Быстрая классификация строки вывода yt-dlp по префиксу.
+
+    Returns:
+        Кортеж (kind, payload): для LINE_PROGRESS — словарь события,
+        для LINE_ITEM — (номер, всего), для остальных — None
+    """
+    if line.startswith(PROGRESS_EVENT_PREFIX):
+        try:
+            return LINE_PROGRESS, json.loads(line[len(PROGRESS_EVENT_PREFIX):])
+        except ValueError:
+            return LINE_TEXT, None
+
+    if line.startswith('[#'):
+        match = ARIA2C_READOUT_REGEX.match(line)
+        if match:
+            return LINE_PROGRESS, aria2c_progress_event(match)
+        return LINE_TEXT, None
+
+    if line.startswith('[download] '):
+        if line.endswith(ARCHIVE_SKIP_SUFFIX):
+            return LINE_ARCHIVE_SKIP, None
+        if line.endswith(ALREADY_DOWNLOADED_SUFFIX):
+            return LINE_ALREADY, None
+        if line.startswith(ITEM_LINE_PREFIXES):
+            match = PROGRESS_REGEX.search(line)
+            if match:
+                return LINE_ITEM, (int(match.group(1)), int(match.group(2)))
+
+    return LINE_TEXT, None
+
+
+def parse_aria2c_size(text):
+    """Размер из строки aria2c ("33.2MiB") в байтах."""
+    match = re.match(r'([\d.]+)(\D+)', text)
+    return int(float(match.group(1)) * ARIA2C_SIZE_UNITS.get(match.group(2), 1)) if match else None
+
+
+def aria2c_progress_event(match):
+    """Событие прогресса (как из --progress-template) по строке состояния aria2c."""
+    eta = None
+    if match.group('eta'):
+        units = dict((unit, int(value)) for value, unit in re.findall(r'(\d+)([hms])', match.group('eta')))
+        eta = units.get('h', 0) * 3600 + units.get('m', 0) * 60 + units.get('s', 0)
+    total = parse_aria2c_size(match.group('total'))
+    return {
+        'status': 'downloading',
+        'downloaded_bytes': parse_aria2c_size(match.group('done')),
+        'total_bytes': total or None,
+        'speed': parse_aria2c_size(match.group('speed')) if match.group('speed') else None,
+        'eta': eta,
+        'connections': int(match.group('connections')),
+    }
+
+
+def format_bytes(num):
+    """Размер в человекочитаемом виде (как у yt-dlp: KiB/MiB/GiB)."""
+    if num is None:
+        return "?"
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if abs(num) < 1024 or unit == 'TiB':
+            return f"{int(num)}{unit}" if unit == 'B' else f"{num:.2f}{unit}"
+        num /= 1024
+
+
+def format_eta(seconds):
+    """Оставшееся время в формате MM:SS или H:MM:SS."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+class StatusBoard:
+    """Живые строки статуса: одна обновляемая строка на активную загрузку.
+
+    Промежуточный прогресс не попадает в лог — хранится только последнее
+    значение для каждого источника, UI перерисовывает изменившиеся строки.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def update(self, key, status):
+        with self._lock:
+            self._rows[key] = status
+            self._dirty = True
+
+    def remove(self, key):
+        with self._lock:
+            if self._rows.pop(key, None) is not None:
+                self._dirty = True
+
+    def remove_prefix(self, prefix):
+        """Убрать строки одной из нескольких одновременных загрузок."""
+        with self._lock:
+            keys = [key for key in self._rows if key.startswith(prefix)]
+            for key in keys:
+                del self._rows[key]
+            if keys:
+                self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._dirty = True
+
+    def snapshot_if_dirty(self):
+        """Вернуть копию строк, если что-то изменилось с прошлого вызова, иначе None."""
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            return dict(self._rows)
+
+
+def format_status_row(key, event):
+    """Текст строки статуса по событию прогресса."""
+    if event.get('status') == 'workers':
+        return f"⚙ {key} {event['text']}"
+    downloaded = event.get('downloaded_bytes')
+    total = event.get('total_bytes') or event.get('total_bytes_estimate')
+    parts = []
+    if downloaded is not None and total:
+        parts.append(f"{downloaded * 100.0 / total:.1f}%")
+    parts.append(f"{format_bytes(downloaded)} / {'~' if not event.get('total_bytes') else ''}{format_bytes(total)}")
+    if event.get('speed'):
+        parts.append(f"{format_bytes(event['speed'])}/s")
+    if event.get('eta') is not None:
+        parts.append(f"ETA {format_eta(event['eta'])}")
+    if event.get('fragment_count'):
+        parts.append(f"frag {event.get('fragment_index') or 0}/{event['fragment_count']}")
+    if event.get('connections'):
+        parts.append(f"aria2c ×{event['connections']}")
+    if event.get('id'):
+        parts.append(f"[{event['id']}]")
+    prefix = f"⬇ {key} " if key else "⬇ "
+    return prefix + "  •  ".join(parts)
+
+
+class LogSink:
+    """Потокобезопасный буфер строк лога.
+
+    Потоки загрузки только добавляют строки, UI периодически забирает их
+    пачкой. Буфер ограничен: при переполнении старые строки отбрасываются
+    (процессы yt-dlp никогда не блокируются на выводе), а число пропущенных
+    строк сообщается при следующей выборке.
+    """
+
+    def __init__(self, capacity=LOG_SINK_CAPACITY):
+        self._lines = collections.deque()
+        self._capacity = capacity
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def write(self, line):
+        with self._lock:
+            if len(self._lines) >= self._capacity:
+                self._lines.popleft()
+                self._dropped += 1
+            self._lines.append(line)
+
+    def drain(self, max_lines=None):
+        """Забрать накопленные строки.
+
+        Returns:
+            Кортеж (lines, dropped) — строки и число отброшенных с прошлой выборки
+        """
+        with self._lock:
+            if max_lines is None or len(self._lines) <= max_lines:
+                lines = list(self._lines)
+                self._lines.clear()
+            else:
+                lines = [self._lines.popleft() for _ in range(max_lines)]
+            dropped, self._dropped = self._dropped, 0
+        return lines, dropped
+
+    def __len__(self):
+        with self._lock:
+            return len(self._lines)
+
+
+class UiChannel:
+    """Единственный канал обновлений окна из фоновых потоков.
+
+    Потоки и цикл супервизора только кладут вызовы в очередь, окно
+    выполняет их в своём потоке при очередном опросе (вместе с выводом
+    лога) — Tk вызывается только из главного потока.
+    """
+
+    def __init__(self):
+        self._calls = queue.SimpleQueue()
+
+    def post(self, func, *args):
+        """Выполнить func(*args) в потоке окна (из любого потока)."""
+        self._calls.put((func, args))
+
+    def drain(self):
+        """Выполнить накопленные вызовы (в потоке окна)."""
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ЖУРНАЛ СОБЫТИЙ
+# ══════════════════════════════════════════════════════════════════════════════
+
+class EventStream:
+    """Поток структурированных событий загрузки (задания, ролики, ошибки, процессы).
+
+    emit() дополняет событие временем и идентификатором сеанса и передаёт
+    его всем подписчикам в вызывающем потоке — подписчики должны быть
+    быстрыми (положить событие в очередь или буфер). Лог окна и консоли —
+    один из подписчиков (log_consumer), журнал JSONL — другой.
+    """
+
+    def __init__(self):
+        self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{random.randrange(16 ** 4):04x}"
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Подписать callback(event) на события."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def emit(self, name, **fields):
+        """Отправить событие name с полями fields (из любого потока)."""
+        event = {"ts": round(time.time(), 3), "session": self.session, "event": name}
+        event.update(fields)
+        for callback in list(self._subscribers):
+            callback(event)
+
+
+def log_consumer(on_log):
+    """Подписчик EventStream: строки лога (события "log") передаются в on_log(line)."""
+    def consume(event):
+        if event["event"] == "log":
+            on_log(event["text"])
+    return consume
+
+
+class JsonlEventWriter:
+    """Запись событий в файл JSONL (по строке JSON на событие) в фоновом потоке.
+
+    Подписчик только кладёт событие в очередь — загрузка никогда не ждёт
+    диска. Поток пишет события пачками через буфер и сбрасывает его не
+    реже раза в EVENT_LOG_FLUSH_INTERVAL. Когда файл превышает max_bytes,
+    он переименовывается в events.1.jsonl (старые сдвигаются, лишние
+    удаляются). Ошибка записи отключает журнал, но не загрузку.
+
+    Args:
+        directory: Папка журнала
+        max_bytes: Размер файла, после которого он ротируется
+        backups: Число хранимых старых файлов
+    """
+
+    def __init__(self, directory=EVENT_LOG_DIR, max_bytes=EVENT_LOG_MAX_BYTES, backups=EVENT_LOG_BACKUPS):
+        self.directory = Path(directory)
+        self.path = self.directory / EVENT_LOG_NAME
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, event):
+        if self.error is None:
+            self._queue.put(event)
+
+    def close(self, timeout=5):
+        """Записать оставшиеся события и закрыть файл."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        file = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            file = open(self.path, "a", encoding="utf-8", buffering=EVENT_LOG_BUFFER)
+            size = file.tell()
+            flushed = time.time()
+            while True:
+                try:
+                    event = self._queue.get(timeout=EVENT_LOG_FLUSH_INTERVAL)
+                except queue.Empty:
+                    event = False
+                if event is None:
+                    break
+                if event:
+                    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+                    length = len(line.encode("utf-8"))
+                    if size and size + length > self.max_bytes:
+                        file.close()
+                        self._rotate()
+                        file = open(self.path, "a", encoding="utf-8", buffering=EVENT_LOG_BUFFER)
+                        size = 0
+                    file.write(line)
+                    size += length
+                if time.time() - flushed >= EVENT_LOG_FLUSH_INTERVAL:
+                    file.flush()
+                    flushed = time.time()
+        except OSError as e:
+            self.error = e
+        finally:
+            if file is not None:
+                try:
+                    file.close()
+                except OSError:
+                    pass
+
+    def _rotate(self):
+        """events.jsonl → events.1.jsonl, events.1.jsonl → events.2.jsonl и т.д."""
+        stem, suffix = os.path.splitext(EVENT_LOG_NAME)
+        backups = [self.directory / f"{stem}.{index}{suffix}" for index in range(1, self.backups + 1)]
+        if not backups:
+            os.remove(self.path)
+            return
+        if backups[-1].exists():
+            os.remove(backups[-1])
+        for older, newer in zip(reversed(backups[:-1]), reversed(backups[1:])):
+            if older.exists():
+                os.replace(older, newer)
+        os.replace(self.path, backups[0])
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ОТЧЁТ О СЕАНСЕ
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Этапы обработки ролика (время этапа — в событии video_complete)
+PHASE_DOWNLOAD = "download"
+PHASE_MERGE = "merge"
+PHASE_POSTPROCESS = "postprocess"
+VIDEO_PHASES = (PHASE_DOWNLOAD, PHASE_MERGE, PHASE_POSTPROCESS)
+
+
+def format_duration(seconds):
+    """Короткая длительность для отчёта: 45s, 12m, 2h."""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h"
+
+
+class SessionReport:
+    """Итоги загрузки по потоку событий: объём, скорость, время по этапам, время на ролик.
+
+    Подписчик EventStream: учитывает только события своего задания
+    (job), поэтому задания очереди с общим потоком считаются отдельно.
+    Время этапов суммируется по воркерам — при параллельной загрузке
+    оно больше времени сеанса, важны доли: преобладание загрузки
+    говорит об ограничении сетью, склейки — диском, обработки и
+    перекодирования — процессором.
+
+    Args:
+        job: Номер задания в событиях ("J3") или None
+    """
+
+    def __init__(self, job=None):
+        self.job = job
+        self.started = None
+        self.finished = None
+        self.format = None
+        self.bytes = 0
+        self.peak_rate = 0
+        self.enumeration = 0.0
+        self.phases = dict.fromkeys(VIDEO_PHASES, 0.0)
+        self.transcode = 0.0
+        self.videos = []
+        # ID роликов, последняя попытка которых не удалась (успешный повтор убирает ID)
+        self.failed_ids = set()
+        self.skipped = 0
+        # Поиски info JSON ролика в InfoJsonCache (по попытке загрузки)
+        self.info_hits = 0
+        self.info_misses = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        if event.get("job") != self.job:
+            return
+        name = event["event"]
+        with self._lock:
+            if name == "run_start":
+                self.started = event["ts"]
+                self.format = event.get("format")
+            elif name == "run_end":
+                self.finished = event["ts"]
+            elif name == "file_complete":
+                self.bytes += event.get("bytes") or 0
+            elif name == "throughput":
+                self.peak_rate = max(self.peak_rate, event["rate"])
+            elif name == "enumeration":
+                self.enumeration += event["seconds"]
+            elif name == "listing":
+                self.skipped += event["archived"]
+            elif name == "video_skip":
+                self.skipped += 1
+                # Ролик, упавший на прошлой попытке, оказался уже скачанным
+                self.failed_ids.discard(event.get("id"))
+            elif name == "video_error":
+                self.failed_ids.add(event["id"])
+            elif name == "video_complete":
+                self.failed_ids.discard(event["id"])
+                self.videos.append((event["seconds"], event["id"], event["bytes"]))
+                for phase in VIDEO_PHASES:
+                    self.phases[phase] += event.get(phase, 0)
+            elif name == "transcode_complete":
+                self.transcode += event["seconds"]
+            elif name == "info_cache":
+                if event["hit"]:
+                    self.info_hits += 1
+                else:
+                    self.info_misses += 1
+
+    def to_dict(self):
+        """Отчёт в виде словаря (для сохранения в JSON)."""
+        with self._lock:
+            wall = (self.finished or time.time()) - (self.started or time.time())
+            downloading = max(wall - self.enumeration, 0)
+            average = round(self.bytes / downloading) if downloading else 0
+            slowest = sorted(self.videos, reverse=True)[:REPORT_SLOWEST]
+            return {
+                "job": self.job,
+                "started": self.started,
+                "seconds": round(wall, 3),
+                "format": self.format,
+                "bytes": self.bytes,
+                "average_rate": average,
+                # Короткий сеанс может не набрать ни одного интервала THROUGHPUT_INTERVAL
+                "peak_rate": max(self.peak_rate, average),
+                "videos": len(self.videos),
+                "failed": len(self.failed_ids),
+                "skipped": self.skipped,
+                "time": {"enumeration": round(self.enumeration, 3), "transcode": round(self.transcode, 3),
+                         **{phase: round(seconds, 3) for phase, seconds in self.phases.items()}},
+                "info_cache": {"hits": self.info_hits, "misses": self.info_misses},
+                "histogram": self._histogram(),
+                "slowest": [{"id": video_id, "seconds": seconds, "bytes": size}
+                            for seconds, video_id, size in slowest],
+            }
+
+    def _histogram(self):
+        """Число роликов по интервалам REPORT_HISTOGRAM_BOUNDS."""
+        counts = [0] * (len(REPORT_HISTOGRAM_BOUNDS) + 1)
+        for seconds, _, _ in self.videos:
+            index = 0
+            while index < len(REPORT_HISTOGRAM_BOUNDS) and seconds >= REPORT_HISTOGRAM_BOUNDS[index]:
+                index += 1
+            counts[index] += 1
+        labels = [f"< {format_duration(REPORT_HISTOGRAM_BOUNDS[0])}"]
+        labels += [f"{format_duration(low)}–{format_duration(high)}"
+                   for low, high in zip(REPORT_HISTOGRAM_BOUNDS, REPORT_HISTOGRAM_BOUNDS[1:])]
+        labels.append(f"≥ {format_duration(REPORT_HISTOGRAM_BOUNDS[-1])}")
+        return [{"range": label, "videos": count} for label, count in zip(labels, counts)]
+
+    def lines(self, t):
+        """Текст отчёта для лога."""
+        report = self.to_dict()
+        spent = report["time"]
+        lines = [
+            t["report_title"],
+            t["report_volume"].format(size=format_bytes(report["bytes"]), duration=format_eta(report["seconds"]),
+                                      videos=report["videos"], failed=report["failed"],
+                                      skipped=report["skipped"]),
+            t["report_speed"].format(average=format_bytes(report["average_rate"]),
+                                     peak=format_bytes(report["peak_rate"])),
+            t["report_phases"].format(**{name: format_eta(seconds) for name, seconds in spent.items()}),
+        ]
+        hint = self._bottleneck(spent)
+        if hint:
+            lines.append(t[hint])
+        if report["info_cache"]["hits"] or report["info_cache"]["misses"]:
+            lines.append(t["report_info_cache"].format(**report["info_cache"]))
+
+        largest = max(row["videos"] for row in report["histogram"]) or 1
+        lines.append(t["report_histogram"])
+        for row in report["histogram"]:
+            bar = "█" * round(row["videos"] * REPORT_HISTOGRAM_WIDTH / largest)
+            lines.append(f"   {row['range']:>9} │ {bar} {row['videos']}")
+        if report["slowest"]:
+            lines.append(t["report_slowest"])
+            for video in report["slowest"]:
+                lines.append(f"   {format_eta(video['seconds']):>8}  {video['id']}  {format_bytes(video['bytes'])}")
+        return lines
+
+    @staticmethod
+    def _bottleneck(spent):
+        """Ключ перевода с вероятным ограничением (сеть, диск, процессор) или None."""
+        shares = {
+            "report_hint_network": spent[PHASE_DOWNLOAD],
+            "report_hint_disk": spent[PHASE_MERGE],
+            "report_hint_cpu": spent[PHASE_POSTPROCESS] + spent["transcode"],
+        }
+        total = sum(shares.values())
+        if not total:
+            return None
+        return max(shares, key=shares.get)
+
+    def save(self, directory=REPORT_DIR, session=""):
+        """Сохранить отчёт в JSON. Returns: путь к файлу.
+
+        Raises:
+            OSError: Файл не удалось записать
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = "-".join(part for part in ("report", session, self.job) if part)
+        path = directory / f"{name}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ПЛАНИРОВАНИЕ ЗАГРУЗКИ
+# ══════════════════════════════════════════════════════════════════════════════
+
+def info_expected_size(info):
+    """Ожидаемый размер файла ролика по info JSON с выбранным форматом (байт) или None.
+
+    Для склеиваемых форматов (видео + аудио) размеры дорожек суммируются.
+    Если yt-dlp не знает размер, он оценивается по битрейту и длительности.
+    """
+    total = 0
+    for fmt in info.get('requested_formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            size = fmt['tbr'] * 1000 / 8 * info['duration']
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+
+def recent_reports(directory, count=PLAN_RECENT_REPORTS, accept=None):
+    """Последние сохранённые отчёты о сеансах (новые первыми), не больше count.
+
+    Args:
+        accept: Функция report -> bool — какие отчёты учитывать (по умолчанию все)
+    """
+    try:
+        paths = sorted(Path(directory).glob("report-*.json"), key=lambda path: path.stat().st_mtime)
+    except OSError:
+        return []
+    reports = []
+    for path in reversed(paths):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if accept is None or accept(report):
+            reports.append(report)
+        if len(reports) >= count:
+            break
+    return reports
+
+
+def recent_throughput(directory, count=PLAN_RECENT_REPORTS):
+    """Средняя скорость последних сеансов по сохранённым отчётам (байт/с) или None."""
+    rates = [report["average_rate"]
+             for report in recent_reports(directory, count, lambda report: report.get("average_rate"))]
+    return sum(rates) / len(rates) if rates else None
+
+
+def recent_video_size(directory, format_selector, count=PLAN_RECENT_REPORTS):
+    """Средний размер ролика в последних сеансах с тем же форматом (байт) или None."""
+    reports = recent_reports(directory, count, lambda report: report.get("format") == format_selector
+                             and report.get("videos") and report.get("bytes"))
+    sizes = [report["bytes"] / report["videos"] for report in reports]
+    return sum(sizes) / len(sizes) if sizes else None
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  МЕТРИКИ (Prometheus)
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Метрики: (имя, тип, описание) — в порядке вывода
+METRICS = (
+    ("ytdm_videos_completed_total", "counter", "Videos downloaded completely."),
+    ("ytdm_videos_skipped_total", "counter", "Videos skipped: already in the archive or on disk."),
+    ("ytdm_videos_failed_total", "counter", "Videos that failed after all retries."),
+    ("ytdm_download_attempts_failed_total", "counter", "Failed video download attempts (retries included)."),
+    ("ytdm_downloaded_bytes_total", "counter", "Bytes of downloaded files."),
+    ("ytdm_retries_total", "counter", "Retries of failed videos."),
+    ("ytdm_errors_total", "counter", "yt-dlp errors by class."),
+    ("ytdm_transcodes_total", "counter", "Audio transcodes by result."),
+    ("ytdm_info_cache_lookups_total", "counter", "Info JSON cache lookups by result."),
+    ("ytdm_runs_total", "counter", "Finished downloads by result."),
+    ("ytdm_active_runs", "gauge", "Running downloads (queue jobs)."),
+    ("ytdm_active_workers", "gauge", "Running yt-dlp processes."),
+    ("ytdm_throughput_bytes_per_second", "gauge", "Download throughput over the last interval."),
+    ("ytdm_videos_pending", "gauge", "Videos left to download in the current listings."),
+    ("ytdm_queue_pending_jobs", "gauge", "Jobs waiting in the queue."),
+    ("ytdm_breaker_open", "gauge", "1 while all downloads are paused because of rate limiting."),
+    ("ytdm_disk_paused", "gauge", "1 while new videos wait for free disk space."),
+)
+
+
+class MetricsRegistry:
+    """Счётчики и показатели загрузок в формате Prometheus (подписчик EventStream).
+
+    Обновляется только по событиям вех (ролик, процесс, повтор,
+    throughput раз в THROUGHPUT_INTERVAL секунд) — разбор строк вывода
+    и события прогресса его не касаются. Значения копятся с момента
+    создания реестра, через все загрузки и задания.
+
+    Args:
+        queue_depth: Функция без аргументов — число ожидающих заданий (или None)
+    """
+
+    def __init__(self, queue_depth=None):
+        self.queue_depth = queue_depth
+        self._values = collections.defaultdict(float)
+        # Последняя скорость по заданию: job -> (байт/с, время события)
+        self._rates = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._handlers = {
+            "run_start": self._on_run_start,
+            "run_end": self._on_run_end,
+            "process_start": lambda event: self._add("ytdm_active_workers", 1),
+            "process_exit": lambda event: self._add("ytdm_active_workers", -1),
+            "listing": self._on_listing,
+            "video_complete": self._on_video_complete,
+            "video_skip": lambda event: self._add("ytdm_videos_skipped_total", 1),
+            "video_error": lambda event: self._add("ytdm_download_attempts_failed_total", 1),
+            "video_failed": lambda event: self._add("ytdm_videos_failed_total", 1),
+            "file_complete": lambda event: self._add("ytdm_downloaded_bytes_total", event.get("bytes") or 0),
+            "retry": lambda event: self._add("ytdm_retries_total", 1),
+            "error": lambda event: self._add("ytdm_errors_total", 1,
+                                             kind=event.get("error_class") or ERROR_OTHER),
+            "transcode_complete": lambda event: self._add("ytdm_transcodes_total", 1, result="ok"),
+            "transcode_error": lambda event: self._add("ytdm_transcodes_total", 1, result="failed"),
+            "info_cache": lambda event: self._add("ytdm_info_cache_lookups_total", 1,
+                                                  result="hit" if event["hit"] else "miss"),
+            "throughput": self._on_throughput,
+            "breaker_open": lambda event: self._set("ytdm_breaker_open", 1),
+            "breaker_closed": lambda event: self._set("ytdm_breaker_open", 0),
+            "disk_low": lambda event: self._set("ytdm_disk_paused", 1),
+            "disk_ok": lambda event: self._set("ytdm_disk_paused", 0),
+        }
+
+    def __call__(self, event):
+        handler = self._handlers.get(event["event"])
+        if handler is not None:
+            with self._lock:
+                handler(event)
+
+    def _add(self, name, amount, **labels):
+        self._values[(name, tuple(sorted(labels.items())))] += amount
+
+    def _set(self, name, value):
+        self._values[(name, ())] = value
+
+    def _on_run_start(self, event):
+        self._add("ytdm_active_runs", 1)
+
+    def _on_run_end(self, event):
+        self._add("ytdm_active_runs", -1)
+        self._add("ytdm_runs_total", 1, result="ok" if event["ok"] else "stopped" if event["stopped"] else "failed")
+        self._pending.pop(event.get("job"), None)
+        self._rates.pop(event.get("job"), None)
+
+    def _on_listing(self, event):
+        self._pending[event.get("job")] = event["pending"]
+
+    def _on_video_complete(self, event):
+        self._add("ytdm_videos_completed_total", 1)
+        job = event.get("job")
+        if self._pending.get(job):
+            self._pending[job] -= 1
+
+    def _on_throughput(self, event):
+        self._rates[event.get("job")] = (event["rate"], event["ts"])
+
+    def render(self):
+        """Текст метрик в формате Prometheus (text exposition 0.0.4)."""
+        now = time.time()
+        with self._lock:
+            values = dict(self._values)
+            # Скорость без свежего события (загрузка стоит) не учитывается
+            values[("ytdm_throughput_bytes_per_second", ())] = sum(
+                rate for rate, ts in self._rates.values() if now - ts <= 2 * THROUGHPUT_INTERVAL)
+            values[("ytdm_videos_pending", ())] = sum(self._pending.values())
+        if self.queue_depth is not None:
+            values[("ytdm_queue_pending_jobs", ())] = self.queue_depth()
+
+        lines = []
+        for name, kind, description in METRICS:
+            samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+            if not samples and kind == "gauge" and name != "ytdm_queue_pending_jobs":
+                samples = [((), 0)]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                value = int(value) if float(value).is_integer() else value
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP-сервер метрик: GET /metrics в фоновом потоке.
+
+    Args:
+        registry: MetricsRegistry
+        port: Порт
+        host: Адрес (по умолчанию только локальный)
+
+    Raises:
+        OSError: Порт занят или адрес недоступен
+    """
+
+    def __init__(self, registry, port, host=METRICS_HOST):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.host = host
+        self.port = port
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}/metrics"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ПОВТОРЫ И ЗАЩИТА ОТ ОГРАНИЧЕНИЙ
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Классы ошибок yt-dlp (определяют паузу перед повтором)
+ERROR_THROTTLE = "throttle"  # 429, «Sign in to confirm you're not a bot»
+ERROR_NETWORK = "network"    # таймауты, обрывы соединения, 5xx
+ERROR_EXTRACTOR = "extractor"  # не удалось разобрать страницу (часто — защита от ботов)
+ERROR_FATAL = "fatal"        # ролик недоступен — повтор бессмыслен
+ERROR_OTHER = "other"
+
+# Подстроки (в нижнем регистре) для классификации; порядок важен
+ERROR_PATTERNS = (
+    (ERROR_FATAL, ("video unavailable", "private video", "has been removed", "members-only",
+                   "join this channel", "confirm your age", "copyright", "not available in your country",
+                   "premieres in", "live event will begin")),
+    (ERROR_THROTTLE, ("http error 429", "too many requests", "not a bot", "rate-limit", "rate limit",
+                      "try again later")),
+    (ERROR_EXTRACTOR, ("unable to extract", "failed to extract", "extractorerror")),
+    (ERROR_NETWORK, ("timed out", "connection reset", "connection aborted", "connection refused",
+                     "temporary failure", "name or service not known", "getaddrinfo failed",
+                     "remote end closed", "incompleteread", "transporterror", "unable to download",
+                     "http error 5")),
+)
+
+# Начальная пауза повтора ролика по классу ошибки, секунд (растёт вдвое с каждой попыткой)
+RETRY_BASE_DELAYS = {
+    ERROR_THROTTLE: 60,
+    ERROR_NETWORK: 5,
+    ERROR_EXTRACTOR: 30,
+    ERROR_OTHER: 15,
+}
+
+# Предохранитель: доля ошибок ограничения среди последних событий
+BREAKER_WINDOW = 20
+BREAKER_MIN_EVENTS = 4
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_MAX_COOLDOWN = 3600
+
+# Не больше стольких повторов одного ролика (или одного процесса yt-dlp)
+MAX_ITEM_RETRIES = 5
+
+# После этих ошибок info JSON ролика из кэша годится для повтора (ссылки на потоки не устарели)
+INFO_REUSABLE_ERRORS = {ERROR_NETWORK, ERROR_THROTTLE}
+
+# Допустимые значения настроек повторов: (минимум, максимум)
+RETRY_LIMITS = {
+    "retry_attempts": (0, 100),
+    "retry_max_sleep": (1, 3600),
+    "retry_budget": (0, 10000),
+    "breaker_cooldown": (10, BREAKER_MAX_COOLDOWN),
+}
+
+
+def classify_error_line(line):
+    """Класс ошибки для строки ERROR/WARNING yt-dlp или None."""
+    if not line.startswith(("ERROR:", "WARNING:")):
+        return None
+    lowered = line.lower()
+    for error_class, patterns in ERROR_PATTERNS:
+        if any(pattern in lowered for pattern in patterns):
+            return error_class
+    return ERROR_OTHER if line.startswith("ERROR:") else None
+
+
+def classify_errors(error_classes):
+    """Итоговый класс неудачной попытки: самый «повторяемый» из встреченных."""
+    for error_class in (ERROR_THROTTLE, ERROR_EXTRACTOR, ERROR_NETWORK, ERROR_OTHER, ERROR_FATAL):
+        if error_class in error_classes:
+            return error_class
+    return ERROR_OTHER
+
+
+class RetryPolicy:
+    """Повторы после ошибок: экспоненциальная пауза с jitter по классу ошибки.
+
+    Внутри процесса yt-dlp повторяет запросы сам (конечное число раз,
+    экспоненциальная пауза через --retry-sleep). Если процесс всё же
+    завершился ошибкой, ролик повторяется целиком, пока не исчерпан
+    общий на загрузку бюджет повторов.
+    """
+
+    def __init__(self, attempts=10, max_sleep=300, budget=100):
+        self.attempts = attempts
+        self.max_sleep = max_sleep
+        self.budget = budget
+        self.remaining = budget
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def ytdlp_args(self):
+        """Аргументы повторов для командной строки yt-dlp."""
+        args = [
+            "--retries", str(self.attempts), "--fragment-retries", str(self.attempts),
+            "--extractor-retries", str(self.attempts), "--file-access-retries", str(self.attempts),
+        ]
+        for retry_type in ("http", "fragment", "extractor", "file_access"):
+            args.extend(["--retry-sleep", f"{retry_type}:exp=2:{self.max_sleep}"])
+        return args
+
+    def acquire(self):
+        """Взять один повтор из бюджета. False — бюджет исчерпан."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def delay(self, error_class, attempt):
+        """Пауза перед повтором номер attempt (с нуля), секунд."""
+        base = RETRY_BASE_DELAYS.get(error_class, RETRY_BASE_DELAYS[ERROR_OTHER])
+        ceiling = min(self.max_sleep, base * (2 ** attempt))
+        # Половина паузы гарантирована, половина случайна — воркеры не
+        # возвращаются к серверу одновременно
+        return ceiling / 2 + self._random.uniform(0, ceiling / 2)
+
+
+class CircuitBreaker:
+    """Общая пауза всех загрузок при всплеске ошибок ограничения (429, «not a bot»).
+
+    Учитывает последние BREAKER_WINDOW событий (ошибка ограничения или
+    успешно скачанный ролик). Когда доля ошибок достигает
+    BREAKER_FAILURE_RATE, предохранитель открывается: воркеры и задания
+    очереди ждут cooldown перед следующим роликом. Затем пропускается одна
+    пробная загрузка — успех закрывает предохранитель, новая ошибка снова
+    открывает его с удвоенной паузой (до BREAKER_MAX_COOLDOWN).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, cooldown=300):
+        self.base_cooldown = max(float(cooldown), 1.0)
+        self.cooldown = self.base_cooldown
+        self.state = self.CLOSED
+        self.open_until = 0.0
+        self.trial_started = 0.0
+        self._events = collections.deque(maxlen=BREAKER_WINDOW)
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        """Учесть скачанный ролик. Возвращает True, если предохранитель закрылся."""
+        with self._lock:
+            self._events.append(False)
+            if self.state != self.HALF_OPEN:
+                return False
+            # Пробная загрузка прошла — сервер снова отвечает
+            self.state = self.CLOSED
+            self.cooldown = self.base_cooldown
+            self._events.clear()
+            return True
+
+    def record_failure(self):
+        """Учесть ошибку ограничения. Возвращает паузу (с), если предохранитель сработал, иначе 0."""
+        with self._lock:
+            self._events.append(True)
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+                return self._open()
+            if self.state == self.CLOSED and len(self._events) >= BREAKER_MIN_EVENTS and \
+                    sum(self._events) / len(self._events) >= BREAKER_FAILURE_RATE:
+                return self._open()
+            return 0
+
+    def _open(self):
+        self.state = self.OPEN
+        self.open_until = time.time() + self.cooldown
+        self._events.clear()
+        return self.cooldown
+
+    def is_paused(self):
+        """Идёт пауза (новые загрузки начинать не нужно)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.time() < self.open_until
+            if self.state == self.HALF_OPEN:
+                return time.time() - self.trial_started < self.cooldown
+            return False
+
+    def wait_until_closed(self, stop_event):
+        """Дождаться разрешения на загрузку. Возвращает False при остановке."""
+        while True:
+            with self._lock:
+                now = time.time()
+                if self.state == self.CLOSED:
+                    return True
+                if self.state == self.OPEN and now >= self.open_until:
+                    # Пауза истекла — пропускаем одну пробную загрузку
+                    self.state = self.HALF_OPEN
+                    self.trial_started = now
+                    return True
+                if self.state == self.HALF_OPEN and now - self.trial_started >= self.cooldown:
+                    # Пробная загрузка так и не дала результата — пускаем следующую
+                    self.trial_started = now
+                    return True
+                wait = self.open_until - now if self.state == self.OPEN else 1.0
+            if stop_event.wait(min(max(wait, 0.1), 1.0)):
+                return False
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  МЕСТО НА ДИСКЕ
+# ══════════════════════════════════════════════════════════════════════════════
+
+def free_disk_space(path):
+    """Свободное место на файловой системе path (байт) или None.
+
+    Если папки ещё нет, проверяется ближайшая существующая родительская.
+    """
+    path = Path(path).absolute()
+    for candidate in (path, *path.parents):
+        try:
+            return shutil.disk_usage(candidate).free
+        except OSError:
+            continue
+    return None
+
+
+class DiskSpaceGuard:
+    """Пауза загрузки, пока на диске папки загрузки меньше min_free байт.
+
+    Свободное место проверяется не чаще раза в DISK_CHECK_INTERVAL секунд и
+    только перед началом очередного ролика — один вызов statvfs, без
+    отдельного потока. Уже идущие загрузки не прерываются. recheck()
+    заставляет проверить сразу (например, после ошибки «No space left»).
+
+    Args:
+        path: Папка загрузки
+        min_free: Порог свободного места, байт (0 — не следить)
+        on_change: Функция (paused, free) — вызывается при паузе и возобновлении
+    """
+
+    def __init__(self, path, min_free, on_change=None):
+        self.path = path
+        self.min_free = max(int(min_free), 0)
+        self.on_change = on_change
+        self.paused = False
+        self.free = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Проверить место (с учётом интервала). Возвращает True, если загрузку можно продолжать."""
+        if not self.min_free:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked < DISK_CHECK_INTERVAL:
+                return not self.paused
+            self._checked = now
+            self.free = free_disk_space(self.path)
+            # Если место узнать нельзя, загрузке не мешаем
+            paused = self.free is not None and self.free < self.min_free
+            changed = paused != self.paused
+            self.paused = paused
+        if changed and self.on_change:
+            self.on_change(paused, self.free)
+        return not paused
+
+    def recheck(self):
+        """Проверить место при следующем check(), не дожидаясь интервала."""
+        with self._lock:
+            self._checked = 0.0
+
+    def wait_until_ok(self, stop_event):
+        """Дождаться, пока место освободится. Возвращает False при остановке."""
+        while not self.check():
+            if stop_event.wait(1.0):
+                return False
+        return True
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  СКАНЕР МЕДИАТЕКИ
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Файлы медиатеки: «... [id].ext» — суффикс из шаблонов _get_output_template
+MEDIA_ID_REGEX = re.compile(r'\[([0-9A-Za-z_-]{11})\]\.(\w+)$')
+# Контейнеры, из которых можно извлечь аудио (в порядке предпочтения)
+MEDIA_EXTENSIONS = ("mkv", "mp4", "webm", "mov", "m4a", "opus", "flac", "wav", "mp3", "ogg")
+# Недокачанные файлы: «[id].webm.part», «[id].f313.mp4.part-Frag7», «[id].webm.ytdl»,
+# временный файл конвейера «[id].part.mp3»
+PARTIAL_FILE_REGEX = re.compile(r'\[([0-9A-Za-z_-]{11})\]\.(?:[\w.-]*\.)?(?:part|ytdl|part-Frag\d+)(?:\.\w+)?$')
+LIBRARY_SCAN_WORKERS = 8
+# Папка, изменённая позже, чем за столько секунд до сканирования, не кэшируется:
+# на файловых системах с грубым mtime (FAT — 2 с) новое изменение может его не сдвинуть
+LIBRARY_MTIME_SLACK = 2
+# Сверка архива с диском: только проверка, дописать найденные ролики, пересобрать архив целиком
+ARCHIVE_ACTIONS = ("verify", "add", "rebuild")
+# Сколько путей недокачанных файлов показывать в логе сверки архива
+ARCHIVE_SCAN_SHOW = 10
+
+
+class LibraryScanner:
+    """Параллельный обход папки загрузки: ролики по суффиксу «[id]» и недокачанные файлы.
+
+    Папки читаются os.scandir в LIBRARY_SCAN_WORKERS потоках (системные
+    вызовы отпускают GIL). Содержимое каждой папки кэшируется вместе с её
+    mtime: при повторном обходе для неизменной папки выполняется только
+    stat, без чтения списка файлов. Размеры недокачанных файлов в кэше
+    могут устареть — имена и состав папки всегда актуальны.
+    """
+
+    def __init__(self, cache_dir=LIBRARY_CACHE_DIR, workers=LIBRARY_SCAN_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+
+    def _path(self, root):
+        digest = hashlib.sha1(root.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def _load(self, root):
+        try:
+            with open(self._path(root), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('root') == root and isinstance(cached.get('dirs'), dict):
+                return cached['dirs']
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save(self, root, dirs):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(root)
+            tmp_path = path.with_suffix('.tmp')
+            # json.dumps кодирует целиком в C — для сотен тысяч файлов в разы быстрее json.dump
+            text = json.dumps({'root': root, 'scanned_at': time.time(), 'dirs': dirs}, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def forget(self, root):
+        """Удалить кэш папки — следующий обход прочитает все папки заново."""
+        try:
+            self._path(os.path.abspath(root)).unlink()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _read_dir(path, mtime):
+        """Содержимое одной папки: {'mtime', 'files', 'subdirs', 'media', 'partials'}."""
+        listing = {'mtime': mtime, 'files': 0, 'subdirs': [], 'media': [], 'partials': []}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            listing['subdirs'].append(entry.name)
+                            continue
+                    except OSError:
+                        continue
+                    listing['files'] += 1
+                    name = entry.name
+                    if '[' not in name:
+                        continue
+                    match = MEDIA_ID_REGEX.search(name)
+                    if match and match.group(2).lower() in MEDIA_EXTENSIONS:
+                        listing['media'].append([match.group(1), name])
+                        continue
+                    match = PARTIAL_FILE_REGEX.search(name)
+                    if match:
+                        try:
+                            size = entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            size = 0
+                        listing['partials'].append([match.group(1), name, size])
+        except OSError:
+            # Нет доступа — папка будет прочитана заново при следующем обходе
+            listing['mtime'] = None
+        if mtime is not None and time.time_ns() - mtime < LIBRARY_MTIME_SLACK * 10 ** 9:
+            listing['mtime'] = None
+        return listing
+
+    def scan(self, root, stop_event=None, incremental=True):
+        """Обойти папку.
+
+        Args:
+            incremental: Брать из кэша папки с неизменным mtime
+
+        Returns:
+            Кортеж (media, partials, stats): [(id, путь)], [(id, путь, размер)]
+            и словарь {'dirs', 'files', 'reused', 'seconds'}
+        """
+        started = time.time()
+        root = os.path.abspath(root)
+        cached = self._load(root) if incremental else {}
+        dirs = {}
+        lock = threading.Lock()
+        work = queue.Queue()
+
+        def visit(relative):
+            path = os.path.join(root, relative) if relative else root
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                return
+            listing = cached.get(relative)
+            reused = listing is not None and listing['mtime'] == mtime
+            if not reused:
+                listing = self._read_dir(path, mtime)
+            with lock:
+                dirs[relative] = dict(listing, reused=reused)
+            for name in listing['subdirs']:
+                work.put(os.path.join(relative, name))
+
+        def worker():
+            while True:
+                relative = work.get()
+                try:
+                    if relative is None:
+                        return
+                    if stop_event is None or not stop_event.is_set():
+                        visit(relative)
+                finally:
+                    work.task_done()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        work.put("")
+        work.join()
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+        stopped = stop_event is not None and stop_event.is_set()
+        reused = sum(listing.pop('reused') for listing in dirs.values())
+        # Кэш переписывается, только если что-то изменилось (папки прочитаны, добавлены или удалены)
+        if not stopped and (reused < len(dirs) or len(dirs) != len(cached)):
+            self._save(root, dirs)
+        media, partials = [], []
+        for relative, listing in dirs.items():
+            prefix = (os.path.join(root, relative) if relative else root) + os.sep
+            media.extend((video_id, prefix + name) for video_id, name in listing['media'])
+            partials.extend((video_id, prefix + name, size) for video_id, name, size in listing['partials'])
+        stats = {'dirs': len(dirs), 'files': sum(listing['files'] for listing in dirs.values()),
+                 'reused': reused, 'seconds': time.time() - started}
+        return media, partials, stats
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  КОНВЕЙЕР ПЕРЕКОДИРОВАНИЯ АУДИО
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Формат аудио → (расширение файла, кодек ffmpeg, -q:a для «максимального» VBR)
+AUDIO_CODECS = {
+    "wav": ("wav", "pcm_s16le", None),
+    "mp3": ("mp3", "libmp3lame", "0"),
+    "ogg": ("ogg", "libvorbis", "10"),
+}
+
+# Сколько готовых к перекодированию файлов может ждать на каждый процесс ffmpeg
+TRANSCODE_BACKLOG_PER_WORKER = 2
+
+TRANSCODE_LIMITS = {
+    "transcode_workers": (0, 64),
+}
+
+
+def default_transcode_workers():
+    """Число процессов ffmpeg по умолчанию — по числу ядер."""
+    return max(1, os.cpu_count() or 1)
+
+
+def scan_media_library(root, stop_event=None):
+    """Индекс медиатеки: ID ролика → путь к файлу.
+
+    Недокачанные файлы (.part, .ytdl) и временные файлы конвейера
+    («[id].part.mp3») не попадают в индекс — после «[id]» сразу идёт
+    расширение. Если для ролика есть несколько файлов, берётся
+    контейнер, стоящий раньше в MEDIA_EXTENSIONS.
+    """
+    rank = {ext: index for index, ext in enumerate(MEDIA_EXTENSIONS)}
+    index = {}
+    media, _, _ = LibraryScanner().scan(root, stop_event)
+    for video_id, path in media:
+        ext = path.rsplit('.', 1)[-1].lower()
+        current = index.get(video_id)
+        if current is None or rank[ext] < current[0]:
+            index[video_id] = (rank[ext], path)
+    return {video_id: path for video_id, (_, path) in index.items()}
+
+
+class TranscodePipeline:
+    """Стадия перекодирования аудио, работающая параллельно загрузке.
+
+    Загрузка передаёт скачанный файл в submit() и сразу переходит к
+    следующему ролику, а ffmpeg перекодирует файлы в нескольких процессах.
+    Очередь ограничена: если перекодирование отстаёт, submit() ждёт —
+    загрузка притормаживает, а не копит исходники на диске.
+
+    Args:
+        workers: Число одновременных процессов ffmpeg
+        build_command: Функция (source, target_base) -> (команда ffmpeg, итоговый файл, временный файл)
+        stop_event: threading.Event остановки загрузки
+        on_log: Обработчик строк лога
+        t: Словарь переводов
+        on_event: Обработчик событий (name, **fields) для журнала событий
+    """
+
+    def __init__(self, workers, build_command, stop_event, on_log, t, on_event=None):
+        self.workers = max(1, int(workers))
+        self.build_command = build_command
+        self.stop_event = stop_event
+        self.on_log = on_log
+        self.t = t
+        self.on_event = on_event or (lambda name, **fields: None)
+        self.done = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=self.workers * TRANSCODE_BACKLOG_PER_WORKER)
+        self._submitted = set()
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        self._finished = None
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, source, on_done=None, target_base=None):
+        """Поставить файл в очередь (ждёт, если очередь заполнена).
+
+        Args:
+            source: Путь к скачанному файлу
+            on_done: Вызывается после успешного перекодирования (из потока конвейера)
+            target_base: Путь результата без расширения. Если задан, исходник
+                не удаляется (например, видео из медиатеки)
+        """
+        with self._lock:
+            if source in self._submitted:
+                return
+            self._submitted.add(source)
+        while not self.stop_event.is_set():
+            try:
+                self._queue.put((source, target_base, on_done), timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def pending(self):
+        """Число файлов, ещё не перекодированных."""
+        with self._lock:
+            return len(self._submitted) - self.done - self.failed
+
+    def finish(self):
+        """Дождаться перекодирования всех файлов. Returns: True, если ошибок не было."""
+        if self._finished is None:
+            for _ in self._threads:
+                while not self.stop_event.is_set():
+                    try:
+                        self._queue.put(None, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+            for thread in self._threads:
+                while thread.is_alive() and not self.stop_event.is_set():
+                    thread.join(0.5)
+            self._finished = self.failed == 0 and not self.stop_event.is_set()
+        return self._finished
+
+    def stop(self):
+        """Прервать работающие процессы ffmpeg (при остановке загрузки)."""
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except Exception:
+                pass
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                task = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if task is None:
+                return
+            source, target_base, on_done = task
+            try:
+                ok = self._transcode(source, target_base)
+                if ok and on_done is not None:
+                    on_done()
+            except Exception as e:
+                # Поток не должен погибнуть: иначе submit() и finish() ждут очередь вечно
+                ok = False
+                self.on_log(self.t["transcode_failed"].format(name=os.path.basename(source), error=e))
+                self.on_event("transcode_error", source=source, error=str(e))
+            with self._lock:
+                if ok:
+                    self.done += 1
+                else:
+                    self.failed += 1
+
+    def _transcode(self, source, target_base):
+        cmd, target, temp_target = self.build_command(source, target_base)
+        name = os.path.basename(target)
+        keep_source = target_base is not None
+        if cmd is None:
+            # Файл уже в нужном формате
+            return True
+        if not os.path.exists(source):
+            # Исходника уже нет — значит, файл был перекодирован раньше
+            return os.path.exists(target)
+        if os.path.exists(target):
+            # Готовый файл не перезаписываем (как --no-post-overwrites)
+            if not keep_source:
+                self._remove(source)
+            return True
+
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+
+        if self.stop_event.is_set():
+            return False
+        started = time.time()
+        output = []
+        processes = []
+
+        def register(process):
+            processes.append(process)
+            with self._lock:
+                self._processes.add(process)
+
+        try:
+            returncode = get_process_supervisor().run(cmd, output.append, stop_events=(self.stop_event,),
+                                                      on_start=register)
+        except OSError as e:
+            self.on_log(self.t["transcode_failed"].format(name=name, error=e))
+            self.on_event("transcode_error", source=source, error=str(e))
+            return False
+        finally:
+            with self._lock:
+                self._processes.difference_update(processes)
+
+        if returncode != 0:
+            self._remove(temp_target)
+            if not self.stop_event.is_set():
+                error = output[-1] if output else f"ffmpeg exit code {returncode}"
+                self.on_log(self.t["transcode_failed"].format(name=name, error=error))
+                self.on_event("transcode_error", source=source, exit_code=returncode, error=error,
+                              seconds=round(time.time() - started, 3))
+            return False
+
+        # Временный файл переименовывается только целиком — недописанный файл не выдаётся за готовый
+        os.replace(temp_target, target)
+        if not keep_source:
+            self._remove(source)
+        seconds = time.time() - started
+        self.on_log(self.t["transcode_done"].format(name=name, seconds=seconds))
+        self.on_event("transcode_complete", source=source, target=target, bytes=self._size(target),
+                      seconds=round(seconds, 3))
+        return True
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ДВИЖОК ЗАГРУЗКИ (без GUI)
+# ══════════════════════════════════════════════════════════════════════════════
+
+# ID ролика в ссылке YouTube: watch?v=ID, youtu.be/ID, shorts/ID, live/ID, embed/ID
+VIDEO_URL_ID_REGEX = re.compile(r'(?:[?&]v=|youtu\.be/|/(?:shorts|live|embed)/)([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])')
+
+
+def youtube_video_id(url):
+    """ID ролика YouTube из ссылки или None."""
+    match = VIDEO_URL_ID_REGEX.search(url)
+    return match.group(1) if match else None
+
+
+def is_valid_url_format(url):
+    """Базовая проверка формата URL."""
+    url = url.strip().lower()
+    if not url:
+        return False
+    # Должен начинаться с http(s):// или содержать известный домен
+    if url.startswith(('http://', 'https://')):
+        return True
+    if any(domain in url for domain in ['youtube.com', 'youtu.be', 'www.']):
+        return True
+    # Проверка на наличие точки и похожесть на домен
+    if '.' in url and not url.startswith('.') and ' ' not in url:
+        return True
+    return False
+
+
+class DownloadEngine:
+    """Загрузка без GUI: команды yt-dlp, управление процессами и прогресс.
+    
+    Используется и окном приложения, и консольным режимом. Строки лога
+    передаются в on_log (вызывается из рабочих потоков), изменения
+    счётчиков — в on_progress(downloaded, total).
+    
+    Args:
+        options: Настройки загрузки (ключи как в SettingsManager.DEFAULT_SETTINGS)
+        lang: Язык сообщений
+        on_log: Обработчик строк лога
+        on_progress: Обработчик изменения счётчиков роликов
+        status_board: StatusBoard для живых строк прогресса (или None)
+        tag: Префикс строк лога и статуса (например, номер задания очереди)
+        breaker: Общий CircuitBreaker (у очереди — один на все задания)
+        events: Общий EventStream (если не задан — свой, с on_log в качестве подписчика)
+        plan_only: run() только оценивает объём и время загрузки (plan), ничего не скачивая
+        archive_action: run() только сверяет архив с файлами в папке загрузки
+            (reconcile_archive, одно из ARCHIVE_ACTIONS), ничего не скачивая
+    """
+    
+    MODE_CHANNEL = "channel"
+    MODE_PLAYLIST = "playlist"
+    MODE_VIDEO = "video"
+    MODE_AUDIO = "audio"
+    MODES = (MODE_CHANNEL, MODE_PLAYLIST, MODE_VIDEO, MODE_AUDIO)
+    
+    # Источники для режима аудио
+    AUDIO_SOURCE_VIDEO = "audio_video"
+    AUDIO_SOURCE_PLAYLIST = "audio_playlist"
+    AUDIO_SOURCE_CHANNEL = "audio_channel"
+    AUDIO_SOURCES = (AUDIO_SOURCE_VIDEO, AUDIO_SOURCE_PLAYLIST, AUDIO_SOURCE_CHANNEL)
+    
+    def __init__(self, options, lang="en", on_log=None, on_progress=None, status_board=None, tag="",
+                 breaker=None, events=None, plan_only=False, archive_action=None):
+        self.options = SettingsManager.DEFAULT_SETTINGS.copy()
+        self.options.update(options)
+        self.lang = lang
+        self.t = TRANSLATIONS[lang]
+        # Лог — один из подписчиков потока событий
+        self.events = events if events is not None else EventStream()
+        if on_log is not None:
+            self.events.subscribe(log_consumer(on_log))
+        self.on_progress = on_progress or (lambda downloaded, total: None)
+        self.status_board = status_board or StatusBoard()
+        self.tag = tag
+        # Кэш списков роликов (инкрементальная синхронизация каналов)
+        self.listing_cache = ListingCache()
+        # Info JSON роликов, извлечённые при планировании (загрузка их переиспользует)
+        self.info_cache = InfoJsonCache()
+        self.plan_only = plan_only
+        self.archive_action = archive_action
+        # Список роликов, перечисленный заранее (prefetch_listing)
+        self.prefetched_entries = None
+        # Повторы после ошибок и общий предохранитель (у очереди — один на все задания)
+        self.retry_policy = RetryPolicy(
+            attempts=clamp_int_option(self.options, RETRY_LIMITS, "retry_attempts"),
+            max_sleep=clamp_int_option(self.options, RETRY_LIMITS, "retry_max_sleep"),
+            budget=clamp_int_option(self.options, RETRY_LIMITS, "retry_budget"),
+        )
+        self.breaker = breaker or CircuitBreaker(clamp_int_option(self.options, RETRY_LIMITS, "breaker_cooldown"))
+        # Классы ошибок текущей попытки по источнику вывода (воркеру)
+        self._recent_errors = {}
+        self._budget_exhausted_logged = False
+        # Текущий ролик по источнику вывода (для событий video_start/video_complete)
+        self._videos = {}
+        # Байты текущего интервала событий throughput
+        self._interval_bytes = 0
+        self._interval_started = time.time()
+        self.report = None
+        
+        self.process = None
+        # Процессы воркеров параллельного пула
+        self.worker_processes = set()
+        # Фоновое завершение процессов после stop()
+        self._terminator = None
+        # Thread-safe механизм остановки
+        self.stop_event = threading.Event()
+        self.process_lock = threading.Lock()
+        # Общие счётчики прогресса для воркеров пула
+        self.progress_lock = threading.Lock()
+        
+        self.total_videos = 0
+        self.downloaded_videos = 0
+        # ID роликов, уже засчитанных как скачанные в этом сеансе
+        self.completed_ids = set()
+        self.succeeded = False
+        
+        self.mode = self.options["mode"]
+        self.audio_source = self.options["audio_source"] if self.mode == self.MODE_AUDIO else None
+        
+        # Определяем, нужен ли archive для этого режима
+        self.uses_archive = self.mode in (self.MODE_CHANNEL, self.MODE_PLAYLIST) or \
+            self.audio_source in (self.AUDIO_SOURCE_PLAYLIST, self.AUDIO_SOURCE_CHANNEL)
+        self.is_channel = self.mode == self.MODE_CHANNEL or self.audio_source == self.AUDIO_SOURCE_CHANNEL
+        self.is_single_file = self.mode == self.MODE_VIDEO or self.audio_source == self.AUDIO_SOURCE_VIDEO
+        
+        # Нормализация URL (для каналов добавляем /videos)
+        url = (self.options["url"] or "").strip().rstrip('/')
+        self.url = self._normalize_channel_url(url) if self.is_channel else url
+        
+        self.outdir = (self.options["outdir"] or "").strip()
+        self.cookies = (self.options["cookies"] or "").strip()
+        # Ниже порога свободного места новые ролики ждут, пока место не освободится
+        self.min_free_space = clamp_int_option(self.options, DISK_LIMITS, "min_free_space") * 2 ** 30
+        self.disk_guard = DiskSpaceGuard(self.outdir or ".", self.min_free_space, self._on_disk_space_change)
+        self.archive_path = os.path.join(self.outdir, "archive.txt") if self.uses_archive else None
+        self.output_template = self._get_output_template(self.outdir, self.mode)
+        self.restart_enabled = bool(self.options["restart_each_video"]) and self.uses_archive
+        
+        self.embedded_enabled = bool(self.options["embedded_engine"])
+        if self.embedded_enabled and import_yt_dlp() is None:
+            self._log(self.t["embedded_engine_unavailable"])
+            self.embedded_enabled = False
+        
+        try:
+            parallel = int(self.options["parallel_downloads"])
+        except (TypeError, ValueError):
+            parallel = 1
+        self.parallel_downloads = min(max(parallel, 1), MAX_PARALLEL_DOWNLOADS) if self.uses_archive else 1
+        self.fragments, self.http_chunk_mb, self.buffer_kb = self._performance_settings()
+        
+        # Внешний загрузчик: несколько соединений на файл
+        self.aria2c_enabled = bool(self.options["external_downloader"])
+        if self.aria2c_enabled and aria2c_version() is None:
+            self._log(self.t["aria2c_unavailable"])
+            self.aria2c_enabled = False
+        self.aria2_connections = clamp_int_option(self.options, ARIA2C_LIMITS, "aria2_connections")
+        self.aria2_split_size = clamp_int_option(self.options, ARIA2C_LIMITS, "aria2_split_size")
+        
+        # Аудио: yt-dlp только скачивает, ffmpeg перекодирует параллельно следующей загрузке
+        self.audio_pipeline = self.mode == self.MODE_AUDIO and bool(self.options["audio_pipeline"])
+        self.transcode_workers = clamp_int_option(self.options, TRANSCODE_LIMITS, "transcode_workers") \
+            or default_transcode_workers()
+        self.transcoder = None
+        self._transcodes_result = None
+        # Скачанный файл воркера пула: передаётся конвейеру после успешного завершения ролика
+        self._downloaded_files = {}
+        # Медиатека: аудио каналов/плейлистов извлекается из уже скачанных видео
+        self.media_library = ""
+        library = (self.options["media_library"] or "").strip()
+        if library and self.mode == self.MODE_AUDIO and self.uses_archive:
+            if os.path.isdir(library):
+                self.media_library = library
+            else:
+                self._log(self.t["library_not_found"].format(path=library))
+        
+        # Адаптивный режим: parallel_downloads — верхняя граница числа воркеров
+        self.adaptive = bool(self.options["adaptive_parallel"]) and self.parallel_downloads > 1
+        self.concurrency = None
+        # Последний учтённый объём по источнику: (id ролика, байт)
+        self._byte_marks = {}
+        self._shown_rate = None
+        
+        # Счётчик прогресса: 1 только для одиночных файлов
+        if self.is_single_file:
+            self.total_videos = 1
+    
+    def _log(self, message):
+        self._emit("log", text=f"{self.tag} {message}" if self.tag and message else message)
+    
+    def _emit(self, name, **fields):
+        """Отправить событие в поток событий (с номером задания очереди)."""
+        if self.tag:
+            fields["job"] = self.tag.strip("[]")
+        self.events.emit(name, **fields)
+    
+    def _performance_settings(self):
+        """Фрагменты, HTTP-блок (МиБ) и буфер (КиБ) для загрузки одного ролика.
+        
+        В авто-режиме значения берутся из PERFORMANCE_PROFILES по высоте
+        кадра выбранного качества («максимум» — как 4K), а фрагменты делятся
+        между параллельными загрузками (не больше MAX_TOTAL_CONNECTIONS).
+        """
+        if not self.options["performance_auto"]:
+            return tuple(clamp_int_option(self.options, PERFORMANCE_LIMITS, name) for name in PERFORMANCE_LIMITS)
+        
+        if self.mode == self.MODE_AUDIO:
+            height = 0
+        else:
+            height = next((h for q, _, h in VIDEO_QUALITIES if q == self.options["video_quality"]), None)
+            if height is None:
+                height = PERFORMANCE_PROFILES[0][0]
+        
+        for min_height, fragments, chunk_mb, buffer_kb in PERFORMANCE_PROFILES:
+            if height >= min_height:
+                break
+        fragments = max(1, min(fragments, MAX_TOTAL_CONNECTIONS // self.parallel_downloads))
+        return fragments, chunk_mb, buffer_kb
+    
+    def _status_key(self, key):
+        return f"{self.tag}{key}"
+    
+    def _notify_progress(self):
+        self.on_progress(self.downloaded_videos, self.total_videos)
+    
+    def _normalize_channel_url(self, url):
+        """Добавить /videos к URL канала, если вкладка не указана."""
+        if not url:
+            return ""
+        
+        known_suffixes = ['/videos', '/shorts', '/streams', '/playlists',
+                          '/community', '/about', '/featured', '/channels']
+        
+        url_lower = url.lower()
+        has_suffix = any(url_lower.endswith(s) for s in known_suffixes)
+        has_special_path = '/watch?' in url or '/playlist?' in url
+        
+        if not has_suffix and not has_special_path:
+            url += '/videos'
+            self._log(self.t["url_videos_added"])
+        
+        return url
+    
+    # ─── Сводка настроек ───
+    
+    def summary_lines(self):
+        """Строки сводки настроек для лога перед началом загрузки."""
+        mode = self.mode
+        mode_name = self._get_mode_display_name(mode)
+        if mode == self.MODE_AUDIO:
+            # Добавляем источник к названию режима
+            source_names = {
+                self.AUDIO_SOURCE_VIDEO: self.t["audio_source_video"],
+                self.AUDIO_SOURCE_PLAYLIST: self.t["audio_source_playlist"],
+                self.AUDIO_SOURCE_CHANNEL: self.t["audio_source_channel"],
+            }
+            mode_name = f"{mode_name} ({source_names.get(self.audio_source, '')})"
+        
+        url_display = self.url[:45] + '...' if len(self.url) > 45 else self.url
+        outdir_display = self.outdir[:45] + '...' if len(self.outdir) > 45 else self.outdir
+        cookies_display = os.path.basename(self.cookies) if self.cookies else "—"
+        
+        lines = [
+            "",
+            "=" * 70,
+            f"{self.t['settings_summary']}".center(70),
+            "=" * 70,
+            f"{self.t['setting_mode']}{mode_name}",
+            f"{self.t['setting_url']}{url_display}",
+            f"{self.t['setting_folder']}{outdir_display}",
+            f"{self.t['setting_cookies']}{cookies_display}",
+            self.t['setting_archive'] if self.uses_archive else self.t['setting_no_archive'],
+            "-" * 70,
+            f"{self.t['folder_structure']}{self._get_folder_structure_desc(mode)}",
+        ]
+        
+        if mode == self.MODE_AUDIO:
+            audio_fmt = self.options["audio_format"].upper()
+            bitrate = self._get_bitrate_display_name(self.options["audio_bitrate"])
+            if self.options["audio_format"] == "wav":
+                lines.append(f"{self.t['setting_audio_format']}{audio_fmt}{self.t['audio_no_compression']}")
+            else:
+                lines.append(f"{self.t['setting_audio_format']}{audio_fmt}")
+                lines.append(f"{self.t['setting_bitrate']}{bitrate}")
+            if self.audio_pipeline:
+                lines.append(self.t['setting_audio_pipeline'].format(workers=self.transcode_workers))
+            if self.media_library:
+                lines.append(f"{self.t['setting_library']}{self.media_library}")
+        else:
+            quality = self._get_quality_display_name(self.options["video_quality"])
+            format_str = self._get_video_format_string(self.options["video_quality"])
+            lines.append(f"{self.t['setting_quality']}{quality}")
+            lines.append(f"{self.t['setting_format']}{format_str}")
+        
+        lines.append(self.t['setting_order'] if self.uses_archive else self.t['setting_order_single'])
+        lines.append(self.t['setting_retries'].format(
+            attempts=self.retry_policy.attempts, max_sleep=self.retry_policy.max_sleep,
+            budget=self.retry_policy.budget))
+        lines.append(self.t['setting_performance'].format(
+            fragments=self.fragments,
+            chunk=f"{self.http_chunk_mb} MiB" if self.http_chunk_mb else "—",
+            buffer=f"{self.buffer_kb} KiB" if self.buffer_kb else "—",
+            auto=self.t['performance_auto_suffix'] if self.options["performance_auto"] else ""))
+        if self.aria2c_enabled:
+            lines.append(self.t['setting_aria2c'].format(connections=self.aria2_connections,
+                                                         split=self.aria2_split_size))
+        
+        if self.parallel_downloads > 1:
+            lines.append(self.t['setting_parallel'].format(count=self.parallel_downloads))
+            if self.adaptive:
+                lines.append(self.t['setting_adaptive'].format(maximum=self.parallel_downloads))
+        elif self.embedded_enabled:
+            lines.append(self.t['setting_engine_embedded'])
+        elif self.uses_archive:
+            lines.append(self.t['setting_restart'] if self.restart_enabled else self.t['setting_no_restart'])
+        
+        lines.extend(["=" * 70, ""])
+        if not self.plan_only:
+            lines.extend([self.t["starting_download"], ""])
+        return lines
+    
+    def _get_output_template(self, outdir, mode):
+        if mode == self.MODE_CHANNEL:
+            return os.path.join(outdir, "%(uploader)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
+        elif mode == self.MODE_PLAYLIST:
+            return os.path.join(outdir, "%(uploader)s", "%(playlist_title)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
+        elif mode == self.MODE_AUDIO:
+            # Разные шаблоны для разных источников аудио
+            source = self.options["audio_source"]
+            if source == self.AUDIO_SOURCE_CHANNEL:
+                return os.path.join(outdir, "%(uploader)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
+            elif source == self.AUDIO_SOURCE_PLAYLIST:
+                return os.path.join(outdir, "%(uploader)s", "%(playlist_title)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
+            else:
+                return os.path.join(outdir, "%(title)s [%(id)s].%(ext)s")
+        else:
+            return os.path.join(outdir, "%(title)s [%(id)s].%(ext)s")
+    
+    def _get_mode_display_name(self, mode):
+        return {
+            self.MODE_CHANNEL: self.t["mode_channel"],
+            self.MODE_PLAYLIST: self.t["mode_playlist"],
+            self.MODE_VIDEO: self.t["mode_video"],
+            self.MODE_AUDIO: self.t["mode_audio"],
+        }.get(mode, mode)
+    
+    def _get_folder_structure_desc(self, mode):
+        if mode == self.MODE_AUDIO:
+            # Разные описания для разных источников аудио
+            source = self.options["audio_source"]
+            fmt = self.options["audio_format"]
+            if source == self.AUDIO_SOURCE_CHANNEL:
+                return self.t["folder_struct_audio_channel"].format(format=fmt)
+            elif source == self.AUDIO_SOURCE_PLAYLIST:
+                return self.t["folder_struct_audio_playlist"].format(format=fmt)
+            else:
+                return self.t["folder_struct_audio_video"].format(format=fmt)
+        
+        return {
+            self.MODE_CHANNEL: self.t["folder_struct_channel"],
+            self.MODE_PLAYLIST: self.t["folder_struct_playlist"],
+            self.MODE_VIDEO: self.t["folder_struct_video"],
+        }.get(mode, "")
+    
+    def _get_video_format_string(self, quality):
+        if quality == "max":
+            return "bv*+ba/b"
+        
+        height = None
+        for q_val, _, q_height in VIDEO_QUALITIES:
+            if q_val == quality:
+                height = q_height
+                break
+        
+        if height:
+            return f"bv*[height<={height}]+ba/b[height<={height}]/b"
+        
+        return "bv*+ba/b"
+    
+    def _format_selector(self):
+        """Строка -f, с которой yt-dlp выбирает формат в текущем режиме."""
+        if self.mode == self.MODE_AUDIO:
+            return "bestaudio/best"
+        return self._get_video_format_string(self.options["video_quality"])
+    
+    def _get_quality_display_name(self, quality):
+        for q_val, q_key, _ in VIDEO_QUALITIES:
+            if q_val == quality:
+                return self.t[q_key]
+        return quality
+    
+    def _get_bitrate_display_name(self, bitrate):
+        for b_val, b_key, _ in AUDIO_BITRATES:
+            if b_val == bitrate:
+                return self.t[b_key]
+        return bitrate
+    
+    # ─── Команда yt-dlp ───
+    
+    def _build_command(self, mode, url, cookies, output_template, archive_path, max_downloads=None, item=None,
+                       video_id=None):
+        """Построить команду yt-dlp.
+        
+        Если передан item (ролик из перечисленного списка), команда скачивает
+        только этот ролик: без плейлиста и архива (их ведёт пул), а поля
+        плейлиста вызывающий уже подставил в output_template. Для одного ролика с
+        известным ID (item или video_id) yt-dlp сохраняет info JSON в
+        info_cache, а свежая запись оттуда загружается вместо URL
+        (--load-info-json) — повтор не извлекает ролик заново.
+        """
+        cmd = [
+            *YTDLP_COMMAND, "-o", output_template,
+            "--continue", "--no-overwrites", "--no-post-overwrites",
+            *self.retry_policy.ytdlp_args(),
+            "--progress", "--newline",
+            "--progress-template", PROGRESS_TEMPLATE,
+            "--concurrent-fragments", str(self.fragments),
+        ]
+        # Блоки HTTP-запросов и буфер — только если заданы (0 — значения yt-dlp)
+        if self.http_chunk_mb:
+            cmd.extend(["--http-chunk-size", f"{self.http_chunk_mb}M"])
+        if self.buffer_kb:
+            cmd.extend(["--buffer-size", f"{self.buffer_kb}K"])
+        # aria2c берёт на себя HTTP(S)-файлы; фрагменты DASH/HLS остаются встроенному загрузчику
+        if self.aria2c_enabled:
+            cmd.extend([
+                "--downloader", ARIA2C_EXE,
+                "--downloader-args", f"{ARIA2C_EXE}:-x {self.aria2_connections} -s {self.aria2_connections} "
+                                     f"-k {self.aria2_split_size}M --show-console-readout=true",
+            ])
+        
+        # Cookies опциональны
+        if cookies:
+            cmd.extend(["--cookies", cookies])
+        
+        if mode == self.MODE_AUDIO:
+            audio_fmt = self.options["audio_format"]
+            bitrate = self.options["audio_bitrate"]
+            source = self.options["audio_source"]
+            
+            if self.audio_pipeline:
+                # Перекодирует TranscodePipeline — yt-dlp только скачивает аудиодорожку
+                cmd.extend(["-f", "bestaudio/best"])
+            else:
+                cmd.extend(["-f", "bestaudio/best", "-x"])
+                
+                if audio_fmt == "wav":
+                    cmd.extend(["--audio-format", "wav"])
+                elif audio_fmt == "mp3":
+                    cmd.extend(["--audio-format", "mp3"])
+                    # Установка битрейта для MP3
+                    if bitrate != "max":
+                        # Используем только -b:a для конкретного битрейта (CBR)
+                        cmd.extend(["--postprocessor-args", f"ffmpeg:-b:a {bitrate}k"])
+                    else:
+                        # Максимальное качество VBR
+                        cmd.extend(["--audio-quality", "0"])
+                elif audio_fmt == "ogg":
+                    # OGG Vorbis формат
+                    cmd.extend(["--audio-format", "vorbis"])
+                    # Установка битрейта для OGG
+                    if bitrate != "max":
+                        cmd.extend(["--postprocessor-args", f"ffmpeg:-b:a {bitrate}k"])
+                    else:
+                        cmd.extend(["--audio-quality", "0"])
+            
+            # Настройки в зависимости от источника
+            if item is not None:
+                cmd.append("--no-playlist")
+            elif source == self.AUDIO_SOURCE_VIDEO:
+                cmd.append("--no-playlist")
+            elif source in (self.AUDIO_SOURCE_PLAYLIST, self.AUDIO_SOURCE_CHANNEL):
+                cmd.extend(["--playlist-reverse"])
+                if archive_path:
+                    cmd.extend(["--download-archive", archive_path])
+        
+        elif mode == self.MODE_VIDEO:
+            quality = self.options["video_quality"]
+            format_string = self._get_video_format_string(quality)
+            cmd.extend(["-f", format_string, "--no-playlist"])
+        else:
+            quality = self.options["video_quality"]
+            format_string = self._get_video_format_string(quality)
+            cmd.extend(["-f", format_string])
+            if item is not None:
+                cmd.append("--no-playlist")
+            else:
+                cmd.extend(["--playlist-reverse", "--download-archive", archive_path])
+        
+        if max_downloads:
+            cmd.extend(["--max-downloads", str(max_downloads)])
+        
+        video_id = item['id'] if item is not None else video_id
+        if video_id:
+            format_selector = self._format_selector()
+            info_json = self.info_cache.fresh_path(video_id, format_selector)
+            self._emit("info_cache", id=video_id, hit=info_json is not None)
+            cmd.extend(["--write-info-json", "-o", f"infojson:{self.info_cache.output_template(format_selector)}"])
+            if info_json:
+                cmd.extend(["--load-info-json", info_json])
+                return cmd
+        
+        cmd.append(url)
+        return cmd
+    
+    def _build_transcode_command(self, source, target_base=None):
+        """Построить команду ffmpeg для перекодирования аудио.
+        
+        Правила битрейта те же, что у -x в _build_command: конкретный
+        битрейт — CBR (-b:a), «максимум» — VBR наилучшего качества (-q:a),
+        WAV — без сжатия.
+        
+        Args:
+            source: Скачанный файл или видео из медиатеки
+            target_base: Путь результата без расширения (по умолчанию — рядом с source)
+        
+        Returns:
+            Кортеж (команда или None, итоговый файл, временный файл)
+        """
+        bitrate = self.options["audio_bitrate"]
+        ext, codec, max_quality = AUDIO_CODECS[self.options["audio_format"]]
+        base = target_base if target_base is not None else os.path.splitext(source)[0]
+        target = f"{base}.{ext}"
+        if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(source)):
+            return None, target, None
+        temp_target = f"{base}.part.{ext}"
+        
+        cmd = [*FFMPEG_COMMAND, "-nostdin", "-y", "-loglevel", "error", "-i", source, "-vn", "-acodec", codec]
+        if max_quality is not None:
+            if bitrate != "max":
+                cmd.extend(["-b:a", f"{bitrate}k"])
+            else:
+                cmd.extend(["-q:a", max_quality])
+        cmd.append(temp_target)
+        return cmd, target, temp_target
+    
+    # ─── Вывод yt-dlp ───
+    
+    def _dispatch_output_line(self, line, key=""):
+        """Разобрать строку вывода yt-dlp и направить по назначению.
+        
+        События прогресса обновляют строку статуса, вехи попадают в лог.
+        Счётчики прогресса ведутся здесь только для основного процесса
+        (key == ""), воркеры пула считаются самим пулом.
+        
+        Args:
+            line: Строка вывода yt-dlp (без префикса воркера)
+            key: Источник (номер воркера) для строки статуса и префикса в логе
+        
+        Returns:
+            OUTPUT_COMPLETE, OUTPUT_SKIP или None
+        """
+        kind, payload = classify_output_line(line)
+        
+        if kind == LINE_PROGRESS:
+            return self._on_progress_event(payload, key)
+        
+        self._log(f"{key} {line}" if key else line)
+        if line.startswith(MERGER_PREFIX):
+            self._enter_phase(key, PHASE_MERGE)
+        elif line.startswith(POSTPROCESSOR_PREFIXES):
+            self._enter_phase(key, PHASE_POSTPROCESS)
+        
+        error_class = classify_error_line(line)
+        if error_class:
+            self._emit("error", worker=key or None, error_class=error_class, text=line)
+            self._note_error(error_class, key)
+            if any(pattern in line.lower() for pattern in DISK_FULL_PATTERNS):
+                # Диск заполнился — следующая попытка сначала дождётся места
+                self.disk_guard.recheck()
+            return None
+        
+        if kind == LINE_ITEM:
+            if not key:
+                # Следующий ролик плейлиста — предыдущий (вместе с постобработкой) завершён
+                self._end_video(key, None)
+                with self.progress_lock:
+                    self._byte_marks.pop(key, None)
+                    self.total_videos = payload[1]
+                    # Защита от переполнения
+                    self.downloaded_videos = min(payload[0] - 1, self.total_videos)
+                self._notify_progress()
+            return None
+        if kind == LINE_ALREADY:
+            path = line[len('[download] '):-len(ALREADY_DOWNLOADED_SUFFIX)].strip()
+            with self.progress_lock:
+                # Ролик, заранее отмеченный пулом, уже на диске — это пропуск, а не ошибка
+                current = self._videos.get(key)
+                if current is not None and not current["files"]:
+                    del self._videos[key]
+                else:
+                    current = None
+            self._emit("video_skip", worker=key or None, id=current["id"] if current else None,
+                       reason="exists", filename=path)
+            if self.audio_pipeline:
+                self._on_downloaded_file(path, key)
+            self._count_processed_video(key)
+            return OUTPUT_COMPLETE
+        if kind == LINE_ARCHIVE_SKIP:
+            self._emit("video_skip", worker=key or None, reason="archive", text=line)
+            # Для прогресса пропущенные из архива тоже считаются обработанными
+            self._count_processed_video(key)
+            return OUTPUT_SKIP
+        return None
+    
+    def _on_progress_event(self, event, key):
+        """Обработать событие прогресса из --progress-template."""
+        status = event.get('status')
+        self._count_bytes(event, key)
+        if status == 'downloading':
+            if event.get('id'):
+                self._track_video(event['id'], key)
+            self.status_board.update(self._status_key(key), event)
+            return None
+        
+        self.status_board.remove(self._status_key(key))
+        if status != 'finished':
+            return None
+        
+        text = f"[download] {event.get('text') or '100%'}"
+        self._log(f"{key} {text}" if key else text)
+        self._on_file_complete(event, key)
+        if self.audio_pipeline and event.get('filename'):
+            self._on_downloaded_file(event['filename'], key)
+        
+        # Видео+аудио дают два события finished — считаем ролик один раз
+        video_id = event.get('id')
+        if video_id:
+            with self.progress_lock:
+                if video_id in self.completed_ids:
+                    return None
+                self.completed_ids.add(video_id)
+        if self.breaker.record_success():
+            self._log(self.t["breaker_closed"])
+            self._emit("breaker_closed")
+        self._count_processed_video(key)
+        return OUTPUT_COMPLETE
+    
+    def _on_downloaded_file(self, path, key):
+        """Передать скачанный файл конвейеру перекодирования.
+        
+        Файл воркера пула передаётся только после успешного завершения
+        ролика (см. _download_parallel) — тогда и архив пополняется
+        лишь после перекодирования.
+        """
+        if key:
+            with self.progress_lock:
+                self._downloaded_files[key] = path
+        else:
+            self.transcoder.submit(path)
+    
+    def _finish_transcodes(self):
+        """Дождаться конвейера перекодирования. Returns: True, если все файлы перекодированы."""
+        if self.transcoder is None:
+            return True
+        if self._transcodes_result is None:
+            pending = self.transcoder.pending()
+            if pending and not self.stop_event.is_set():
+                self._log(self.t["transcode_waiting"].format(count=pending))
+            self._transcodes_result = self.transcoder.finish()
+            if self.transcoder.failed:
+                self._log(self.t["transcode_failed_total"].format(count=self.transcoder.failed))
+        return self._transcodes_result
+    
+    def _count_processed_video(self, key):
+        """Увеличить счётчик обработанных роликов (только для основного процесса)."""
+        if key:
+            return
+        with self.progress_lock:
+            if self.total_videos > 0 and self.downloaded_videos < self.total_videos:
+                self.downloaded_videos = min(self.downloaded_videos + 1, self.total_videos)
+            else:
+                return
+        self._notify_progress()
+    
+    # ─── События роликов ───
+    
+    def _track_video(self, video_id, key):
+        """Отметить начало ролика источника key (предыдущий ролик источника завершён)."""
+        current = self._videos.get(key)
+        if current is not None and current["id"] == video_id:
+            return
+        now = time.time()
+        with self.progress_lock:
+            self._videos[key] = {"id": video_id, "started": now, "bytes": 0, "files": 0,
+                                 "phase": PHASE_DOWNLOAD, "phase_started": now,
+                                 "phases": dict.fromkeys(VIDEO_PHASES, 0.0)}
+        if current is not None:
+            self._emit_video_end(current, key, None)
+        self._emit("video_start", worker=key or None, id=video_id)
+    
+    def _on_file_complete(self, event, key):
+        """Учесть скачанный файл ролика (у ролика с отдельными видео и аудио их два)."""
+        size = event.get('downloaded_bytes') or event.get('total_bytes')
+        with self.progress_lock:
+            current = self._videos.get(key)
+            if current is not None and current["id"] == event.get('id'):
+                current["bytes"] += size or 0
+                current["files"] += 1
+        self._emit("file_complete", worker=key or None, id=event.get('id'), filename=event.get('filename'),
+                   bytes=size)
+    
+    def _enter_phase(self, key, phase):
+        """Ролик источника key перешёл к этапу phase (склейка, постобработка)."""
+        now = time.time()
+        with self.progress_lock:
+            current = self._videos.get(key)
+            if current is None or current["phase"] == phase:
+                return
+            current["phases"][current["phase"]] += now - current["phase_started"]
+            current["phase"], current["phase_started"] = phase, now
+    
+    def _end_video(self, key, exit_code):
+        """Завершить текущий ролик источника по выходу процесса."""
+        with self.progress_lock:
+            current = self._videos.pop(key, None)
+        if current is not None:
+            self._emit_video_end(current, key, exit_code)
+    
+    def _emit_video_end(self, video, key, exit_code):
+        now = time.time()
+        fields = {"worker": key or None, "id": video["id"], "seconds": round(now - video["started"], 3)}
+        if video["files"]:
+            phases = video["phases"]
+            phases[video["phase"]] += now - video["phase_started"]
+            self._emit("video_complete", **fields, bytes=video["bytes"], files=video["files"],
+                       **{phase: round(seconds, 3) for phase, seconds in phases.items()})
+        elif exit_code != 0 and not self.stop_event.is_set():
+            # Процесс завершился успешно без новых файлов — ролик не скачан, но и не ошибка
+            self._emit("video_error", **fields, exit_code=exit_code)
+    
+    def _on_process_start(self, key):
+        """Событие запуска процесса загрузки. Returns: время запуска."""
+        with self.progress_lock:
+            # В прогрессе aria2c нет ID ролика — счёт байт нового процесса начинается с нуля
+            self._byte_marks.pop(key, None)
+        self._emit("process_start", worker=key or None)
+        return time.time()
+    
+    def _on_process_exit(self, key, exit_code, started):
+        self._end_video(key, exit_code)
+        self._emit("process_exit", worker=key or None, exit_code=exit_code,
+                   seconds=round(time.time() - started, 3), stopped=self.stop_event.is_set())
+    
+    # ─── Адаптивное число воркеров ───
+    
+    def _count_bytes(self, event, key):
+        """Учесть прирост скачанных байт по событию прогресса (скорость сеанса, адаптивный режим)."""
+        downloaded = event.get('downloaded_bytes')
+        if downloaded is None:
+            return
+        mark = (event.get('id'), downloaded)
+        with self.progress_lock:
+            previous = self._byte_marks.get(key)
+            if event.get('status') == 'downloading':
+                self._byte_marks[key] = mark
+            else:
+                self._byte_marks.pop(key, None)
+        # Новый ролик или новый файл (видео после аудио) — счёт с нуля
+        same_file = previous is not None and previous[0] == mark[0] and previous[1] <= downloaded
+        delta = downloaded - previous[1] if same_file else downloaded
+        self._record_throughput(delta)
+        if self.concurrency is None:
+            return
+        self.concurrency.record_bytes(delta)
+        if self.concurrency.rate != self._shown_rate:
+            self._show_concurrency()
+    
+    def _record_throughput(self, delta):
+        """Раз в THROUGHPUT_INTERVAL секунд отправить событие throughput со скоростью интервала."""
+        now = time.time()
+        with self.progress_lock:
+            self._interval_bytes += delta
+            elapsed = now - self._interval_started
+            if elapsed < THROUGHPUT_INTERVAL:
+                return
+            count = self._interval_bytes
+            self._interval_bytes, self._interval_started = 0, now
+        self._emit("throughput", bytes=count, seconds=round(elapsed, 3), rate=round(count / elapsed))
+    
+    def _on_concurrency_change(self, old, new, reason, rate):
+        message_key = "adaptive_up" if reason == AdaptiveConcurrency.INCREASE else "adaptive_down"
+        self._log(self.t[message_key].format(old=old, new=new, rate=format_bytes(rate)))
+        self._show_concurrency()
+    
+    def _show_concurrency(self):
+        """Строка статуса с текущим числом воркеров и последними решениями."""
+        controller = self.concurrency
+        self._shown_rate = controller.rate
+        text = self.t["adaptive_status"].format(
+            limit=controller.limit, maximum=controller.maximum, rate=format_bytes(controller.rate),
+            decisions=" ".join(controller.decisions) or "—")
+        self.status_board.update(self._status_key("[auto]"), {'status': 'workers', 'text': text})
+    
+    # ─── Повторы после ошибок ───
+    
+    def _note_error(self, error_class, key):
+        """Запомнить класс ошибки попытки; ошибки ограничения идут в предохранитель."""
+        with self.progress_lock:
+            self._recent_errors.setdefault(key, set()).add(error_class)
+        if self.concurrency is not None and error_class in (ERROR_THROTTLE, ERROR_EXTRACTOR):
+            self.concurrency.record_error()
+        if error_class == ERROR_THROTTLE:
+            pause = self.breaker.record_failure()
+            if pause:
+                self._log(self.t["breaker_open"].format(seconds=int(pause)))
+                self._emit("breaker_open", seconds=int(pause))
+    
+    def _take_errors(self, key):
+        with self.progress_lock:
+            return self._recent_errors.pop(key, set())
+    
+    def _wait_before_retry(self, key, attempt):
+        """Решить, повторять ли неудачную попытку, и выдержать паузу.
+        
+        Returns:
+            True, если попытку нужно повторить
+        """
+        error_class = classify_errors(self._take_errors(key))
+        if self.stop_event.is_set() or error_class == ERROR_FATAL or attempt >= MAX_ITEM_RETRIES:
+            return False
+        if not self.retry_policy.acquire():
+            if not self._budget_exhausted_logged:
+                self._budget_exhausted_logged = True
+                self._log(self.t["retry_budget_exhausted"].format(budget=self.retry_policy.budget))
+            return False
+        
+        delay = self.retry_policy.delay(error_class, attempt)
+        message = self.t["retry_scheduled"].format(
+            seconds=int(delay), kind=error_class, attempt=attempt + 1,
+            remaining=self.retry_policy.remaining)
+        self._log(f"{key} {message}" if key else message)
+        self._emit("retry", worker=key or None, error_class=error_class, attempt=attempt + 1,
+                   delay=round(delay, 1), remaining=self.retry_policy.remaining)
+        return not self.stop_event.wait(delay)
+    
+    def _on_disk_space_change(self, paused, free):
+        if paused:
+            self._log(self.t["disk_paused"].format(free=format_bytes(free),
+                                                   minimum=format_bytes(self.min_free_space)))
+            self._emit("disk_low", free=free, minimum=self.min_free_space)
+        else:
+            self._log(self.t["disk_resumed"].format(free=format_bytes(free)))
+            self._emit("disk_ok", free=free, minimum=self.min_free_space)
+    
+    def _run_with_retries(self, key, run_attempt, video_id=None):
+        """Выполнить попытку, повторяя её после ошибок.
+        
+        Перед каждой попыткой дожидается закрытия предохранителя и
+        свободного места на диске (disk_guard). Если повторы исчерпаны,
+        а последняя попытка завершилась ошибкой, отправляет событие
+        video_failed.
+        
+        Args:
+            key: Источник вывода (номер воркера), "" — основной процесс
+            run_attempt: Функция без аргументов, возвращает код завершения
+                (None — загрузка остановлена)
+            video_id: Ролик, который скачивается (None — плейлист одним процессом)
+        
+        Returns:
+            Код завершения последней попытки или None при остановке
+        """
+        attempt = 0
+        while self.breaker.wait_until_closed(self.stop_event) and self.disk_guard.wait_until_ok(self.stop_event):
+            self._take_errors(key)
+            exit_code = run_attempt()
+            if exit_code in (None, 0):
+                return exit_code
+            if not self._wait_before_retry(key, attempt):
+                if not self.stop_event.is_set():
+                    self._emit("video_failed", worker=key or None, id=video_id, exit_code=exit_code,
+                               attempts=attempt + 1)
+                return exit_code
+            attempt += 1
+        return None
+    
+    # ─── Запуск и остановка ───
+    
+    def run(self):
+        """Выполнить загрузку в текущем потоке.
+        
+        Returns:
+            True, если загрузка завершилась успешно
+        """
+        if self.plan_only:
+            return self.plan()
+        if self.archive_action:
+            return self.reconcile_archive()
+        
+        mode, url, cookies = self.mode, self.url, self.cookies
+        output_template, archive_path = self.output_template, self.archive_path
+        started = time.time()
+        self.info_cache.prune()
+        self.report = SessionReport(self.tag.strip("[]") or None)
+        self.events.subscribe(self.report)
+        with self.progress_lock:
+            self._interval_bytes, self._interval_started = 0, started
+        self._emit("run_start", url=url, mode=mode, audio_source=self.audio_source, outdir=self.outdir,
+                   parallel=self.parallel_downloads, format=self._format_selector())
+        
+        try:
+            if self.outdir:
+                os.makedirs(self.outdir, exist_ok=True)
+            if self.audio_pipeline or self.media_library:
+                self.transcoder = TranscodePipeline(self.transcode_workers, self._build_transcode_command,
+                                                    self.stop_event, self._log, self.t, on_event=self._emit)
+            # Медиатека сверяется по перечисленному списку — нужен путь пула
+            if self.parallel_downloads > 1 or self.prefetched_entries is not None or self.media_library:
+                self._download_parallel(mode, url, cookies, output_template, archive_path,
+                                        self.parallel_downloads, restart_mode=self.restart_enabled)
+            elif self.embedded_enabled:
+                # Встроенный движок сам изолирует ролики — рестарт процесса не нужен
+                cmd = self._build_command(mode, url, cookies, output_template, archive_path)
+                self._run_embedded(cmd)
+            elif self.restart_enabled:
+                self._download_with_restart(mode, url, cookies, output_template, archive_path)
+            else:
+                video_id = youtube_video_id(url) if self.is_single_file else None
+                self._run_single_process(lambda: self._build_command(mode, url, cookies, output_template, archive_path,
+                                                                     video_id=video_id), video_id)
+        except Exception as e:
+            self._log(f"{self.t['download_error']}{e}")
+            self._emit("error", error_class="exception", text=str(e))
+            self.succeeded = False
+        finally:
+            with self.process_lock:
+                self.process = None
+            if self.transcoder is not None:
+                if self.stop_event.is_set():
+                    self.transcoder.stop()
+                else:
+                    self._finish_transcodes()
+            if self.tag:
+                self.status_board.remove_prefix(self.tag)
+            else:
+                self.status_board.clear()
+        
+        ok = self.succeeded and not self.stop_event.is_set()
+        self._emit("run_end", ok=ok, stopped=self.stop_event.is_set(), downloaded=self.downloaded_videos,
+                   total=self.total_videos, seconds=round(time.time() - started, 3))
+        self.events.unsubscribe(self.report)
+        self._show_report()
+        return ok
+    
+    def _show_report(self):
+        """Вывести отчёт о сеансе в лог и сохранить его в REPORT_DIR."""
+        if not self.report.videos:
+            return
+        self._log("")
+        for line in self.report.lines(self.t):
+            self._log(line)
+        try:
+            path = self.report.save(REPORT_DIR, self.events.session)
+        except OSError as e:
+            self._log(self.t["report_save_error"].format(error=e))
+            return
+        self._log(self.t["report_saved"].format(path=path))
+    
+    def estimate_required_space(self):
+        """Оценить место, нужное загрузке (байт), без обращения к сети, или None.
+        
+        Число роликов берётся из кэша списков за вычетом archive.txt (файл
+        только читается — вызывается из validate_inputs в потоке окна), средний
+        размер ролика — из последних отчётов с тем же форматом (REPORT_DIR).
+        Плюс один ролик запаса: при склейке видео и аудио на диске
+        одновременно лежат дорожки и результат.
+        """
+        average = recent_video_size(REPORT_DIR, self._format_selector())
+        if not average:
+            return None
+        if self.is_single_file:
+            pending = 1
+        else:
+            listing = self.listing_cache.load(self.url)
+            if listing is None:
+                return None
+            archive_ids = [make_archive_id(e) for e in listing['entries']]
+            try:
+                archived = archived_subset(self.archive_path, archive_ids)
+            except OSError:
+                return None
+            pending = sum(1 for archive_id in archive_ids if archive_id not in archived)
+        return int(average * (pending + 1)) if pending else 0
+    
+    def disk_space_warning(self):
+        """Предупреждение о нехватке места перед загрузкой (текст) или None."""
+        if not self.min_free_space:
+            return None
+        free = free_disk_space(self.outdir or ".")
+        if free is None:
+            return None
+        needed = self.estimate_required_space()
+        if needed and free < needed + self.min_free_space:
+            return self.t["disk_space_short"].format(free=format_bytes(free), needed=format_bytes(needed),
+                                                     minimum=format_bytes(self.min_free_space))
+        if free < self.min_free_space:
+            return self.t["disk_space_low"].format(free=format_bytes(free), minimum=format_bytes(self.min_free_space))
+        return None
+    
+    def prefetch_listing(self):
+        """Заранее перечислить список роликов, пока идёт другая загрузка.
+        
+        Тогда run() сразу раздаёт ролики по перечисленному списку
+        (как в параллельном режиме). Ничего не делает для одиночных
+        роликов и встроенного движка, у которого своё перечисление.
+        """
+        if not self.uses_archive or (self.embedded_enabled and self.parallel_downloads == 1):
+            return
+        if self.prefetched_entries is None:
+            self.prefetched_entries = self._sync_listing()
+    
+    def _sync_listing(self):
+        """Получить список роликов (через кэш списков) с записью в лог."""
+        if not self.breaker.wait_until_closed(self.stop_event):
+            return []
+        self._log(self.t["enumerating"])
+        # Новые ролики канала всегда в начале — достаточно досинхронизировать «голову»
+        entries, stats = self.listing_cache.sync(self.url, self.cookies, self.stop_event,
+                                                 on_line=self._log, incremental=self.is_channel)
+        if entries:
+            listing_key = "listing_full" if stats['full'] else "listing_incremental"
+            self._log(self.t[listing_key].format(new=stats['new'], cached=stats['cached'],
+                                                 seconds=stats['seconds']))
+            self._emit("enumeration", seconds=round(stats['seconds'], 3), new=stats['new'], cached=stats['cached'],
+                       full=stats['full'])
+        return entries
+    
+    def plan(self):
+        """Оценить объём и время загрузки, ничего не скачивая.
+        
+        Для каждого ролика, которого ещё нет в архиве, yt-dlp выбирает
+        формат по текущим настройкам (-j) — не больше PLAN_WORKERS
+        процессов одновременно. Ответы сохраняются в info_cache, и
+        загрузка в течение INFO_CACHE_TTL берёт их оттуда. Время
+        оценивается по средней скорости последних сеансов (REPORT_DIR).
+        
+        Returns:
+            True, если план составлен (не прерван остановкой)
+        """
+        started = time.time()
+        self._log(self.t["plan_title"])
+        format_selector = self._format_selector()
+        if self.is_single_file:
+            pending = [{'id': youtube_video_id(self.url), 'url': self.url}]
+        else:
+            entries = self._sync_listing()
+            if self.stop_event.is_set():
+                return False
+            archive = open_archive_store(self.archive_path, self.options["archive_backend"])
+            pending = [e for e in entries if make_archive_id(e) not in archive]
+            self._log(self.t["enumerated"].format(
+                total=len(entries), archived=len(entries) - len(pending), pending=len(pending)))
+        if not pending:
+            self._log(self.t["plan_nothing"])
+            return True
+        
+        workers = min(PLAN_WORKERS, len(pending))
+        self._log(self.t["plan_resolving"].format(count=len(pending), workers=workers))
+        totals = {'bytes': 0, 'duration': 0, 'resolved': 0, 'unknown': 0, 'failed': 0, 'cached': 0}
+        totals_lock = threading.Lock()
+        
+        def resolve(worker_id, item):
+            info = self.info_cache.load(item['id'], format_selector) if item['id'] else None
+            cached = info is not None
+            if info is None:
+                info = self._extract_info(item['url'], format_selector, f"[#{worker_id}]")
+            with totals_lock:
+                if info is None:
+                    totals['failed'] += 1
+                    return False
+                size = info_expected_size(info)
+                totals['resolved'] += 1
+                totals['cached'] += cached
+                totals['duration'] += info.get('duration') or 0
+                if size is None:
+                    totals['unknown'] += 1
+                else:
+                    totals['bytes'] += size
+            return True
+        
+        ParallelDownloadPool(workers, self.stop_event).run(pending, resolve)
+        if self.stop_event.is_set():
+            return False
+        
+        rate = recent_throughput(REPORT_DIR)
+        eta = totals['bytes'] / rate if rate else None
+        self._log("")
+        self._log(self.t["plan_result"].format(
+            size=format_bytes(totals['bytes']), duration=format_eta(totals['duration']), resolved=totals['resolved'],
+            unknown=totals['unknown'], failed=totals['failed']))
+        self._log(self.t["plan_cached"].format(cached=totals['cached'], extracted=totals['resolved'] - totals['cached'],
+                                               seconds=time.time() - started))
+        if rate:
+            self._log(self.t["plan_eta"].format(eta=format_eta(eta), rate=format_bytes(rate)))
+        else:
+            self._log(self.t["plan_eta_unknown"])
+        self._emit("plan", pending=len(pending), rate=round(rate) if rate else None,
+                   eta=round(eta) if eta is not None else None, seconds=round(time.time() - started, 3), **totals)
+        return True
+    
+    def reconcile_archive(self):
+        """Сверить archive.txt папки загрузки с файлами на диске, не обращаясь к сети.
+        
+        Ролики находятся по суффиксу «[id]» имён файлов (LibraryScanner),
+        неизменные с прошлой сверки папки не перечитываются. В зависимости
+        от archive_action архив только проверяется, дополняется роликами
+        с диска или пересобирается: ролики, которых нет на диске, тогда
+        скачаются заново. Записи других сайтов (не youtube) сохраняются.
+        
+        Returns:
+            True, если сверка выполнена
+        """
+        root = self.outdir or "."
+        if not os.path.isdir(root):
+            self._log(self.t["archive_scan_no_folder"].format(path=root))
+            return False
+        self._log(self.t["archive_scan_title"].format(path=os.path.abspath(root)))
+        media, partials, stats = LibraryScanner().scan(root, self.stop_event)
+        if self.stop_event.is_set():
+            return False
+        self._log(self.t["archive_scan_stats"].format(**stats))
+        
+        text_path = os.path.join(root, "archive.txt")
+        archive = open_archive_store(text_path, self.options["archive_backend"])
+        entries = archive.all_ids()
+        archived = {entry.split(" ", 1)[1] for entry in entries if entry.startswith("youtube ")}
+        on_disk = {video_id for video_id, _ in media}
+        unrecorded = sorted(on_disk - archived)
+        missing = archived - on_disk
+        self._log(self.t["archive_scan_result"].format(disk=len(on_disk), archived=len(archived),
+                                                       unrecorded=len(unrecorded), missing=len(missing)))
+        if partials:
+            stale = sum(1 for video_id, _, _ in partials if video_id in on_disk)
+            self._log(self.t["archive_scan_partials"].format(
+                count=len(partials), size=format_bytes(sum(size for _, _, size in partials)), stale=stale))
+            for _, path, size in sorted(partials)[:ARCHIVE_SCAN_SHOW]:
+                self._log(f"   {path} ({format_bytes(size)})")
+            if len(partials) > ARCHIVE_SCAN_SHOW:
+                self._log(self.t["archive_scan_more"].format(count=len(partials) - ARCHIVE_SCAN_SHOW))
+        
+        if self.archive_action == "add":
+            added = archive.add_many(f"youtube {video_id}" for video_id in unrecorded)
+            self._log(self.t["archive_scan_added"].format(count=added))
+        elif self.archive_action == "rebuild":
+            kept = [entry for entry in entries if not entry.startswith("youtube ") or entry.split(" ", 1)[1] in on_disk]
+            count = archive.replace_all(kept + [f"youtube {video_id}" for video_id in unrecorded])
+            self._log(self.t["archive_scan_rebuilt"].format(count=count))
+        else:
+            self._log(self.t["archive_scan_verified"])
+        self._emit("archive_scan", action=self.archive_action, dirs=stats['dirs'], files=stats['files'],
+                   reused=stats['reused'], on_disk=len(on_disk), unrecorded=len(unrecorded), missing=len(missing),
+                   partials=len(partials), seconds=round(stats['seconds'], 3))
+        return True
+    
+    def _extract_info(self, url, format_selector, key):
+        """Извлечь info JSON ролика с выбранным форматом (yt-dlp -j) и сохранить его в info_cache.
+        
+        Returns:
+            Словарь info JSON или None (ошибки yt-dlp — в лог)
+        """
+        cmd = [*YTDLP_COMMAND, "-j", "--no-playlist", "-f", format_selector]
+        if self.cookies:
+            cmd.extend(["--cookies", self.cookies])
+        cmd.append(url)
+        
+        output = []
+        
+        def handle_line(line):
+            if line.startswith('{'):
+                output.append(line)
+            elif classify_error_line(line):
+                self._log(f"{key} {line}")
+        
+        get_process_supervisor().run(cmd, handle_line, stop_events=(self.stop_event,),
+                                     idle_timeout=PROCESS_IDLE_TIMEOUT)
+        if not output:
+            return None
+        try:
+            info = json.loads(output[-1])
+        except ValueError:
+            return None
+        if info.get('id'):
+            self.info_cache.save(info['id'], format_selector, output[-1])
+        return info
+    
+    def stop(self):
+        """Остановить загрузку (из любого потока).
+        
+        Returns:
+            False, если остановка уже была запрошена
+        """
+        with self.process_lock:
+            if self.stop_event.is_set():
+                return False
+            # После stop_event новые процессы не запускаются — список полный
+            self.stop_event.set()
+            processes = list(self.worker_processes)
+            if self.process and self.process.poll() is None:
+                processes.append(self.process)
+        if self.transcoder is not None:
+            self.transcoder.stop()
+        
+        # Встроенный движок остановится сам по stop_event, процессы завершаются
+        # в фоне — вызывающий поток (окно) не ждёт их
+        self._terminator = threading.Thread(target=self._terminate_processes, args=(processes,), daemon=True)
+        self._terminator.start()
+        return True
+    
+    def is_stopping(self):
+        """Идёт завершение процессов после stop()."""
+        return self._terminator is not None and self._terminator.is_alive()
+    
+    def wait_stopped(self, timeout=None):
+        """Дождаться завершения процессов после stop(). Returns: True, если все завершены."""
+        if self._terminator is not None:
+            self._terminator.join(timeout)
+        return not self.is_stopping()
+    
+    def _terminate_processes(self, processes):
+        """Завершить процесс загрузки и процессы воркеров (в фоновом потоке)."""
+        key = self._status_key("[stop]")
+        
+        def show_remaining(count):
+            if count:
+                self.status_board.update(key, {'status': 'workers',
+                                               'text': self.t["stopping_processes"].format(count=count)})
+            else:
+                self.status_board.remove(key)
+        
+        terminate_process_trees(processes, on_remaining=show_remaining)
+    
+    def _run_single_process(self, build_command, video_id=None):
+        """Загрузка одним процессом yt-dlp; build_command() строит команду для каждой попытки."""
+        exit_code = self._run_with_retries(
+            "", lambda: self._keep_info_if_reusable("", video_id, lambda: self._run_process(build_command())),
+            video_id)
+        if exit_code is not None:
+            self._report_exit_code(exit_code)
+    
+    def _keep_info_if_reusable(self, key, video_id, run_attempt):
+        """Выполнить попытку; после неудачи не из-за сети удалить info JSON ролика из кэша.
+        
+        Обрыв соединения или ограничение YouTube не портят извлечённые
+        ссылки — повтор берёт их из кэша. После прочих ошибок (HTTP 403,
+        ошибка извлечения) ссылки могли устареть, и ролик извлекается заново.
+        """
+        exit_code = run_attempt()
+        if exit_code not in (None, 0) and video_id:
+            with self.progress_lock:
+                error_classes = set(self._recent_errors.get(key, ()))
+            if not error_classes or error_classes - INFO_REUSABLE_ERRORS:
+                self.info_cache.discard(video_id, self._format_selector())
+        return exit_code
+    
+    def _run_process(self, cmd):
+        """Один запуск процесса yt-dlp. Возвращает код завершения или None."""
+        if self.stop_event.is_set():
+            return None
+        
+        def register(process):
+            with self.process_lock:
+                self.process = process
+        
+        started = self._on_process_start("")
+        exit_code = None
+        try:
+            exit_code = get_process_supervisor().run(cmd, self._dispatch_output_line, stop_events=(self.stop_event,),
+                                                     idle_timeout=PROCESS_IDLE_TIMEOUT, on_start=register)
+            return exit_code
+        finally:
+            self._on_process_exit("", exit_code, started)
+    
+    def _run_embedded(self, cmd):
+        """Загрузка через встроенный движок (yt_dlp API) в текущем потоке."""
+        if self.stop_event.is_set():
+            return
+        
+        def run_attempt():
+            started = self._on_process_start("")
+            exit_code = None
+            try:
+                exit_code = EmbeddedYtDlpEngine(cmd, self._dispatch_output_line, self.stop_event).run()
+                return exit_code
+            finally:
+                self._on_process_exit("", exit_code, started)
+        
+        exit_code = self._run_with_retries("", run_attempt)
+        if exit_code is not None:
+            self._report_exit_code(exit_code)
+    
+    def _report_exit_code(self, exit_code):
+        """Вывести итог загрузки по коду завершения."""
+        if exit_code == 0 and not self._finish_transcodes():
+            exit_code = None
+        self._log("")
+        if exit_code == 0:
+            self.succeeded = True
+            self._log("=" * 70)
+            self._log(f"{self.t['download_success']}".center(70))
+            self._log("=" * 70)
+            if self.total_videos > 0:
+                self.downloaded_videos = self.total_videos
+                self._notify_progress()
+        elif exit_code is not None and not self.stop_event.is_set():
+            self._log(f"{self.t['download_exit_code']}{exit_code}")
+            self._log(self.t["download_exit_hint"])
+    
+    def _download_parallel(self, mode, url, cookies, output_template, archive_path, workers, restart_mode=False):
+        """Загрузка канала/плейлиста по заранее перечисленному списку роликов.
+        
+        Список перечисляется один раз, архив проверяется по индексу сеанса,
+        каждый ролик скачивается отдельным процессом yt-dlp в пуле воркеров.
+        """
+        entries = self.prefetched_entries
+        if entries is None:
+            entries = self._sync_listing()
+        if self.stop_event.is_set():
+            return
+        if not entries:
+            self._log(self.t["enumerate_empty"])
+            return
+        
+        # Архив открыт на весь сеанс; yt-dlp его не перечитывает — проверяет и пишет пул
+        archive = open_archive_store(archive_path, self.options["archive_backend"])
+        pending = [e for e in entries if make_archive_id(e) not in archive]
+        
+        with self.progress_lock:
+            self.total_videos = len(entries)
+            self.downloaded_videos = len(entries) - len(pending)
+        self._notify_progress()
+        self._log(self.t["enumerated"].format(
+            total=len(entries), archived=len(entries) - len(pending), pending=len(pending)))
+        self._emit("listing", total=len(entries), archived=len(entries) - len(pending), pending=len(pending))
+        feeder = None
+        if self.media_library and pending:
+            pending, feeder = self._extract_from_library(pending, archive)
+        self._log("")
+        
+        def run_item(worker_id, item):
+            # Номер и название плейлиста известны из перечисления — подставляем их в шаблон
+            # (при загрузке одного ролика по ссылке yt-dlp их не знает)
+            item_template = output_template.replace("%(playlist_autonumber)05d", f"{item['autonumber']:05d}")
+            if item.get('playlist_title'):
+                item_template = item_template.replace("%(playlist_title)s",
+                                                      template_path_literal(item['playlist_title']))
+            key = f"[#{worker_id}]"
+            
+            def run_attempt():
+                # Команда строится на каждую попытку: повтор берёт info JSON из кэша
+                cmd = self._build_command(mode, item['url'], cookies, item_template, None, item=item)
+                return self._run_worker_process(worker_id, cmd, item['id'])
+            
+            exit_code = self._run_with_retries(key, lambda: self._keep_info_if_reusable(key, item['id'], run_attempt),
+                                               item['id'])
+            with self.progress_lock:
+                source = self._downloaded_files.pop(key, None)
+            if exit_code != 0 or self.stop_event.is_set():
+                return False
+            
+            if self.audio_pipeline and source:
+                # Ждёт, только если ffmpeg отстаёт от загрузки; в архив — после перекодирования
+                self.transcoder.submit(source, on_done=lambda: archive.add(make_archive_id(item)))
+            else:
+                archive.add(make_archive_id(item))
+            with self.progress_lock:
+                self.downloaded_videos = min(self.downloaded_videos + 1, self.total_videos)
+                count = self.downloaded_videos
+            self._notify_progress()
+            if restart_mode:
+                self._log("")
+                self._log(self.t["restarting_process"].format(count=count))
+                self._log("")
+            return True
+        
+        if self.adaptive and workers > 1:
+            self.concurrency = AdaptiveConcurrency(workers, on_change=self._on_concurrency_change)
+            self._show_concurrency()
+        pool = ParallelDownloadPool(workers, self.stop_event, controller=self.concurrency)
+        _, failed = pool.run(pending, run_item)
+        if feeder is not None:
+            while feeder.is_alive() and not self.stop_event.is_set():
+                feeder.join(0.5)
+        transcoded = self._finish_transcodes()
+        
+        if self.stop_event.is_set():
+            return
+        if failed:
+            self._log("")
+            self._log(self.t["parallel_failed"].format(count=failed))
+        elif not transcoded:
+            return
+        elif restart_mode:
+            self._log("")
+            self._log("=" * 70)
+            self._log(f"{self.t['all_videos_downloaded']}".center(70))
+            self.succeeded = True
+            self._log("=" * 70)
+        else:
+            self._report_exit_code(0)
+    
+    def _extract_from_library(self, pending, archive):
+        """Извлечь аудио из роликов, уже скачанных в медиатеку.
+        
+        Найденные ролики передаются конвейеру перекодирования из отдельного
+        потока, пока пул качает остальные. Результат кладётся по тому же
+        относительному пути, что и видео в медиатеке.
+        
+        Returns:
+            Кортеж (ролики для загрузки, поток подачи или None)
+        """
+        started = time.time()
+        library = scan_media_library(self.media_library, self.stop_event)
+        local = [item for item in pending if item['id'] in library]
+        self._log(self.t["library_scanned"].format(files=len(library), found=len(local), pending=len(pending),
+                                                   seconds=time.time() - started))
+        if not local:
+            return pending, None
+        
+        def on_extracted(item):
+            archive.add(make_archive_id(item))
+            with self.progress_lock:
+                self.downloaded_videos = min(self.downloaded_videos + 1, self.total_videos)
+            self._notify_progress()
+        
+        def feed():
+            for item in local:
+                if self.stop_event.is_set():
+                    return
+                source = library[item['id']]
+                relative = os.path.relpath(source, self.media_library)
+                target_base = os.path.splitext(os.path.join(self.outdir, relative))[0]
+                self.transcoder.submit(source, on_done=lambda item=item: on_extracted(item), target_base=target_base)
+        
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        local_ids = {item['id'] for item in local}
+        return [item for item in pending if item['id'] not in local_ids], feeder
+    
+    def _run_worker_process(self, worker_id, cmd, video_id=None):
+        """Запустить yt-dlp для одного ролика в воркере пула. Возвращает код завершения или None."""
+        if self.stop_event.is_set():
+            return None
+        
+        key = f"[#{worker_id}]"
+        processes = []
+        
+        def register(process):
+            processes.append(process)
+            with self.process_lock:
+                self.worker_processes.add(process)
+        
+        if video_id:
+            self._track_video(video_id, key)
+        started = self._on_process_start(key)
+        exit_code = None
+        try:
+            exit_code = get_process_supervisor().run(cmd, lambda line: self._dispatch_output_line(line, key),
+                                                     stop_events=(self.stop_event,),
+                                                     idle_timeout=PROCESS_IDLE_TIMEOUT, on_start=register)
+            return exit_code
+        finally:
+            self.status_board.remove(self._status_key(key))
+            with self.process_lock:
+                self.worker_processes.difference_update(processes)
+            self._on_process_exit(key, exit_code, started)
+    
+    def _download_with_restart(self, mode, url, cookies, output_template, archive_path):
+        """Рестарт после каждого ролика: новый процесс yt-dlp на каждый ролик.
+        
+        Канал перечисляется один раз, а архив проверяется по индексу сеанса,
+        поэтому запуск процесса не перечитывает archive.txt и не сканирует канал заново.
+        """
+        self._download_parallel(mode, url, cookies, output_template, archive_path,
+                                workers=1, restart_mode=True)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ОЧЕРЕДЬ ЗАДАНИЙ
+# ══════════════════════════════════════════════════════════════════════════════
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Короткие имена источников аудио (CLI и файл заданий)
+AUDIO_SOURCE_ALIASES = {
+    "video": DownloadEngine.AUDIO_SOURCE_VIDEO,
+    "playlist": DownloadEngine.AUDIO_SOURCE_PLAYLIST,
+    "channel": DownloadEngine.AUDIO_SOURCE_CHANNEL,
+}
+
+# Ключи строки файла заданий → ключи настроек
+JOB_FILE_KEYS = {
+    "mode": "mode",
+    "quality": "video_quality",
+    "audio_source": "audio_source",
+    "audio_format": "audio_format",
+    "bitrate": "audio_bitrate",
+    "outdir": "outdir",
+    "cookies": "cookies",
+    "parallel": "parallel_downloads",
+    "adaptive": "adaptive_parallel",
+    "restart": "restart_each_video",
+    "embedded": "embedded_engine",
+    "archive_backend": "archive_backend",
+    "retries": "retry_attempts",
+    "retry_max_sleep": "retry_max_sleep",
+    "retry_budget": "retry_budget",
+    "fragments": "concurrent_fragments",
+    "http_chunk_size": "http_chunk_size",
+    "buffer_size": "buffer_size",
+    "aria2c": "external_downloader",
+    "aria2_connections": "aria2_connections",
+    "aria2_split_size": "aria2_split_size",
+    "audio_pipeline": "audio_pipeline",
+    "transcode_workers": "transcode_workers",
+    "library": "media_library",
+    "min_free": "min_free_space",
+}
+
+
+def parse_job_file(path, base_options):
+    """Прочитать файл заданий: одна строка — один URL и необязательные key=value.
+
+    Пример строки:
+        https://youtube.com/@channel mode=channel quality=1080p priority=5 outdir="D:/YouTube"
+
+    Пустые строки и строки, начинающиеся с #, пропускаются.
+
+    Args:
+        path: Путь к текстовому файлу
+        base_options: Настройки по умолчанию для всех заданий
+
+    Returns:
+        Список кортежей (options, priority)
+
+    Raises:
+        ValueError: Неизвестный ключ или недопустимое значение (с номером строки)
+    """
+    valid_values = {
+        "mode": DownloadEngine.MODES,
+        "video_quality": [q[0] for q in VIDEO_QUALITIES],
+        "audio_source": DownloadEngine.AUDIO_SOURCES,
+        "audio_format": AUDIO_FORMATS,
+        "audio_bitrate": [b[0] for b in AUDIO_BITRATES],
+        "archive_backend": ARCHIVE_BACKENDS,
+    }
+
+    jobs = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            # shlex без escape-символа — чтобы не портить пути Windows
+            lexer = shlex.shlex(line, posix=True)
+            lexer.whitespace_split = True
+            lexer.escape = ''
+            lexer.commenters = ''
+            try:
+                tokens = list(lexer)
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}")
+
+            options = dict(base_options)
+            options["url"] = tokens[0]
+            priority = 0
+            for token in tokens[1:]:
+                key, sep, value = token.partition('=')
+                if not sep:
+                    raise ValueError(f"line {line_no}: expected key=value, got '{token}'")
+                if key == "priority":
+                    try:
+                        priority = int(value)
+                    except ValueError:
+                        raise ValueError(f"line {line_no}: priority must be an integer")
+                    continue
+                if key not in JOB_FILE_KEYS:
+                    raise ValueError(f"line {line_no}: unknown key '{key}'")
+
+                option = JOB_FILE_KEYS[key]
+                if option == "audio_source":
+                    value = AUDIO_SOURCE_ALIASES.get(value, value)
+                elif option in ("restart_each_video", "embedded_engine", "adaptive_parallel", "external_downloader",
+                                "audio_pipeline"):
+                    value = value.lower() in ("1", "true", "yes", "on")
+                elif option in RETRY_LIMITS or option in PERFORMANCE_LIMITS or option in ARIA2C_LIMITS or \
+                        option in TRANSCODE_LIMITS:
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        raise ValueError(f"line {line_no}: {key} must be an integer")
+                    if option in PERFORMANCE_LIMITS:
+                        # Заданное вручную значение отключает авто-режим
+                        options["performance_auto"] = False
+                elif option in ("outdir", "cookies", "media_library") and value:
+                    # Относительные пути — от папки файла заданий
+                    value = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(path)), value))
+                if option in valid_values and value not in valid_values[option]:
+                    raise ValueError(f"line {line_no}: invalid {key} '{value}'")
+                options[option] = value
+            jobs.append((options, priority))
+    return jobs
+
+
+class JobQueue:
+    """Очередь заданий загрузки, сохраняемая на диск.
+
+    Задание — словарь: id, options (настройки как в SettingsManager),
+    priority (больше — раньше), status, added_at, finished_at.
+    Задания, прерванные закрытием программы, при загрузке снова
+    становятся ожидающими.
+    """
+
+    def __init__(self, path=JOBS_FILE):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.jobs = []
+        self.next_id = 1
+        # Растёт при каждом изменении — UI перерисовывает список по нему
+        self.version = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            jobs = [job for job in data.get("jobs", []) if job.get("id") and job.get("options")]
+            next_id = int(data.get("next_id", 1))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return
+
+        with self.lock:
+            for job in jobs:
+                if job.get("status") == JOB_RUNNING:
+                    job["status"] = JOB_PENDING
+            self.jobs = jobs
+            self.next_id = max([next_id] + [job["id"] + 1 for job in jobs])
+            self.version += 1
+
+    def _save(self):
+        """Записать очередь на диск (вызывать под lock)."""
+        self.version += 1
+        try:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"next_id": self.next_id, "jobs": self.jobs}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def add(self, options, priority=0):
+        """Добавить задание. Возвращает его копию."""
+        with self.lock:
+            job = {
+                "id": self.next_id,
+                "options": dict(options),
+                "priority": int(priority),
+                "status": JOB_PENDING,
+                "added_at": time.time(),
+                "finished_at": None,
+            }
+            self.next_id += 1
+            self.jobs.append(job)
+            self._save()
+            return dict(job)
+
+    def remove(self, job_id):
+        """Удалить задание (выполняющееся не удаляется)."""
+        with self.lock:
+            before = len(self.jobs)
+            self.jobs = [job for job in self.jobs
+                         if job["id"] != job_id or job["status"] == JOB_RUNNING]
+            if len(self.jobs) != before:
+                self._save()
+
+    def clear_finished(self):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job["status"] not in (JOB_DONE, JOB_FAILED)]
+            self._save()
+
+    def requeue_finished(self):
+        """Вернуть завершённые задания в ожидание (периодическая синхронизация)."""
+        with self.lock:
+            for job in self.jobs:
+                if job["status"] in (JOB_DONE, JOB_FAILED):
+                    job["status"] = JOB_PENDING
+            self._save()
+
+    def snapshot(self):
+        """Копия заданий в порядке выполнения."""
+        with self.lock:
+            return [dict(job) for job in sorted(self.jobs, key=self._order_key)]
+
+    @staticmethod
+    def _order_key(job):
+        status_order = {JOB_RUNNING: 0, JOB_PENDING: 1}
+        return (status_order.get(job["status"], 2), -job["priority"], job["id"])
+
+    def _pending(self, exclude=()):
+        pending = [job for job in self.jobs if job["status"] == JOB_PENDING and job["id"] not in exclude]
+        return min(pending, key=self._order_key) if pending else None
+
+    def has_pending(self):
+        with self.lock:
+            return self._pending() is not None
+
+    def pending_count(self):
+        """Число ожидающих заданий."""
+        with self.lock:
+            return sum(1 for job in self.jobs if job["status"] == JOB_PENDING)
+
+    def peek_next(self, exclude=()):
+        """Следующее ожидающее задание (без изменения статуса) или None."""
+        with self.lock:
+            job = self._pending(exclude)
+            return dict(job) if job else None
+
+    def claim_next(self):
+        """Взять следующее задание в работу (статус running) или None."""
+        with self.lock:
+            job = self._pending()
+            if job is None:
+                return None
+            job["status"] = JOB_RUNNING
+            self._save()
+            return dict(job)
+
+    def set_status(self, job_id, status):
+        with self.lock:
+            for job in self.jobs:
+                if job["id"] == job_id:
+                    job["status"] = status
+                    job["finished_at"] = time.time() if status in (JOB_DONE, JOB_FAILED) else None
+                    self._save()
+                    return
+
+
+class JobScheduler:
+    """Выполнение очереди заданий: по приоритету, не более concurrency одновременно.
+
+    Пока задания загружаются, следующее задание в очереди заранее
+    перечисляет свой список роликов (DownloadEngine.prefetch_listing),
+    так что при освобождении слота загрузка начинается сразу.
+
+    Args:
+        job_queue: JobQueue
+        concurrency: Число одновременно выполняемых заданий
+        lang: Язык сообщений
+        on_log: Обработчик строк лога
+        on_progress: Обработчик счётчиков роликов текущего задания
+        status_board: Общий StatusBoard для живых строк прогресса
+        breaker_cooldown: Пауза общего для всех заданий предохранителя, секунд
+        events: Общий EventStream заданий (если не задан — свой, с on_log в качестве подписчика)
+    """
+
+    def __init__(self, job_queue, concurrency=1, lang="en", on_log=None, on_progress=None, status_board=None,
+                 breaker_cooldown=SettingsManager.DEFAULT_SETTINGS["breaker_cooldown"], events=None):
+        self.queue = job_queue
+        self.concurrency = min(max(int(concurrency), 1), MAX_CONCURRENT_JOBS)
+        self.lang = lang
+        self.t = TRANSLATIONS[lang]
+        self.events = events if events is not None else EventStream()
+        if on_log is not None:
+            self.events.subscribe(log_consumer(on_log))
+        self.on_progress = on_progress
+        self.status_board = status_board or StatusBoard()
+        # Ограничение YouTube действует на все задания сразу
+        self.breaker = CircuitBreaker(breaker_cooldown)
+
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        # Сигнал планировщику: задание завершилось или перечисление готово
+        self.wake = threading.Event()
+        self.running = {}
+        self.prefetched = {}
+        self.prefetch_thread = None
+        self.prefetch_engine = None
+        self.done = 0
+        self.failed = 0
+
+    def _make_engine(self, job):
+        return DownloadEngine(job["options"], lang=self.lang, on_progress=self.on_progress,
+                              status_board=self.status_board, tag=f"[J{job['id']}]", breaker=self.breaker,
+                              events=self.events)
+
+    def _log(self, message):
+        self.events.emit("log", text=message)
+
+    def run(self):
+        """Выполнить все ожидающие задания (блокирует поток).
+
+        Returns:
+            True, если все задания выполнены успешно
+        """
+        if not self.queue.has_pending():
+            self._log(self.t["queue_empty"])
+            return True
+
+        while not self.stop_event.is_set():
+            with self.lock:
+                # Во время паузы предохранителя новые задания не начинаем
+                paused = self.breaker.is_paused()
+                while len(self.running) < self.concurrency and not paused:
+                    job = self.queue.claim_next()
+                    if job is None:
+                        break
+                    engine = self.prefetched.pop(job["id"], None) or self._make_engine(job)
+                    self.running[job["id"]] = engine
+                    threading.Thread(target=self._run_job, args=(job, engine), daemon=True).start()
+
+                if self.running and not paused:
+                    self._start_prefetch()
+                elif not self.queue.has_pending():
+                    break
+
+            self.wake.wait(0.5)
+            self.wake.clear()
+
+        # При остановке дожидаемся завершения процессов заданий
+        while True:
+            with self.lock:
+                if not self.running:
+                    break
+            self.wake.wait(0.5)
+            self.wake.clear()
+
+        if not self.stop_event.is_set():
+            self._log("")
+            self._log(self.t["queue_done"].format(done=self.done, failed=self.failed))
+        return self.failed == 0 and not self.stop_event.is_set()
+
+    def _start_prefetch(self):
+        """Начать перечисление следующего задания (вызывать под lock)."""
+        if self.prefetch_thread is not None and self.prefetch_thread.is_alive():
+            return
+        job = self.queue.peek_next(exclude=self.prefetched)
+        if job is None:
+            return
+        engine = self._make_engine(job)
+        self.prefetched[job["id"]] = engine
+        self.prefetch_engine = engine
+        self.prefetch_thread = threading.Thread(target=self._prefetch, args=(engine,), daemon=True)
+        self.prefetch_thread.start()
+
+    def _prefetch(self, engine):
+        try:
+            engine.prefetch_listing()
+        except Exception as e:
+            self._log(f"{self.t['download_error']}{e}")
+        finally:
+            self.wake.set()
+
+    def _run_job(self, job, engine):
+        options = job["options"]
+        mode_name = self.t.get(f"mode_{options.get('mode')}", options.get('mode'))
+        self._log(self.t["job_started"].format(id=job["id"], mode=mode_name, url=options.get("url", "")))
+        self.events.emit("job_start", job=f"J{job['id']}", url=options.get("url", ""), mode=options.get("mode"),
+                         priority=job["priority"])
+        started = time.time()
+
+        # Задание взято в работу, пока его список ещё перечисляется — дожидаемся
+        prefetch_thread = self.prefetch_thread
+        if prefetch_thread is not None and self.prefetch_engine is engine:
+            prefetch_thread.join()
+        
+        ok = False
+        try:
+            ok = engine.run()
+        finally:
+            if engine.stop_event.is_set():
+                # Остановленное задание продолжится при следующем запуске очереди
+                self.queue.set_status(job["id"], JOB_PENDING)
+            else:
+                self.queue.set_status(job["id"], JOB_DONE if ok else JOB_FAILED)
+                key = "job_finished_ok" if ok else "job_finished_failed"
+                self._log(self.t[key].format(id=job["id"]))
+            self.events.emit("job_end", job=f"J{job['id']}", ok=ok, stopped=engine.stop_event.is_set(),
+                             seconds=round(time.time() - started, 3))
+            with self.lock:
+                self.running.pop(job["id"], None)
+                if ok:
+                    self.done += 1
+                elif not engine.stop_event.is_set():
+                    self.failed += 1
+            self.wake.set()
+
+    def stop(self):
+        """Остановить все задания (из любого потока)."""
+        if self.stop_event.is_set():
+            return False
+        self.stop_event.set()
+        with self.lock:
+            engines = list(self.running.values()) + list(self.prefetched.values())
+        for engine in engines:
+            engine.stop()
+        self.wake.set()
+        return True
+
+    def is_stopping(self):
+        """Идёт завершение процессов заданий после stop()."""
+        with self.lock:
+            engines = list(self.running.values()) + list(self.prefetched.values())
+        return any(engine.is_stopping() for engine in engines)
+
+    def wait_stopped(self, timeout=None):
+        """Дождаться завершения процессов всех заданий. Returns: True, если все завершены."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.lock:
+            engines = list(self.running.values()) + list(self.prefetched.values())
+        for engine in engines:
+            engine.wait_stopped(None if deadline is None else max(deadline - time.time(), 0))
+        return not self.is_stopping()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  КОНТЕКСТНОЕ МЕНЮ / CONTEXT MENU
+# ══════════════════════════════════════════════════════════════════════════════
+
+class ContextMenuManager:
+    """Менеджер контекстных меню для текстовых полей."""
+    
+    def __init__(self, lang="en"):
+        self.t = TRANSLATIONS[lang]
+    
+    def bind_entry(self, entry_widget):
+        """Привязать контекстное меню к полю ввода Entry."""
+        menu = tk.Menu(entry_widget, tearoff=0)
+        
+        menu.add_command(label=self.t["ctx_cut"], accelerator="Ctrl+X",
+                        command=lambda: self._cut(entry_widget))
+        menu.add_command(label=self.t["ctx_copy"], accelerator="Ctrl+C",
+                        command=lambda: self._copy(entry_widget))
+        menu.add_command(label=self.t["ctx_paste"], accelerator="Ctrl+V",
+                        command=lambda: self._paste(entry_widget))
+        menu.add_separator()
+        menu.add_command(label=self.t["ctx_select_all"], accelerator="Ctrl+A",
+                        command=lambda: self._select_all_entry(entry_widget))
+        menu.add_separator()
+        menu.add_command(label=self.t["ctx_clear"],
+                        command=lambda: self._clear_entry(entry_widget))
+        
+        entry_widget.bind("<Button-3>", lambda e: self._show_menu(e, menu, entry_widget))
+        
+        entry_widget.bind("<Control-a>", lambda e: self._select_all_entry(entry_widget) or "break")
+        entry_widget.bind("<Control-A>", lambda e: self._select_all_entry(entry_widget) or "break")
+    
+    def bind_text(self, text_widget, readonly=False):
+        """Привязать контекстное меню к текстовому полю Text/ScrolledText."""
+        menu = tk.Menu(text_widget, tearoff=0)
+        
+        if not readonly:
+            menu.add_command(label=self.t["ctx_cut"], accelerator="Ctrl+X",
+                            command=lambda: self._cut_text(text_widget))
+        
+        menu.add_command(label=self.t["ctx_copy"], accelerator="Ctrl+C",
+                        command=lambda: self._copy_text(text_widget))
+        
+        if not readonly:
+            menu.add_command(label=self.t["ctx_paste"], accelerator="Ctrl+V",
+                            command=lambda: self._paste_text(text_widget))
+        
+        menu.add_separator()
+        menu.add_command(label=self.t["ctx_select_all"], accelerator="Ctrl+A",
+                        command=lambda: self._select_all_text(text_widget))
+        
+        if not readonly:
+            menu.add_separator()
+            menu.add_command(label=self.t["ctx_clear"],
+                            command=lambda: self._clear_text(text_widget))
+        
+        text_widget.bind("<Button-3>", lambda e: self._show_menu(e, menu, text_widget))
+        
+        text_widget.bind("<Control-a>", lambda e: self._select_all_text(text_widget) or "break")
+        text_widget.bind("<Control-A>", lambda e: self._select_all_text(text_widget) or "break")
+        text_widget.bind("<Control-c>", lambda e: self._copy_text(text_widget))
+        text_widget.bind("<Control-C>", lambda e: self._copy_text(text_widget))
+    
+    def _show_menu(self, event, menu, widget):
+        widget.focus_set()
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+    
+    def _cut(self, widget):
+        widget.event_generate("<<Cut>>")
+    
+    def _copy(self, widget):
+        widget.event_generate("<<Copy>>")
+    
+    def _paste(self, widget):
+        widget.event_generate("<<Paste>>")
+    
+    def _select_all_entry(self, widget):
+        widget.select_range(0, tk.END)
+        widget.icursor(tk.END)
+    
+    def _clear_entry(self, widget):
+        widget.delete(0, tk.END)
+    
+    def _cut_text(self, widget):
+        try:
+            widget.event_generate("<<Cut>>")
+        except Exception:
+            pass
+    
+    def _copy_text(self, widget):
+        try:
+            if widget.tag_ranges(tk.SEL):
+                widget.event_generate("<<Copy>>")
+        except Exception:
+            pass
+    
+    def _paste_text(self, widget):
+        try:
+            widget.event_generate("<<Paste>>")
+        except Exception:
+            pass
+    
+    def _select_all_text(self, widget):
+        widget.tag_add(tk.SEL, "1.0", tk.END)
+        widget.mark_set(tk.INSERT, "1.0")
+        widget.see(tk.INSERT)
+    
+    def _clear_text(self, widget):
+        widget.delete("1.0", tk.END)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ОКНО ВЫБОРА ЯЗЫКА
+# ══════════════════════════════════════════════════════════════════════════════
+
+class LanguageSelector:
+    def __init__(self):
+        self.selected_language = None
+        self.root = tk.Tk()
+        self.root.title("Language / Язык")
+        self.root.resizable(False, False)
+        
+        width, height = 400, 200
+        x = (self.root.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.root.winfo_screenheight() // 2) - (height // 2)
+        self.root.geometry(f'{width}x{height}+{x}+{y}')
+        self.root.configure(bg='#2b2b3d')
+        self._create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+    
+    def _create_widgets(self):
+        title_frame = tk.Frame(self.root, bg='#2b2b3d')
+        title_frame.pack(expand=True, fill='both')
+        
+        tk.Label(title_frame, text="Язык / Language", font=get_available_font(FONT_FAMILY, 24, 'bold'),
+                 fg='#ffffff', bg='#2b2b3d').pack(pady=(30, 40))
+        
+        buttons_frame = tk.Frame(title_frame, bg='#2b2b3d')
+        buttons_frame.pack(expand=True)
+        
+        btn_style = {'font': get_available_font(FONT_FAMILY, 18, 'bold'), 'width': 8, 'height': 2,
+                     'cursor': 'hand2', 'relief': 'flat', 'borderwidth': 0}
+        
+        eng_btn = tk.Button(buttons_frame, text="ENG", command=lambda: self._select_language("en"),
+                            bg='#4a90d9', fg='white', activebackground='#357abd', activeforeground='white', **btn_style)
+        eng_btn.pack(side='left', padx=20)
+        eng_btn.bind('<Enter>', lambda e: eng_btn.configure(bg='#357abd'))
+        eng_btn.bind('<Leave>', lambda e: eng_btn.configure(bg='#4a90d9'))
+        
+        rus_btn = tk.Button(buttons_frame, text="RUS", command=lambda: self._select_language("ru"),
+                            bg='#d94a4a', fg='white', activebackground='#bd3737', activeforeground='white', **btn_style)
+        rus_btn.pack(side='left', padx=20)
+        rus_btn.bind('<Enter>', lambda e: rus_btn.configure(bg='#bd3737'))
+        rus_btn.bind('<Leave>', lambda e: rus_btn.configure(bg='#d94a4a'))
+    
+    def _select_language(self, lang):
+        self.selected_language = lang
+        self.root.destroy()
+    
+    def _on_close(self):
+        self.selected_language = None
+        self.root.destroy()
+    
+    def run(self):
+        self.root.mainloop()
+        return self.selected_language
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ДИАЛОГИ ВЫБОРА ФАЙЛОВ/ПАПОК
+# ══════════════════════════════════════════════════════════════════════════════
+
+class NativeDialogs:
+    def __init__(self, lang="en"):
+        self.t = TRANSLATIONS[lang]
+    
+    def _try_win32_folder(self, initial_dir=None):
+        try:
+            import pythoncom
             from win32com.shell import shell, shellcon
             fd = pythoncom.CoCreateInstance(shell.CLSID_FileOpenDialog, None,
                                             pythoncom.CLSCTX_INPROC_SERVER, shell.IID_IFileOpenDialog)
@@ -810,15 +5743,15 @@ class NativeDialogs:
 # ══════════════════════════════════════════════════════════════════════════════
 
 class YouTubeDownloader:
-    MODE_CHANNEL = "channel"
-    MODE_PLAYLIST = "playlist"
-    MODE_VIDEO = "video"
-    MODE_AUDIO = "audio"
+    MODE_CHANNEL = DownloadEngine.MODE_CHANNEL
+    MODE_PLAYLIST = DownloadEngine.MODE_PLAYLIST
+    MODE_VIDEO = DownloadEngine.MODE_VIDEO
+    MODE_AUDIO = DownloadEngine.MODE_AUDIO
     
     # Источники для режима аудио
-    AUDIO_SOURCE_VIDEO = "audio_video"
-    AUDIO_SOURCE_PLAYLIST = "audio_playlist"
-    AUDIO_SOURCE_CHANNEL = "audio_channel"
+    AUDIO_SOURCE_VIDEO = DownloadEngine.AUDIO_SOURCE_VIDEO
+    AUDIO_SOURCE_PLAYLIST = DownloadEngine.AUDIO_SOURCE_PLAYLIST
+    AUDIO_SOURCE_CHANNEL = DownloadEngine.AUDIO_SOURCE_CHANNEL
     
     def __init__(self, root, lang="en", settings_manager=None):
         self.root = root
@@ -830,21 +5763,57 @@ class YouTubeDownloader:
         self.root.geometry("1000x900")
         self.root.minsize(800, 600)
         
-        self.process = None
-        # Thread-safe механизм остановки
-        self.stop_event = threading.Event()
-        self.process_lock = threading.Lock()
+        # Текущая загрузка: DownloadEngine или JobScheduler (у обоих есть run/stop/stop_event)
+        self.runner = None
+        self.download_running = False
+        # Журнал событий текущей загрузки (JsonlEventWriter или None)
+        self.event_writer = None
+        # Очередь заданий (сохраняется на диск)
+        self.job_queue = JobQueue()
+        self._queue_version = None
+        # Метрики копятся за всё время работы окна, сервер — по настройке порта
+        self.metrics = MetricsRegistry(queue_depth=self.job_queue.pending_count)
+        self.metrics_server = None
         
-        self.total_videos = 0
-        self.downloaded_videos = 0
         self.current_mode = tk.StringVar(value=self.MODE_CHANNEL)
         self.restart_each_video = tk.BooleanVar(value=False)
+        self.embedded_engine = tk.BooleanVar(value=False)
+        self.parallel_downloads = tk.IntVar(value=1)
+        self.adaptive_parallel = tk.BooleanVar(value=False)
+        self.archive_backend = tk.StringVar(value="text")
+        self.job_priority = tk.IntVar(value=0)
+        self.job_concurrency = tk.IntVar(value=1)
+        self.retry_attempts = tk.IntVar(value=10)
+        self.retry_max_sleep = tk.IntVar(value=300)
+        self.retry_budget = tk.IntVar(value=100)
+        self.breaker_cooldown = tk.IntVar(value=300)
+        self.min_free_space = tk.IntVar(value=2)
+        self.performance_auto = tk.BooleanVar(value=True)
+        self.concurrent_fragments = tk.IntVar(value=4)
+        self.http_chunk_size = tk.IntVar(value=10)
+        self.buffer_size = tk.IntVar(value=16)
+        self.external_downloader = tk.BooleanVar(value=False)
+        self.aria2_connections = tk.IntVar(value=8)
+        self.aria2_split_size = tk.IntVar(value=1)
+        self.event_log = tk.BooleanVar(value=True)
+        self.metrics_port = tk.IntVar(value=0)
         
         self.video_quality = tk.StringVar(value="max")
         self.audio_format = tk.StringVar(value="wav")
         self.audio_bitrate = tk.StringVar(value="max")
+        self.audio_pipeline = tk.BooleanVar(value=True)
+        self.transcode_workers = tk.IntVar(value=0)
+        self.media_library_var = tk.StringVar()
         self.audio_source = tk.StringVar(value=self.AUDIO_SOURCE_VIDEO)
         
+        # Строки из потоков загрузки попадают в лог через буфер
+        self.log_sink = LogSink()
+        # Остальные обновления окна из фоновых потоков — через единый канал
+        self.ui = UiChannel()
+        # Промежуточный прогресс — отдельные живые строки вместо лога
+        self.status_board = StatusBoard()
+        self.status_labels = {}
+        
         self.dialogs = NativeDialogs(lang)
         self.ctx_menu = ContextMenuManager(lang)
         
@@ -856,11 +5825,13 @@ class YouTubeDownloader:
         self._setup_styles()
         self._create_widgets()
         self._load_settings()
+        self._update_metrics_server()
         
         # Сохранение настроек при закрытии
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         
         self.root.after(200, lambda: threading.Thread(target=self._check_dependencies_thread, daemon=True).start())
+        self.root.after(LOG_REFRESH_MS, self._drain_log_sink)
     
     def _load_settings(self):
         """Загрузить сохранённые настройки."""
@@ -891,6 +5862,10 @@ class YouTubeDownloader:
         valid_bitrates = [b[0] for b in AUDIO_BITRATES]
         if settings.get("audio_bitrate") in valid_bitrates:
             self.audio_bitrate.set(settings["audio_bitrate"])
+        self.audio_pipeline.set(settings.get("audio_pipeline", True))
+        self.transcode_workers.set(clamp_int_option(settings, TRANSCODE_LIMITS, "transcode_workers"))
+        if settings.get("media_library"):
+            self.media_library_var.set(settings["media_library"])
         
         # Валидация источника аудио
         valid_audio_sources = [self.AUDIO_SOURCE_VIDEO, self.AUDIO_SOURCE_PLAYLIST, self.AUDIO_SOURCE_CHANNEL]
@@ -898,14 +5873,47 @@ class YouTubeDownloader:
             self.audio_source.set(settings["audio_source"])
         
         self.restart_each_video.set(settings.get("restart_each_video", False))
+        self.embedded_engine.set(settings.get("embedded_engine", False))
+        
+        # Валидация числа параллельных загрузок
+        try:
+            parallel = int(settings.get("parallel_downloads", 1))
+        except (TypeError, ValueError):
+            parallel = 1
+        self.parallel_downloads.set(min(max(parallel, 1), MAX_PARALLEL_DOWNLOADS))
+        self.adaptive_parallel.set(settings.get("adaptive_parallel", False))
+        
+        if settings.get("archive_backend") in ARCHIVE_BACKENDS:
+            self.archive_backend.set(settings["archive_backend"])
+        
+        try:
+            concurrency = int(settings.get("job_concurrency", 1))
+        except (TypeError, ValueError):
+            concurrency = 1
+        self.job_concurrency.set(min(max(concurrency, 1), MAX_CONCURRENT_JOBS))
+        
+        for name in RETRY_LIMITS:
+            getattr(self, name).set(clamp_int_option(settings, RETRY_LIMITS, name))
+        
+        self.performance_auto.set(settings.get("performance_auto", True))
+        for name in PERFORMANCE_LIMITS:
+            getattr(self, name).set(clamp_int_option(settings, PERFORMANCE_LIMITS, name))
+        
+        self.external_downloader.set(settings.get("external_downloader", False))
+        for name in ARIA2C_LIMITS:
+            getattr(self, name).set(clamp_int_option(settings, ARIA2C_LIMITS, name))
+        self.event_log.set(settings.get("event_log", True))
+        self.metrics_port.set(clamp_int_option(settings, METRICS_LIMITS, "metrics_port"))
+        self.min_free_space.set(clamp_int_option(settings, DISK_LIMITS, "min_free_space"))
         
         # Обновляем UI под загруженный режим
         self._on_mode_change()
         self._on_audio_format_change()
+        self._on_performance_mode_change()
     
-    def _save_settings(self):
-        """Сохранить текущие настройки."""
-        settings = {
+    def _current_settings(self):
+        """Текущие настройки из элементов управления."""
+        return {
             "mode": self.current_mode.get(),
             "url": self.url_var.get(),
             "outdir": self.outdir_var.get(),
@@ -913,29 +5921,52 @@ class YouTubeDownloader:
             "video_quality": self.video_quality.get(),
             "audio_format": self.audio_format.get(),
             "audio_bitrate": self.audio_bitrate.get(),
+            "audio_pipeline": self.audio_pipeline.get(),
+            "transcode_workers": self._get_spinbox_value(self.transcode_workers, *TRANSCODE_LIMITS["transcode_workers"]),
+            "media_library": self.media_library_var.get().strip(),
             "audio_source": self.audio_source.get(),
             "restart_each_video": self.restart_each_video.get(),
+            "embedded_engine": self.embedded_engine.get(),
+            "parallel_downloads": self._get_parallel_downloads(),
+            "adaptive_parallel": self.adaptive_parallel.get(),
+            "archive_backend": self.archive_backend.get(),
+            "job_concurrency": self._get_spinbox_value(self.job_concurrency, 1, MAX_CONCURRENT_JOBS),
+            **{name: self._get_spinbox_value(getattr(self, name), *RETRY_LIMITS[name]) for name in RETRY_LIMITS},
+            "performance_auto": self.performance_auto.get(),
+            **{name: self._get_spinbox_value(getattr(self, name), *PERFORMANCE_LIMITS[name])
+               for name in PERFORMANCE_LIMITS},
+            "external_downloader": self.external_downloader.get(),
+            **{name: self._get_spinbox_value(getattr(self, name), *ARIA2C_LIMITS[name]) for name in ARIA2C_LIMITS},
+            "event_log": self.event_log.get(),
+            "metrics_port": self._get_spinbox_value(self.metrics_port, *METRICS_LIMITS["metrics_port"]),
+            "min_free_space": self._get_spinbox_value(self.min_free_space, *DISK_LIMITS["min_free_space"]),
         }
-        self.settings_manager.save(settings)
+    
+    def _save_settings(self):
+        """Сохранить текущие настройки."""
+        self.settings_manager.save(self._current_settings())
     
     def _on_close(self):
         """Обработчик закрытия окна."""
         self._save_settings()
         
-        # Останавливаем процесс если запущен
-        self.stop_event.set()
-        with self.process_lock:
-            if self.process:
-                try:
-                    self.process.terminate()
-                    try:
-                        self.process.wait(timeout=PROCESS_TERMINATE_TIMEOUT)
-                    except subprocess.TimeoutExpired:
-                        self.process.kill()
-                        self.process.wait(timeout=PROCESS_KILL_TIMEOUT)
-                except Exception:
-                    pass
-        
+        # Останавливаем процессы если запущены: окно скрывается сразу,
+        # а закрывается, когда дочерние процессы завершатся
+        if self.runner:
+            self.runner.stop()
+            self.root.withdraw()
+        deadline = time.time() + PROCESS_TERMINATE_TIMEOUT + PROCESS_KILL_TIMEOUT + 1
+        self._close_when_stopped(deadline)
+    
+    def _close_when_stopped(self, deadline):
+        """Закрыть окно после завершения процессов (без блокировки цикла Tk)."""
+        if self.runner and self.runner.is_stopping() and time.time() < deadline:
+            self.root.after(100, self._close_when_stopped, deadline)
+            return
+        self._close_event_writer()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        close_archive_stores()
         self.root.destroy()
     
     def _setup_styles(self):
@@ -1150,6 +6181,32 @@ class YouTubeDownloader:
             ttk.Radiobutton(self.bitrate_frame, text=self.t[b_key], variable=self.audio_bitrate,
                            value=b_val, style='Quality.TRadiobutton').pack(side="left", padx=5)
         
+        # Перекодирование параллельно загрузке
+        pipeline_frame = ttk.Frame(self.audio_settings_frame)
+        pipeline_frame.pack(fill="x", pady=(10, 0))
+        
+        ttk.Checkbutton(pipeline_frame, text=self.t["audio_pipeline"], variable=self.audio_pipeline,
+                       style='Option.TCheckbutton').pack(side="left")
+        low, high = TRANSCODE_LIMITS["transcode_workers"]
+        ttk.Label(pipeline_frame, text=self.t["transcode_workers_label"]).pack(side="left", padx=(10, 0))
+        ttk.Spinbox(pipeline_frame, from_=low, to=high, width=5,
+                    textvariable=self.transcode_workers).pack(side="left", padx=(5, 0))
+        
+        # Медиатека (только для канала/плейлиста)
+        ttk.Label(self.audio_settings_frame, text=self.t["media_library_label"]).pack(anchor="w", pady=(10, 5))
+        
+        library_frame = ttk.Frame(self.audio_settings_frame)
+        library_frame.pack(fill="x")
+        library_frame.columnconfigure(0, weight=1)
+        
+        library_entry = ttk.Entry(library_frame, textvariable=self.media_library_var, font=get_available_font(FONT_MONO, 11))
+        library_entry.grid(row=0, column=0, sticky="ew", padx=(0, 10))
+        self.ctx_menu.bind_entry(library_entry)
+        self._browse_library_btn = ttk.Button(library_frame, text=self.t["browse_folder"], command=self.browse_library, width=28)
+        self._browse_library_btn.grid(row=0, column=1)
+        
+        ttk.Label(self.audio_settings_frame, text=self.t["media_library_hint"], style='Hint.TLabel').pack(anchor="w", pady=(5, 0))
+        
         self.audio_settings_frame.grid_remove()
         
         # === ОПЦИИ ===
@@ -1165,6 +6222,84 @@ class YouTubeDownloader:
                        variable=self.restart_each_video, style='Option.TCheckbutton').pack(side="left")
         ttk.Label(restart_frame, text=self.t["restart_each_video_hint"], style='Hint.TLabel').pack(side="left", padx=(10, 0))
         
+        engine_frame = ttk.Frame(options_frame)
+        engine_frame.pack(anchor="w", pady=(5, 0))
+        
+        ttk.Checkbutton(engine_frame, text=self.t["embedded_engine"],
+                       variable=self.embedded_engine, style='Option.TCheckbutton').pack(side="left")
+        ttk.Label(engine_frame, text=self.t["embedded_engine_hint"], style='Hint.TLabel').pack(side="left", padx=(10, 0))
+        
+        parallel_frame = ttk.Frame(options_frame)
+        parallel_frame.pack(anchor="w", pady=(5, 0))
+        
+        ttk.Label(parallel_frame, text=self.t["parallel_downloads"]).pack(side="left")
+        ttk.Spinbox(parallel_frame, from_=1, to=MAX_PARALLEL_DOWNLOADS, width=4,
+                    textvariable=self.parallel_downloads, state="readonly").pack(side="left", padx=(10, 0))
+        ttk.Label(parallel_frame, text=self.t["parallel_downloads_hint"], style='Hint.TLabel').pack(side="left", padx=(10, 0))
+        
+        adaptive_frame = ttk.Frame(options_frame)
+        adaptive_frame.pack(anchor="w", pady=(5, 0))
+        
+        ttk.Checkbutton(adaptive_frame, text=self.t["adaptive_parallel"],
+                       variable=self.adaptive_parallel, style='Option.TCheckbutton').pack(side="left")
+        ttk.Label(adaptive_frame, text=self.t["adaptive_parallel_hint"], style='Hint.TLabel').pack(side="left", padx=(10, 0))
+        
+        archive_frame = ttk.Frame(options_frame)
+        archive_frame.pack(anchor="w", pady=(5, 0))
+        
+        ttk.Label(archive_frame, text=self.t["archive_backend_label"]).pack(side="left")
+        for backend_val, backend_key in (("text", "archive_backend_text"), ("sqlite", "archive_backend_sqlite")):
+            ttk.Radiobutton(archive_frame, text=self.t[backend_key], variable=self.archive_backend,
+                           value=backend_val, style='Quality.TRadiobutton').pack(side="left", padx=(10, 0))
+        self.scan_archive_btn = ttk.Button(archive_frame, text=self.t["scan_archive_btn"],
+                                           command=self.scan_archive)
+        self.scan_archive_btn.pack(side="left", padx=(15, 0))
+        
+        retry_frame = ttk.Frame(options_frame)
+        retry_frame.pack(anchor="w", pady=(5, 0))
+        
+        for index, name in enumerate(RETRY_LIMITS):
+            low, high = RETRY_LIMITS[name]
+            ttk.Label(retry_frame, text=self.t[f"{name}_label"]).pack(side="left", padx=(10 if index else 0, 0))
+            ttk.Spinbox(retry_frame, from_=low, to=high, width=5,
+                        textvariable=getattr(self, name)).pack(side="left", padx=(5, 0))
+        
+        ttk.Label(retry_frame, text=self.t["min_free_space_label"]).pack(side="left", padx=(10, 0))
+        ttk.Spinbox(retry_frame, from_=DISK_LIMITS["min_free_space"][0], to=DISK_LIMITS["min_free_space"][1],
+                    width=5, textvariable=self.min_free_space).pack(side="left", padx=(5, 0))
+        
+        # === ПРОИЗВОДИТЕЛЬНОСТЬ ===
+        performance_frame = ttk.LabelFrame(self.content_frame, text=self.t["performance_label"], padding="10")
+        performance_frame.grid(row=row, column=0, sticky="ew", pady=(0, 10))
+        performance_frame.columnconfigure(0, weight=1)
+        row += 1
+        
+        ttk.Checkbutton(performance_frame, text=self.t["performance_auto"], variable=self.performance_auto,
+                       style='Option.TCheckbutton', command=self._on_performance_mode_change).pack(anchor="w")
+        
+        self.performance_values_frame = ttk.Frame(performance_frame)
+        self.performance_values_frame.pack(anchor="w", pady=(5, 0))
+        
+        for index, name in enumerate(PERFORMANCE_LIMITS):
+            low, high = PERFORMANCE_LIMITS[name]
+            ttk.Label(self.performance_values_frame, text=self.t[f"{name}_label"]).pack(
+                side="left", padx=(10 if index else 0, 0))
+            ttk.Spinbox(self.performance_values_frame, from_=low, to=high, width=5,
+                        textvariable=getattr(self, name)).pack(side="left", padx=(5, 0))
+        
+        aria2c_frame = ttk.Frame(performance_frame)
+        aria2c_frame.pack(anchor="w", pady=(5, 0))
+        
+        ttk.Checkbutton(aria2c_frame, text=self.t["external_downloader"], variable=self.external_downloader,
+                       style='Option.TCheckbutton').pack(side="left")
+        for name in ARIA2C_LIMITS:
+            low, high = ARIA2C_LIMITS[name]
+            ttk.Label(aria2c_frame, text=self.t[f"{name}_label"]).pack(side="left", padx=(10, 0))
+            ttk.Spinbox(aria2c_frame, from_=low, to=high, width=5,
+                        textvariable=getattr(self, name)).pack(side="left", padx=(5, 0))
+        
+        ttk.Label(performance_frame, text=self.t["performance_hint"], style='Hint.TLabel').pack(anchor="w", pady=(5, 0))
+        
         # === URL ===
         url_frame = ttk.Frame(self.content_frame)
         url_frame.grid(row=row, column=0, sticky="ew", pady=(10, 0))
@@ -1222,6 +6357,42 @@ class YouTubeDownloader:
         
         ttk.Label(cookies_container, text=self.t["cookies_hint"], style='Hint.TLabel').pack(anchor="w", pady=(5, 0))
         
+        # === ОЧЕРЕДЬ ЗАДАНИЙ ===
+        queue_frame = ttk.LabelFrame(self.content_frame, text=self.t["queue_frame"], padding="10")
+        queue_frame.grid(row=row, column=0, sticky="ew", pady=(15, 0))
+        queue_frame.columnconfigure(0, weight=1)
+        row += 1
+        
+        columns = ("id", "priority", "status", "mode", "url")
+        self.queue_tree = ttk.Treeview(queue_frame, columns=columns, show="headings", height=5)
+        headings = {"id": "#", "priority": self.t["queue_col_priority"], "status": self.t["queue_col_status"],
+                    "mode": self.t["queue_col_mode"], "url": "URL"}
+        widths = {"id": 40, "priority": 80, "status": 110, "mode": 110, "url": 400}
+        for column in columns:
+            self.queue_tree.heading(column, text=headings[column])
+            self.queue_tree.column(column, width=widths[column], stretch=(column == "url"),
+                                   anchor="w" if column == "url" else "center")
+        self.queue_tree.pack(fill="x")
+        
+        queue_controls = ttk.Frame(queue_frame)
+        queue_controls.pack(fill="x", pady=(5, 0))
+        
+        ttk.Label(queue_controls, text=self.t["queue_priority"]).pack(side="left")
+        ttk.Spinbox(queue_controls, from_=-99, to=99, width=4,
+                    textvariable=self.job_priority).pack(side="left", padx=(5, 10))
+        ttk.Button(queue_controls, text=self.t["queue_add_btn"], command=self.add_to_queue).pack(side="left", padx=(0, 5))
+        ttk.Button(queue_controls, text=self.t["queue_import_btn"], command=self.import_jobs_file).pack(side="left", padx=(0, 5))
+        ttk.Button(queue_controls, text=self.t["queue_remove_btn"], command=self.remove_selected_jobs).pack(side="left", padx=(0, 5))
+        ttk.Button(queue_controls, text=self.t["queue_clear_btn"], command=self.clear_finished_jobs).pack(side="left")
+        
+        self.queue_run_btn = ttk.Button(queue_controls, text=self.t["queue_run_btn"], command=self.run_queue)
+        self.queue_run_btn.pack(side="right")
+        ttk.Spinbox(queue_controls, from_=1, to=MAX_CONCURRENT_JOBS, width=4,
+                    textvariable=self.job_concurrency, state="readonly").pack(side="right", padx=(5, 10))
+        ttk.Label(queue_controls, text=self.t["queue_concurrency"]).pack(side="right")
+        
+        ttk.Label(queue_frame, text=self.t["queue_hint"], style='Hint.TLabel').pack(anchor="w", pady=(5, 0))
+        
         # === ЗАВИСИМОСТИ ===
         deps_frame = ttk.LabelFrame(self.content_frame, text=self.t["deps_frame"], padding="10")
         deps_frame.grid(row=row, column=0, sticky="ew", pady=(15, 10))
@@ -1238,11 +6409,15 @@ class YouTubeDownloader:
         self.ffmpeg_status = ttk.Label(deps_frame, text=self.t["checking"])
         self.ffmpeg_status.grid(row=1, column=1, sticky="w", padx=15, pady=2)
         
+        ttk.Label(deps_frame, text="aria2c:", font=get_available_font(FONT_FAMILY, 10, 'bold')).grid(row=2, column=0, sticky="w", pady=2)
+        self.aria2c_status = ttk.Label(deps_frame, text=self.t["checking"])
+        self.aria2c_status.grid(row=2, column=1, sticky="w", padx=15, pady=2)
+        
         # pywin32 актуален только для Windows
         if sys.platform == 'win32':
-            ttk.Label(deps_frame, text="pywin32:", font=get_available_font(FONT_FAMILY, 10, 'bold')).grid(row=2, column=0, sticky="w", pady=2)
+            ttk.Label(deps_frame, text="pywin32:", font=get_available_font(FONT_FAMILY, 10, 'bold')).grid(row=3, column=0, sticky="w", pady=2)
             self.pywin32_status = ttk.Label(deps_frame, text=self.t["checking"])
-            self.pywin32_status.grid(row=2, column=1, sticky="w", padx=15, pady=2)
+            self.pywin32_status.grid(row=3, column=1, sticky="w", padx=15, pady=2)
         else:
             self.pywin32_status = None
         
@@ -1253,9 +6428,17 @@ class YouTubeDownloader:
         
         self.start_btn = ttk.Button(btn_frame, text=self.t["start_btn"], command=self.start_download, style='Big.TButton', width=22)
         self.start_btn.pack(side="left", padx=10)
+        self.plan_btn = ttk.Button(btn_frame, text=self.t["plan_btn"], command=self.plan_download, width=14)
+        self.plan_btn.pack(side="left", padx=10)
         self.stop_btn = ttk.Button(btn_frame, text=self.t["stop_btn"], command=self.stop_download, style='Big.TButton', state="disabled", width=18)
         self.stop_btn.pack(side="left", padx=10)
         ttk.Button(btn_frame, text=self.t["clear_log_btn"], command=self.clear_log, width=18).pack(side="left", padx=10)
+        ttk.Checkbutton(btn_frame, text=self.t["event_log_check"], variable=self.event_log,
+                       style='Option.TCheckbutton').pack(side="left", padx=10)
+        ttk.Label(btn_frame, text=self.t["metrics_port_label"]).pack(side="left", padx=(10, 5))
+        ttk.Spinbox(btn_frame, from_=METRICS_LIMITS["metrics_port"][0], to=METRICS_LIMITS["metrics_port"][1],
+                    width=6, textvariable=self.metrics_port).pack(side="left")
+        ttk.Label(btn_frame, text=self.t["metrics_port_hint"], style='Hint.TLabel').pack(side="left", padx=(5, 0))
         
         # === ЛОГ ===
         log_container = ttk.LabelFrame(self.content_frame, text=self.t["log_frame"], padding="10")
@@ -1273,6 +6456,10 @@ class YouTubeDownloader:
         self.log_text.config(state="disabled")
         self.ctx_menu.bind_text(self.log_text, readonly=True)
         
+        # Живые строки статуса активных загрузок (под логом)
+        self.status_frame = ttk.Frame(log_container)
+        self.status_frame.pack(fill="x", pady=(5, 0))
+        
         # === ПРОГРЕСС ===
         progress_frame = ttk.Frame(self.content_frame)
         progress_frame.grid(row=row, column=0, sticky="ew", pady=(5, 0))
@@ -1322,6 +6509,13 @@ class YouTubeDownloader:
         if hasattr(self, 'audio_source_desc'):
             self.audio_source_desc.config(text=self.t[desc])
     
+    def _on_performance_mode_change(self):
+        """В авто-режиме значения производительности подбираются сами — поля неактивны."""
+        state = "disabled" if self.performance_auto.get() else "normal"
+        for child in self.performance_values_frame.winfo_children():
+            if isinstance(child, ttk.Spinbox):
+                child.configure(state=state)
+    
     def _on_audio_format_change(self):
         fmt = self.audio_format.get()
         if fmt == "wav":
@@ -1334,18 +6528,66 @@ class YouTubeDownloader:
                     child.configure(state="normal")
     
     def log(self, message):
+        # Сначала выводим то, что уже накоплено в буфере, чтобы не нарушить порядок
+        if len(self.log_sink):
+            self._flush_log_sink()
+        self._append_log_lines([message])
+    
+    def _log_async(self, message):
+        """Добавить строку в лог из любого потока (через буфер)."""
+        self.log_sink.write(message)
+    
+    def _append_log_lines(self, lines):
+        """Вставить пачку строк в лог одной операцией."""
         self.log_text.config(state="normal")
-        self.log_text.insert(tk.END, message + "\n")
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
         
         # Ограничение количества строк для экономии памяти
         line_count = int(self.log_text.index('end-1c').split('.')[0])
         if line_count > LOG_MAX_LINES:
-            # Удаляем первые 500 строк
+            # Удаляем лишнее с запасом в 500 строк
             self.log_text.delete('1.0', f'{line_count - LOG_MAX_LINES + 500}.0')
         
         self.log_text.see(tk.END)
         self.log_text.config(state="disabled")
     
+    def _flush_log_sink(self, max_lines=None):
+        lines, dropped = self.log_sink.drain(max_lines)
+        if dropped:
+            lines.insert(0, self.t["log_lines_dropped"].format(count=dropped))
+        if lines:
+            self._append_log_lines(lines)
+    
+    def _drain_log_sink(self):
+        """Периодический вывод накопленных строк (одна вставка за кадр)."""
+        try:
+            self.ui.drain()
+            self._flush_log_sink(LOG_MAX_LINES_PER_FRAME)
+            self._render_status_rows()
+            self._refresh_queue_view()
+        finally:
+            self.root.after(LOG_REFRESH_MS, self._drain_log_sink)
+    
+    def _render_status_rows(self):
+        """Перерисовать живые строки статуса, если они изменились."""
+        rows = self.status_board.snapshot_if_dirty()
+        if rows is None:
+            return
+        
+        for key in list(self.status_labels):
+            if key not in rows:
+                self.status_labels.pop(key).destroy()
+        
+        for key in sorted(rows):
+            text = format_status_row(key, rows[key])
+            label = self.status_labels.get(key)
+            if label is None:
+                label = ttk.Label(self.status_frame, font=get_available_font(FONT_MONO, 9), foreground='#4a90d9')
+                label.pack(anchor="w")
+                self.status_labels[key] = label
+            if label.cget('text') != text:
+                label.config(text=text)
+    
     def clear_log(self):
         self.log_text.config(state="normal")
         self.log_text.delete(1.0, tk.END)
@@ -1360,45 +6602,16 @@ class YouTubeDownloader:
         self.log("")
     
     def _reset_progress(self):
-        self.total_videos = 0
-        self.downloaded_videos = 0
         self.progress_value.config(text=self.t["progress_idle"])
     
-    def _update_progress_display(self):
-        if self.total_videos > 0:
-            text = self.t["progress_format"].format(downloaded=self.downloaded_videos, total=self.total_videos)
-            color = '#228B22' if self.downloaded_videos >= self.total_videos else '#4a90d9'
+    def _update_progress_display(self, downloaded, total):
+        if total > 0:
+            text = self.t["progress_format"].format(downloaded=downloaded, total=total)
+            color = '#228B22' if downloaded >= total else '#4a90d9'
             self.progress_value.config(text=text, foreground=color)
         else:
             self.progress_value.config(text=self.t["progress_scanning"], foreground='#FF8C00')
     
-    def _parse_progress_from_line(self, line):
-        """Парсинг прогресса с использованием предкомпилированного regex."""
-        match = PROGRESS_REGEX.search(line)
-        if match:
-            self.total_videos = int(match.group(2))
-            # Защита от переполнения
-            self.downloaded_videos = min(int(match.group(1)) - 1, self.total_videos)
-            self.root.after(0, self._update_progress_display)
-            return True
-        
-        # Для прогресса считаем и скачанные, и пропущенные из архива
-        if self._is_download_complete_line(line) or self._is_archive_skip_line(line):
-            if self.total_videos > 0 and self.downloaded_videos < self.total_videos:
-                self.downloaded_videos = min(self.downloaded_videos + 1, self.total_videos)
-                self.root.after(0, self._update_progress_display)
-            return True
-        
-        return False
-    
-    def _is_download_complete_line(self, line):
-        """Проверить, является ли строка индикатором РЕАЛЬНОГО завершения скачивания."""
-        return any(pattern in line for pattern in DOWNLOAD_COMPLETE_PATTERNS)
-    
-    def _is_archive_skip_line(self, line):
-        """Проверить, является ли строка индикатором пропуска из-за архива."""
-        return any(pattern in line for pattern in ARCHIVE_SKIP_PATTERNS)
-    
     def browse_outdir(self):
         # Блокируем кнопку на время работы диалога
         if hasattr(self, '_browse_outdir_btn'):
@@ -1412,6 +6625,17 @@ class YouTubeDownloader:
             if hasattr(self, '_browse_outdir_btn'):
                 self._browse_outdir_btn.config(state="normal")
     
+    def browse_library(self):
+        # Блокируем кнопку на время работы диалога
+        self._browse_library_btn.config(state="disabled")
+        try:
+            folder = self.dialogs.select_folder(self.media_library_var.get() or self.outdir_var.get() or os.path.expanduser("~"))
+            if folder:
+                self.media_library_var.set(folder)
+                self.log(f"{self.t['folder_selected']}{folder}")
+        finally:
+            self._browse_library_btn.config(state="normal")
+    
     def browse_cookies(self):
         # Блокируем кнопку на время работы диалога
         if hasattr(self, '_browse_cookies_btn'):
@@ -1432,7 +6656,7 @@ class YouTubeDownloader:
         self.log("")
         
         try:
-            result = subprocess.run(["yt-dlp", "--version"], capture_output=True, text=True, 
+            result = subprocess.run([*YTDLP_COMMAND, "--version"], capture_output=True, text=True, 
                                     creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
             self.ytdlp_status.config(text=f"✅ {result.stdout.strip()}", foreground="#228B22")
             self.log(f"{self.t['ytdlp_found']}{result.stdout.strip()}")
@@ -1444,7 +6668,7 @@ class YouTubeDownloader:
             self.ytdlp_status.config(text=f"❌ Error: {e}", foreground="#DC143C")
         
         try:
-            subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, 
+            subprocess.run([*FFMPEG_COMMAND, "-version"], capture_output=True, text=True, 
                           creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
             self.ffmpeg_status.config(text=self.t["installed"], foreground="#228B22")
             self.log(self.t["ffmpeg_found"])
@@ -1455,6 +6679,15 @@ class YouTubeDownloader:
         except Exception:
             self.ffmpeg_status.config(text="❌ Error", foreground="#DC143C")
         
+        # aria2c необязателен — только для загрузки в несколько соединений
+        aria2c = aria2c_version()
+        if aria2c:
+            self.aria2c_status.config(text=f"✅ {aria2c}", foreground="#228B22")
+            self.log(f"{self.t['aria2c_found']}{aria2c}")
+        else:
+            self.aria2c_status.config(text=self.t["not_found"], foreground="#FF8C00")
+            self.log(self.t["aria2c_not_found"])
+        
         # pywin32 проверяется только на Windows
         if sys.platform == 'win32' and self.pywin32_status is not None:
             try:
@@ -1473,280 +6706,140 @@ class YouTubeDownloader:
     
     def _check_dependencies_thread(self):
         """Потокобезопасная проверка зависимостей."""
-        self.root.after(0, lambda: self.log(self.t["checking_deps"]))
-        self.root.after(0, lambda: self.log(""))
+        self.ui.post(lambda: self.log(self.t["checking_deps"]))
+        self.ui.post(lambda: self.log(""))
         
         # yt-dlp
         try:
-            result = subprocess.run(["yt-dlp", "--version"], capture_output=True, text=True, 
+            result = subprocess.run([*YTDLP_COMMAND, "--version"], capture_output=True, text=True, 
                                     creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
             version = result.stdout.strip()
-            self.root.after(0, lambda: self.ytdlp_status.config(text=f"✅ {version}", foreground="#228B22"))
-            self.root.after(0, lambda: self.log(f"{self.t['ytdlp_found']}{version}"))
+            self.ui.post(lambda: self.ytdlp_status.config(text=f"✅ {version}", foreground="#228B22"))
+            self.ui.post(lambda: self.log(f"{self.t['ytdlp_found']}{version}"))
         except FileNotFoundError:
-            self.root.after(0, lambda: self.ytdlp_status.config(text=self.t["not_found"], foreground="#DC143C"))
-            self.root.after(0, lambda: self.log(self.t["ytdlp_not_found"]))
-            self.root.after(0, lambda: self.log(self.t["ytdlp_install_hint"]))
+            self.ui.post(lambda: self.ytdlp_status.config(text=self.t["not_found"], foreground="#DC143C"))
+            self.ui.post(lambda: self.log(self.t["ytdlp_not_found"]))
+            self.ui.post(lambda: self.log(self.t["ytdlp_install_hint"]))
         except Exception as e:
-            self.root.after(0, lambda: self.ytdlp_status.config(text=f"❌ Error: {e}", foreground="#DC143C"))
+            self.ui.post(lambda: self.ytdlp_status.config(text=f"❌ Error: {e}", foreground="#DC143C"))
         
         # ffmpeg
         try:
-            subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, 
+            subprocess.run([*FFMPEG_COMMAND, "-version"], capture_output=True, text=True, 
                           creationflags=SUBPROCESS_FLAGS, timeout=SUBPROCESS_TIMEOUT)
-            self.root.after(0, lambda: self.ffmpeg_status.config(text=self.t["installed"], foreground="#228B22"))
-            self.root.after(0, lambda: self.log(self.t["ffmpeg_found"]))
+            self.ui.post(lambda: self.ffmpeg_status.config(text=self.t["installed"], foreground="#228B22"))
+            self.ui.post(lambda: self.log(self.t["ffmpeg_found"]))
         except FileNotFoundError:
-            self.root.after(0, lambda: self.ffmpeg_status.config(text=self.t["not_found"], foreground="#DC143C"))
-            self.root.after(0, lambda: self.log(self.t["ffmpeg_not_found"]))
-            self.root.after(0, lambda: self.log(self.t["ffmpeg_install_hint"]))
+            self.ui.post(lambda: self.ffmpeg_status.config(text=self.t["not_found"], foreground="#DC143C"))
+            self.ui.post(lambda: self.log(self.t["ffmpeg_not_found"]))
+            self.ui.post(lambda: self.log(self.t["ffmpeg_install_hint"]))
         except Exception:
-            self.root.after(0, lambda: self.ffmpeg_status.config(text="❌ Error", foreground="#DC143C"))
+            self.ui.post(lambda: self.ffmpeg_status.config(text="❌ Error", foreground="#DC143C"))
+        
+        # aria2c (необязательно); результат кэшируется для движков загрузки
+        aria2c = aria2c_version(refresh=True)
+        if aria2c:
+            self.ui.post(lambda: self.aria2c_status.config(text=f"✅ {aria2c}", foreground="#228B22"))
+            self.ui.post(lambda: self.log(f"{self.t['aria2c_found']}{aria2c}"))
+        else:
+            self.ui.post(lambda: self.aria2c_status.config(text=self.t["not_found"], foreground="#FF8C00"))
+            self.ui.post(lambda: self.log(self.t["aria2c_not_found"]))
         
         # pywin32 (только Windows)
         if sys.platform == 'win32' and self.pywin32_status is not None:
             try:
                 import pythoncom
                 from win32com.shell import shell
-                self.root.after(0, lambda: self.pywin32_status.config(text=self.t["pywin32_ok"], foreground="#228B22"))
-                self.root.after(0, lambda: self.log(self.t["pywin32_found"]))
+                self.ui.post(lambda: self.pywin32_status.config(text=self.t["pywin32_ok"], foreground="#228B22"))
+                self.ui.post(lambda: self.log(self.t["pywin32_found"]))
             except ImportError:
-                self.root.after(0, lambda: self.pywin32_status.config(text=self.t["pywin32_no"], foreground="#FF8C00"))
-                self.root.after(0, lambda: self.log(self.t["pywin32_not_found"]))
-                self.root.after(0, lambda: self.log(self.t["pywin32_install_hint"]))
-        
-        self.root.after(0, lambda: self.log(""))
-        self.root.after(0, lambda: self.log("-" * 50))
-        self.root.after(0, lambda: self.log(""))
-    
-    def update_ytdlp(self):
-        self.log(self.t["updating_ytdlp"])
-        self.log(self.t["updating_cmd"])
-        self.log("")
-        threading.Thread(target=self._update_ytdlp_thread, daemon=True).start()
-    
-    def _update_ytdlp_thread(self):
-        try:
-            process = subprocess.Popen(["yt-dlp", "-U", "--update-to", "master"],
-                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                                       text=True, creationflags=SUBPROCESS_FLAGS)
-            for line in process.stdout:
-                self.root.after(0, self.log, "   " + line.strip())
-            process.wait()
-            self.root.after(0, self.log, "")
-            self.root.after(0, self.log, self.t["update_done"])
-            self.root.after(0, self.log, "")
-            self.root.after(100, self.check_dependencies)
-        except Exception as e:
-            self.root.after(0, self.log, f"{self.t['update_error']}{e}")
-    
-    def normalize_url(self, url, mode):
-        """Нормализация URL с исправленной проверкой суффиксов."""
-        url = url.strip().rstrip('/')
-        if not url:
-            return ""
-        
-        if mode == self.MODE_CHANNEL:
-            known_suffixes = ['/videos', '/shorts', '/streams', '/playlists', 
-                            '/community', '/about', '/featured', '/channels']
-            
-            url_lower = url.lower()
-            has_suffix = any(url_lower.endswith(s) for s in known_suffixes)
-            has_special_path = '/watch?' in url or '/playlist?' in url
-            
-            if not has_suffix and not has_special_path:
-                url += '/videos'
-                self.log(self.t["url_videos_added"])
-        
-        return url
-    
-    def _is_valid_url_format(self, url):
-        """Базовая проверка формата URL."""
-        url = url.strip().lower()
-        if not url:
-            return False
-        # Должен начинаться с http(s):// или содержать известный домен
-        if url.startswith(('http://', 'https://')):
-            return True
-        if any(domain in url for domain in ['youtube.com', 'youtu.be', 'www.']):
-            return True
-        # Проверка на наличие точки и похожесть на домен
-        if '.' in url and not url.startswith('.') and ' ' not in url:
-            return True
-        return False
-    
-    def validate_inputs(self):
-        url = self.url_var.get().strip()
-        if not url:
-            messagebox.showerror(self.t["error_input"], self.t["error_no_url"])
-            return False
-        
-        # Базовая проверка формата URL
-        if not self._is_valid_url_format(url):
-            messagebox.showerror(self.t["error_input"], self.t["error_invalid_url"])
-            return False
-        
-        if 'youtube.com' not in url.lower() and 'youtu.be' not in url.lower():
-            if not messagebox.askyesno(self.t["warning"], self.t["warn_not_youtube"]):
-                return False
-        
-        # Предупреждение при скачивании аудио со всего канала
-        mode = self.current_mode.get()
-        if mode == self.MODE_AUDIO and self.audio_source.get() == self.AUDIO_SOURCE_CHANNEL:
-            if not messagebox.askyesno(self.t["warning"], self.t["warn_audio_channel"]):
-                return False
-        
-        outdir = self.outdir_var.get().strip()
-        if not outdir:
-            messagebox.showerror(self.t["error_input"], self.t["error_no_outdir"])
-            return False
-        if not os.path.exists(outdir):
-            try:
-                os.makedirs(outdir, exist_ok=True)
-                self.log(f"{self.t['folder_created']}{outdir}")
-            except Exception as e:
-                messagebox.showerror(self.t["error"], self.t["error_create_folder"].format(path=outdir, error=e))
-                return False
-        
-        cookies = self.cookies_var.get().strip()
-        if cookies and not os.path.exists(cookies):
-            messagebox.showerror(self.t["error"], self.t["error_cookies_not_found"].format(path=cookies))
-            return False
-        
-        return True
-    
-    def _get_output_template(self, outdir, mode):
-        if mode == self.MODE_CHANNEL:
-            return os.path.join(outdir, "%(uploader)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
-        elif mode == self.MODE_PLAYLIST:
-            return os.path.join(outdir, "%(uploader)s", "%(playlist_title)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
-        elif mode == self.MODE_AUDIO:
-            # Разные шаблоны для разных источников аудио
-            source = self.audio_source.get()
-            if source == self.AUDIO_SOURCE_CHANNEL:
-                return os.path.join(outdir, "%(uploader)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
-            elif source == self.AUDIO_SOURCE_PLAYLIST:
-                return os.path.join(outdir, "%(uploader)s", "%(playlist_title)s", "%(playlist_autonumber)05d. %(title)s [%(id)s].%(ext)s")
-            else:
-                return os.path.join(outdir, "%(title)s [%(id)s].%(ext)s")
-        else:
-            return os.path.join(outdir, "%(title)s [%(id)s].%(ext)s")
-    
-    def _get_mode_display_name(self, mode):
-        return {
-            self.MODE_CHANNEL: self.t["mode_channel"],
-            self.MODE_PLAYLIST: self.t["mode_playlist"],
-            self.MODE_VIDEO: self.t["mode_video"],
-            self.MODE_AUDIO: self.t["mode_audio"],
-        }.get(mode, mode)
-    
-    def _get_folder_structure_desc(self, mode):
-        if mode == self.MODE_AUDIO:
-            # Разные описания для разных источников аудио
-            source = self.audio_source.get()
-            fmt = self.audio_format.get()
-            if source == self.AUDIO_SOURCE_CHANNEL:
-                return self.t["folder_struct_audio_channel"].format(format=fmt)
-            elif source == self.AUDIO_SOURCE_PLAYLIST:
-                return self.t["folder_struct_audio_playlist"].format(format=fmt)
-            else:
-                return self.t["folder_struct_audio_video"].format(format=fmt)
-        
-        return {
-            self.MODE_CHANNEL: self.t["folder_struct_channel"],
-            self.MODE_PLAYLIST: self.t["folder_struct_playlist"],
-            self.MODE_VIDEO: self.t["folder_struct_video"],
-        }.get(mode, "")
-    
-    def _get_video_format_string(self, quality):
-        if quality == "max":
-            return "bv*+ba/b"
-        
-        height = None
-        for q_val, _, q_height in VIDEO_QUALITIES:
-            if q_val == quality:
-                height = q_height
-                break
-        
-        if height:
-            return f"bv*[height<={height}]+ba/b[height<={height}]/b"
+                self.ui.post(lambda: self.pywin32_status.config(text=self.t["pywin32_no"], foreground="#FF8C00"))
+                self.ui.post(lambda: self.log(self.t["pywin32_not_found"]))
+                self.ui.post(lambda: self.log(self.t["pywin32_install_hint"]))
         
-        return "bv*+ba/b"
+        # yt_dlp как модуль Python (для встроенного движка)
+        if import_yt_dlp() is not None:
+            self.ui.post(lambda: self.log(self.t["ytdlp_module_found"]))
+        else:
+            self.ui.post(lambda: self.log(self.t["ytdlp_module_not_found"]))
+        
+        self.ui.post(lambda: self.log(""))
+        self.ui.post(lambda: self.log("-" * 50))
+        self.ui.post(lambda: self.log(""))
     
-    def _get_quality_display_name(self, quality):
-        for q_val, q_key, _ in VIDEO_QUALITIES:
-            if q_val == quality:
-                return self.t[q_key]
-        return quality
+    def update_ytdlp(self):
+        self.log(self.t["updating_ytdlp"])
+        self.log(self.t["updating_cmd"])
+        self.log("")
+        # Процесс ведёт супервизор — отдельный поток не нужен
+        get_process_supervisor().submit([*YTDLP_COMMAND, "-U", "--update-to", "master"],
+                                        on_line=lambda line: self._log_async("   " + line.strip()),
+                                        on_exit=self._on_update_exit, idle_timeout=PROCESS_IDLE_TIMEOUT)
     
-    def _get_bitrate_display_name(self, bitrate):
-        for b_val, b_key, _ in AUDIO_BITRATES:
-            if b_val == bitrate:
-                return self.t[b_key]
-        return bitrate
+    def _on_update_exit(self, exit_code, error):
+        """Завершение обновления yt-dlp (в потоке супервизора)."""
+        if error is not None:
+            self._log_async(f"{self.t['update_error']}{error}")
+            return
+        self._log_async("")
+        self._log_async(self.t["update_done"])
+        self._log_async("")
+        self.ui.post(self.check_dependencies)
     
-    def _build_command(self, mode, url, cookies, output_template, archive_path, max_downloads=None):
-        cmd = [
-            "yt-dlp", "-o", output_template,
-            "--continue", "--no-overwrites", "--no-post-overwrites",
-            "--retries", "infinite", "--fragment-retries", "infinite",
-            "--extractor-retries", "infinite", "--file-access-retries", "infinite",
-            "--retry-sleep", "5", "--progress", "--newline",
-        ]
+    def validate_inputs(self):
+        url = self.url_var.get().strip()
+        if not url:
+            messagebox.showerror(self.t["error_input"], self.t["error_no_url"])
+            return False
         
-        # Cookies опциональны
-        if cookies:
-            cmd.extend(["--cookies", cookies])
+        # Базовая проверка формата URL
+        if not is_valid_url_format(url):
+            messagebox.showerror(self.t["error_input"], self.t["error_invalid_url"])
+            return False
         
-        if mode == self.MODE_AUDIO:
-            audio_fmt = self.audio_format.get()
-            bitrate = self.audio_bitrate.get()
-            source = self.audio_source.get()
-            
-            cmd.extend(["-f", "bestaudio/best", "-x"])
-            
-            if audio_fmt == "wav":
-                cmd.extend(["--audio-format", "wav"])
-            elif audio_fmt == "mp3":
-                cmd.extend(["--audio-format", "mp3"])
-                # Установка битрейта для MP3
-                if bitrate != "max":
-                    # Используем только -b:a для конкретного битрейта (CBR)
-                    cmd.extend(["--postprocessor-args", f"ffmpeg:-b:a {bitrate}k"])
-                else:
-                    # Максимальное качество VBR
-                    cmd.extend(["--audio-quality", "0"])
-            elif audio_fmt == "ogg":
-                # OGG Vorbis формат
-                cmd.extend(["--audio-format", "vorbis"])
-                # Установка битрейта для OGG
-                if bitrate != "max":
-                    cmd.extend(["--postprocessor-args", f"ffmpeg:-b:a {bitrate}k"])
-                else:
-                    cmd.extend(["--audio-quality", "0"])
-            
-            # Настройки в зависимости от источника
-            if source == self.AUDIO_SOURCE_VIDEO:
-                cmd.append("--no-playlist")
-            elif source in (self.AUDIO_SOURCE_PLAYLIST, self.AUDIO_SOURCE_CHANNEL):
-                cmd.extend(["--playlist-reverse"])
-                if archive_path:
-                    cmd.extend(["--download-archive", archive_path])
-            
-        elif mode == self.MODE_VIDEO:
-            quality = self.video_quality.get()
-            format_string = self._get_video_format_string(quality)
-            cmd.extend(["-f", format_string, "--no-playlist"])
-        else:
-            quality = self.video_quality.get()
-            format_string = self._get_video_format_string(quality)
-            cmd.extend(["-f", format_string, "--playlist-reverse", "--download-archive", archive_path])
+        if 'youtube.com' not in url.lower() and 'youtu.be' not in url.lower():
+            if not messagebox.askyesno(self.t["warning"], self.t["warn_not_youtube"]):
+                return False
         
-        if max_downloads:
-            cmd.extend(["--max-downloads", str(max_downloads)])
+        # Предупреждение при скачивании аудио со всего канала
+        mode = self.current_mode.get()
+        if mode == self.MODE_AUDIO and self.audio_source.get() == self.AUDIO_SOURCE_CHANNEL:
+            if not messagebox.askyesno(self.t["warning"], self.t["warn_audio_channel"]):
+                return False
         
-        cmd.append(url)
-        return cmd
+        outdir = self.outdir_var.get().strip()
+        if not outdir:
+            messagebox.showerror(self.t["error_input"], self.t["error_no_outdir"])
+            return False
+        if not os.path.exists(outdir):
+            try:
+                os.makedirs(outdir, exist_ok=True)
+                self.log(f"{self.t['folder_created']}{outdir}")
+            except Exception as e:
+                messagebox.showerror(self.t["error"], self.t["error_create_folder"].format(path=outdir, error=e))
+                return False
+        
+        cookies = self.cookies_var.get().strip()
+        if cookies and not os.path.exists(cookies):
+            messagebox.showerror(self.t["error"], self.t["error_cookies_not_found"].format(path=cookies))
+            return False
+        
+        # Хватит ли места: оценка по кэшу списка и прошлым отчётам, без обращения к сети
+        warning = DownloadEngine(self._current_settings(), lang=self.lang).disk_space_warning()
+        if warning and not messagebox.askyesno(self.t["warning"], warning + self.t["disk_space_confirm"]):
+            return False
+        
+        return True
+    
+    def _get_parallel_downloads(self):
+        return self._get_spinbox_value(self.parallel_downloads, 1, MAX_PARALLEL_DOWNLOADS)
+    
+    def _get_spinbox_value(self, var, minimum, maximum):
+        try:
+            value = int(var.get())
+        except (tk.TclError, ValueError):
+            value = minimum
+        return min(max(value, minimum), maximum)
     
     def start_download(self):
         # Защита от двойного нажатия
@@ -1760,270 +6853,486 @@ class YouTubeDownloader:
         self._save_settings()
         
         self._reset_progress()
-        self.stop_event.clear()
-        
-        mode = self.current_mode.get()
-        audio_source = self.audio_source.get() if mode == self.MODE_AUDIO else None
-        
-        # Определяем, нужен ли archive для этого режима
-        uses_archive = mode in (self.MODE_CHANNEL, self.MODE_PLAYLIST) or \
-                       (mode == self.MODE_AUDIO and audio_source in (self.AUDIO_SOURCE_PLAYLIST, self.AUDIO_SOURCE_CHANNEL))
-        
-        # Нормализация URL (для каналов добавляем /videos)
-        url = self.url_var.get().strip()
-        if mode == self.MODE_CHANNEL or (mode == self.MODE_AUDIO and audio_source == self.AUDIO_SOURCE_CHANNEL):
-            url = self.normalize_url(url, self.MODE_CHANNEL)
-        else:
-            url = url.strip().rstrip('/')
-        
-        outdir = self.outdir_var.get().strip()
-        cookies = self.cookies_var.get().strip()
-        archive_path = os.path.join(outdir, "archive.txt") if uses_archive else None
-        output_template = self._get_output_template(outdir, mode)
-        restart_enabled = self.restart_each_video.get()
+        engine = DownloadEngine(
+            self._current_settings(), lang=self.lang, on_progress=self._on_engine_progress,
+            status_board=self.status_board, events=self._make_event_stream(),
+        )
         
         # Сводка
-        self.log("")
-        self.log("=" * 70)
-        self.log(f"{self.t['settings_summary']}".center(70))
-        self.log("=" * 70)
-        
-        mode_name = self._get_mode_display_name(mode)
-        if mode == self.MODE_AUDIO:
-            # Добавляем источник к названию режима
-            source_names = {
-                self.AUDIO_SOURCE_VIDEO: self.t["audio_source_video"],
-                self.AUDIO_SOURCE_PLAYLIST: self.t["audio_source_playlist"],
-                self.AUDIO_SOURCE_CHANNEL: self.t["audio_source_channel"],
-            }
-            mode_name = f"{mode_name} ({source_names.get(audio_source, '')})"
-        
-        url_display = url[:45] + '...' if len(url) > 45 else url
-        outdir_display = outdir[:45] + '...' if len(outdir) > 45 else outdir
-        cookies_display = os.path.basename(cookies) if cookies else "—"
-        
-        self.log(f"{self.t['setting_mode']}{mode_name}")
-        self.log(f"{self.t['setting_url']}{url_display}")
-        self.log(f"{self.t['setting_folder']}{outdir_display}")
-        self.log(f"{self.t['setting_cookies']}{cookies_display}")
-        
-        if uses_archive:
-            self.log(self.t['setting_archive'])
-        else:
-            self.log(self.t['setting_no_archive'])
+        for line in engine.summary_lines():
+            self.log(line)
         
-        self.log("-" * 70)
-        self.log(f"{self.t['folder_structure']}{self._get_folder_structure_desc(mode)}")
+        if engine.total_videos > 0:
+            self._update_progress_display(engine.downloaded_videos, engine.total_videos)
         
-        if mode == self.MODE_AUDIO:
-            audio_fmt = self.audio_format.get().upper()
-            bitrate = self._get_bitrate_display_name(self.audio_bitrate.get())
-            if self.audio_format.get() == "wav":
-                self.log(f"{self.t['setting_audio_format']}{audio_fmt}{self.t['audio_no_compression']}")
-            else:
-                self.log(f"{self.t['setting_audio_format']}{audio_fmt}")
-                self.log(f"{self.t['setting_bitrate']}{bitrate}")
-        else:
-            quality = self._get_quality_display_name(self.video_quality.get())
-            format_str = self._get_video_format_string(self.video_quality.get())
-            self.log(f"{self.t['setting_quality']}{quality}")
-            self.log(f"{self.t['setting_format']}{format_str}")
-        
-        if uses_archive:
-            self.log(self.t['setting_order'])
-        else:
-            self.log(self.t['setting_order_single'])
+        self._start_runner(engine)
+    
+    def plan_download(self):
+        """Оценить объём и время загрузки с текущими настройками, ничего не скачивая."""
+        if str(self.start_btn.cget('state')) == 'disabled':
+            return
         
-        self.log(self.t['setting_retries'])
+        if not self.validate_inputs():
+            return
         
-        if uses_archive:
-            if restart_enabled:
-                self.log(self.t['setting_restart'])
-            else:
-                self.log(self.t['setting_no_restart'])
+        self._save_settings()
+        engine = DownloadEngine(self._current_settings(), lang=self.lang, status_board=self.status_board,
+                                events=self._make_event_stream(), plan_only=True)
+        for line in engine.summary_lines():
+            self.log(line)
         
-        self.log("=" * 70)
-        self.log("")
-        self.log(self.t["starting_download"])
-        self.log("")
+        self._start_runner(engine)
+    
+    def scan_archive(self):
+        """Сверить архив с файлами в папке загрузки и дописать в него найденные ролики."""
+        if str(self.start_btn.cget('state')) == 'disabled':
+            return
         
-        # Счётчик прогресса: 1 только для одиночных файлов
-        is_single_file = mode == self.MODE_VIDEO or (mode == self.MODE_AUDIO and audio_source == self.AUDIO_SOURCE_VIDEO)
-        if is_single_file:
-            self.total_videos = 1
-            self._update_progress_display()
+        outdir = self.outdir_var.get().strip()
+        if not outdir:
+            messagebox.showerror(self.t["error_input"], self.t["error_no_outdir"])
+            return
         
+        self._save_settings()
+        engine = DownloadEngine(self._current_settings(), lang=self.lang, events=self._make_event_stream(),
+                                archive_action="add")
+        self._start_runner(engine)
+    
+    def _on_engine_progress(self, downloaded, total):
+        self.ui.post(self._update_progress_display, downloaded, total)
+    
+    def _make_event_stream(self):
+        """Поток событий загрузки: лог окна и (если включён) журнал JSONL."""
+        events = EventStream()
+        events.subscribe(log_consumer(self._log_async))
+        events.subscribe(self.metrics)
+        if self.event_log.get():
+            self.event_writer = JsonlEventWriter(EVENT_LOG_DIR)
+            events.subscribe(self.event_writer)
+        self._update_metrics_server()
+        return events
+    
+    def _update_metrics_server(self):
+        """Запустить, перезапустить или остановить сервер метрик по настройке порта."""
+        port = self._get_spinbox_value(self.metrics_port, *METRICS_LIMITS["metrics_port"])
+        if self.metrics_server is not None:
+            if self.metrics_server.port == port:
+                return
+            self.metrics_server.close()
+            self.metrics_server = None
+        if not port:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, port)
+        except OSError as e:
+            self.log(self.t["metrics_error"].format(address=f"{METRICS_HOST}:{port}", error=e))
+            return
+        self.log(self.t["metrics_started"].format(url=self.metrics_server.url))
+    
+    def _close_event_writer(self):
+        """Дописать журнал событий загрузки на диск."""
+        writer, self.event_writer = self.event_writer, None
+        if writer is None:
+            return
+        writer.close()
+        if writer.error is not None:
+            self.log(self.t["event_log_error"].format(path=writer.path, error=writer.error))
+    
+    def _start_runner(self, runner):
+        """Запустить загрузку (движок или очередь) в фоновом потоке."""
+        self.runner = runner
         self.start_btn.config(state="disabled")
+        self.plan_btn.config(state="disabled")
+        self.scan_archive_btn.config(state="disabled")
+        self.queue_run_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         self.update_btn.config(state="disabled")
+        self.download_running = True
         
-        params = {
-            'mode': mode, 'url': url, 'cookies': cookies,
-            'output_template': output_template, 'archive_path': archive_path,
-            'restart_enabled': restart_enabled and uses_archive,
-        }
-        
-        threading.Thread(target=self._download_thread, args=(params,), daemon=True).start()
+        threading.Thread(target=self._download_thread, args=(runner,), daemon=True).start()
     
-    def _download_thread(self, params):
-        mode = params['mode']
-        url = params['url']
-        cookies = params['cookies']
-        output_template = params['output_template']
-        archive_path = params['archive_path']
-        restart_enabled = params['restart_enabled']
-        
+    def _download_thread(self, runner):
         try:
-            if restart_enabled:
-                self._download_with_restart(mode, url, cookies, output_template, archive_path)
-            else:
-                cmd = self._build_command(mode, url, cookies, output_template, archive_path)
-                self._run_single_process(cmd)
+            runner.run()
         except Exception as e:
-            self.root.after(0, self.log, f"{self.t['download_error']}{e}")
+            self._log_async(f"{self.t['download_error']}{e}")
         finally:
-            self.root.after(0, self._download_finished)
+            self.ui.post(self._download_finished)
     
-    def _run_single_process(self, cmd):
-        with self.process_lock:
-            if self.stop_event.is_set():
-                return
+    def _download_finished(self):
+        self.download_running = False
+        self.status_board.clear()
+        self._close_event_writer()
+        self.start_btn.config(state="normal")
+        self.plan_btn.config(state="normal")
+        self.scan_archive_btn.config(state="normal")
+        self.queue_run_btn.config(state="normal")
+        self.stop_btn.config(state="disabled")
+        self.update_btn.config(state="normal")
+    
+    def stop_download(self):
+        if self.download_running and not self.runner.stop_event.is_set():
+            self.log("")
+            self.log(self.t["stopping_download"])
+            self.log(self.t["stop_hint"])
             
-            self.process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                text=True, bufsize=1, encoding='utf-8', errors='replace',
-                creationflags=SUBPROCESS_FLAGS
-            )
+            # Процессы завершаются в фоне, ход виден в строке статуса
+            self.stop_btn.config(state="disabled")
+            self.runner.stop()
+    
+    # ─── Очередь заданий ───
+    
+    def add_to_queue(self):
+        """Добавить текущие настройки как задание очереди."""
+        if not self.validate_inputs():
+            return
+        self._save_settings()
         
-        try:
-            for line in self.process.stdout:
-                if self.stop_event.is_set():
-                    break
-                line = line.rstrip()
-                if line:
-                    self._parse_progress_from_line(line)
-                    self.root.after(0, self.log, line)
-        finally:
-            try:
-                if self.process.stdout:
-                    self.process.stdout.close()
-            except Exception:
-                pass
+        priority = self._get_spinbox_value(self.job_priority, -99, 99)
+        job = self.job_queue.add(self._current_settings(), priority)
+        self.log(self.t["job_added"].format(id=job["id"], url=job["options"]["url"]))
+        self._refresh_queue_view()
+    
+    def import_jobs_file(self):
+        """Добавить задания из текстового файла (настройки окна — по умолчанию)."""
+        path = self.dialogs.select_file(os.path.expanduser("~"), self.t["select_jobs_file_title"])
+        if not path:
+            return
         
-        self.process.wait()
-        exit_code = self.process.returncode
+        try:
+            jobs = parse_job_file(path, self._current_settings())
+        except (OSError, ValueError) as e:
+            messagebox.showerror(self.t["error"], self.t["jobs_import_error"].format(error=e))
+            return
         
-        self.root.after(0, self.log, "")
-        if exit_code == 0:
-            self.root.after(0, self.log, "=" * 70)
-            self.root.after(0, self.log, f"{self.t['download_success']}".center(70))
-            self.root.after(0, self.log, "=" * 70)
-            if self.total_videos > 0:
-                self.downloaded_videos = self.total_videos
-                self.root.after(0, self._update_progress_display)
-        elif not self.stop_event.is_set():
-            self.root.after(0, self.log, f"{self.t['download_exit_code']}{exit_code}")
-            self.root.after(0, self.log, self.t["download_exit_hint"])
+        for options, priority in jobs:
+            self.job_queue.add(options, priority)
+        self.log(self.t["jobs_imported"].format(count=len(jobs)))
+        self._refresh_queue_view()
     
-    def _download_with_restart(self, mode, url, cookies, output_template, archive_path):
-        videos_downloaded_this_session = 0
-        consecutive_empty_runs = 0
+    def remove_selected_jobs(self):
+        for item in self.queue_tree.selection():
+            self.job_queue.remove(int(item))
+        self._refresh_queue_view()
+    
+    def clear_finished_jobs(self):
+        self.job_queue.clear_finished()
+        self._refresh_queue_view()
+    
+    def run_queue(self):
+        if self.download_running:
+            return
+        if not self.job_queue.has_pending():
+            self.log(self.t["queue_empty"])
+            return
         
-        while not self.stop_event.is_set():
-            cmd = self._build_command(mode, url, cookies, output_template, archive_path, max_downloads=1)
-            
-            with self.process_lock:
-                if self.stop_event.is_set():
-                    break
-                
-                self.process = subprocess.Popen(
-                    cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                    text=True, bufsize=1, encoding='utf-8', errors='replace',
-                    creationflags=SUBPROCESS_FLAGS
-                )
-            
-            downloaded_in_this_run = False
-            archive_skips_in_this_run = 0
+        self._save_settings()
+        self._reset_progress()
+        scheduler = JobScheduler(
+            self.job_queue, self._get_spinbox_value(self.job_concurrency, 1, MAX_CONCURRENT_JOBS),
+            lang=self.lang, on_progress=self._on_engine_progress, status_board=self.status_board,
+            breaker_cooldown=self._get_spinbox_value(self.breaker_cooldown, *RETRY_LIMITS["breaker_cooldown"]),
+            events=self._make_event_stream(),
+        )
+        self.log("")
+        self._start_runner(scheduler)
+    
+    def _refresh_queue_view(self):
+        """Перерисовать список заданий, если очередь изменилась."""
+        if self._queue_version == self.job_queue.version:
+            return
+        self._queue_version = self.job_queue.version
+        
+        self.queue_tree.delete(*self.queue_tree.get_children())
+        for job in self.job_queue.snapshot():
+            options = job["options"]
+            self.queue_tree.insert("", "end", iid=str(job["id"]), values=(
+                job["id"],
+                job["priority"],
+                self.t.get(f"job_status_{job['status']}", job["status"]),
+                self.t.get(f"mode_{options.get('mode')}", options.get("mode")),
+                options.get("url", ""),
+            ))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  КОНСОЛЬНЫЙ РЕЖИМ (без GUI)
+# ══════════════════════════════════════════════════════════════════════════════
+
+def build_cli_parser():
+    defaults = SettingsManager.DEFAULT_SETTINGS
+    parser = argparse.ArgumentParser(
+        description="YouTube Download Master — headless mode (servers, cron). "
+                    "Run without arguments to open the GUI.")
+    parser.add_argument("url", nargs="?", help="channel, playlist or video URL")
+    parser.add_argument("-o", "--outdir", default=os.getcwd(),
+                        help="output folder (default: current directory)")
+    parser.add_argument("-m", "--mode", choices=DownloadEngine.MODES, default=defaults["mode"])
+    parser.add_argument("--audio-source", choices=list(AUDIO_SOURCE_ALIASES), default="video",
+                        help="source for --mode audio")
+    parser.add_argument("-q", "--quality", choices=[q[0] for q in VIDEO_QUALITIES],
+                        default=defaults["video_quality"])
+    parser.add_argument("--audio-format", choices=AUDIO_FORMATS, default=defaults["audio_format"])
+    parser.add_argument("--bitrate", choices=[b[0] for b in AUDIO_BITRATES], default=defaults["audio_bitrate"],
+                        help="MP3/OGG bitrate, kbps")
+    parser.add_argument("--no-audio-pipeline", action="store_true",
+                        help="let yt-dlp convert audio after each download instead of a parallel ffmpeg stage")
+    parser.add_argument("--transcode-workers", type=int, default=defaults["transcode_workers"], metavar="N",
+                        help="parallel ffmpeg processes for audio, 0 — one per CPU core")
+    parser.add_argument("--library", default=defaults["media_library"], metavar="DIR",
+                        help="folder with already downloaded videos: audio of a channel/playlist is extracted "
+                             "from them instead of downloading again")
+    parser.add_argument("--cookies", default="", help="path to cookies.txt")
+    parser.add_argument("--restart", action="store_true",
+                        help="new yt-dlp process for each video (channel/playlist)")
+    parser.add_argument("--embedded", action="store_true", help="use the yt_dlp Python module")
+    parser.add_argument("-j", "--parallel", type=int, default=defaults["parallel_downloads"],
+                        help=f"parallel downloads for channel/playlist (1–{MAX_PARALLEL_DOWNLOADS})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="tune the number of parallel downloads by throughput and rate limiting (up to -j)")
+    parser.add_argument("--archive-backend", choices=sorted(ARCHIVE_BACKENDS), default=defaults["archive_backend"])
+    parser.add_argument("--retries", type=int, default=defaults["retry_attempts"],
+                        help="retries of each request inside yt-dlp (exponential pause)")
+    parser.add_argument("--retry-max-sleep", type=int, default=defaults["retry_max_sleep"],
+                        help="longest pause between retries, seconds")
+    parser.add_argument("--retry-budget", type=int, default=defaults["retry_budget"],
+                        help="total retries of failed videos per download")
+    parser.add_argument("--fragments", type=int, metavar="N",
+                        help="DASH/HLS fragments downloaded at once (default: auto by quality)")
+    parser.add_argument("--http-chunk-size", type=int, metavar="MIB",
+                        help="HTTP request chunk size, MiB, 0 — off (default: auto by quality)")
+    parser.add_argument("--buffer-size", type=int, metavar="KIB",
+                        help="download buffer size, KiB, 0 — yt-dlp default (default: auto by quality)")
+    parser.add_argument("--aria2c", action="store_true",
+                        help="download files through aria2c with several connections (if installed)")
+    parser.add_argument("--aria2-connections", type=int, default=defaults["aria2_connections"], metavar="N",
+                        help="aria2c connections per file (1–16)")
+    parser.add_argument("--aria2-split-size", type=int, default=defaults["aria2_split_size"], metavar="MIB",
+                        help="smallest part aria2c splits a file into, MiB")
+    parser.add_argument("--breaker-cooldown", type=int, default=defaults["breaker_cooldown"],
+                        help="pause of all downloads when YouTube rate-limits (HTTP 429), seconds")
+    parser.add_argument("--min-free-space", type=int, default=defaults["min_free_space"], metavar="GIB",
+                        help="pause before the next video while the download folder's disk has less free "
+                             "space, GiB, 0 — off")
+    parser.add_argument("--watch", type=float, metavar="MINUTES",
+                        help="daemon mode: repeat the sync every MINUTES until stopped")
+    parser.add_argument("--plan", action="store_true",
+                        help="only estimate the size and time of the download (formats are resolved and cached)")
+    parser.add_argument("--scan-archive", choices=ARCHIVE_ACTIONS, metavar="ACTION",
+                        help="check archive.txt of --outdir against the files on disk, without network: "
+                             "verify (report only), add (record videos found on disk), "
+                             "rebuild (rewrite the archive from disk)")
+    parser.add_argument("--full-scan", action="store_true",
+                        help="with --scan-archive: re-read every folder instead of only the changed ones")
+    parser.add_argument("--lang", choices=sorted(TRANSLATIONS), default="en", help="message language")
+    parser.add_argument("--event-log", default=str(EVENT_LOG_DIR), metavar="DIR",
+                        help="folder of the structured event log (rotating JSONL files)")
+    parser.add_argument("--no-event-log", action="store_true", help="do not write the event log")
+    parser.add_argument("--metrics-port", type=int, default=0, metavar="PORT",
+                        help="serve Prometheus metrics at http://HOST:PORT/metrics (0 — off)")
+    parser.add_argument("--metrics-host", default=METRICS_HOST,
+                        help=f"address of the metrics server (default: {METRICS_HOST}, this machine only)")
+    
+    queue_group = parser.add_argument_group("job queue")
+    queue_group.add_argument("--enqueue", action="store_true",
+                             help="add URL with the options above to the job queue instead of downloading")
+    queue_group.add_argument("--import-jobs", metavar="FILE",
+                             help="add jobs from a text file (one URL per line, optional key=value options)")
+    queue_group.add_argument("--priority", type=int, default=0, help="job priority (higher runs first)")
+    queue_group.add_argument("--run-queue", action="store_true", help="run pending jobs from the queue")
+    queue_group.add_argument("--concurrency", type=int, default=defaults["job_concurrency"],
+                             help=f"jobs running at the same time (1–{MAX_CONCURRENT_JOBS})")
+    queue_group.add_argument("--list-jobs", action="store_true", help="print the job queue and exit")
+    return parser
+
+
+def run_cli(argv):
+    """Консольный режим: загрузка без GUI.
+    
+    Returns:
+        Код завершения процесса (0 — успех, 1 — ошибка загрузки,
+        2 — неверные параметры, 130 — остановлено)
+    """
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch must be positive")
+    if not METRICS_LIMITS["metrics_port"][0] <= args.metrics_port <= METRICS_LIMITS["metrics_port"][1]:
+        parser.error("--metrics-port must be between 0 and 65535")
+    if not args.url and not (args.run_queue or args.import_jobs or args.list_jobs or args.scan_archive):
+        parser.error("URL is required (or use --run-queue / --import-jobs / --list-jobs / --scan-archive)")
+    if args.enqueue and not args.url:
+        parser.error("--enqueue requires a URL")
+    if args.plan and (args.watch or args.run_queue or args.enqueue):
+        parser.error("--plan cannot be combined with --watch, --run-queue or --enqueue")
+    if args.scan_archive and (args.plan or args.watch or args.run_queue or args.enqueue):
+        parser.error("--scan-archive cannot be combined with --plan, --watch, --run-queue or --enqueue")
+    t = TRANSLATIONS[args.lang]
+    
+    if args.url and not is_valid_url_format(args.url):
+        print(t["error_invalid_url"], file=sys.stderr)
+        return 2
+    if args.cookies and not os.path.exists(args.cookies):
+        print(t["error_cookies_not_found"].format(path=args.cookies), file=sys.stderr)
+        return 2
+    try:
+        os.makedirs(args.outdir, exist_ok=True)
+    except OSError as e:
+        print(t["error_create_folder"].format(path=args.outdir, error=e), file=sys.stderr)
+        return 2
+    
+    options = {
+        "mode": args.mode,
+        "url": args.url or "",
+        # Задания очереди могут запускаться из другой папки
+        "outdir": os.path.abspath(args.outdir),
+        "cookies": args.cookies,
+        "video_quality": args.quality,
+        "audio_format": args.audio_format,
+        "audio_bitrate": args.bitrate,
+        "audio_source": AUDIO_SOURCE_ALIASES[args.audio_source],
+        "restart_each_video": args.restart,
+        "embedded_engine": args.embedded,
+        "parallel_downloads": args.parallel,
+        "adaptive_parallel": args.adaptive,
+        "archive_backend": args.archive_backend,
+        "retry_attempts": args.retries,
+        "retry_max_sleep": args.retry_max_sleep,
+        "retry_budget": args.retry_budget,
+        "breaker_cooldown": args.breaker_cooldown,
+        "external_downloader": args.aria2c,
+        "aria2_connections": args.aria2_connections,
+        "aria2_split_size": args.aria2_split_size,
+        "audio_pipeline": not args.no_audio_pipeline,
+        "transcode_workers": args.transcode_workers,
+        "media_library": os.path.abspath(args.library) if args.library else "",
+        "min_free_space": args.min_free_space,
+    }
+    # Любое значение производительности, заданное вручную, отключает авто-режим
+    manual_performance = {"concurrent_fragments": args.fragments, "http_chunk_size": args.http_chunk_size,
+                          "buffer_size": args.buffer_size}
+    if any(value is not None for value in manual_performance.values()):
+        options["performance_auto"] = False
+        options.update({name: value for name, value in manual_performance.items() if value is not None})
+    
+    job_queue = None
+    if args.list_jobs or args.enqueue or args.import_jobs or args.run_queue:
+        job_queue = JobQueue()
+    if args.list_jobs:
+        for job in job_queue.snapshot():
+            print(f"#{job['id']:<5} {job['priority']:>4}  {job['status']:<8} "
+                  f"{job['options'].get('mode', ''):<9} {job['options'].get('url', '')}")
+        return 0
+    if args.import_jobs:
+        try:
+            jobs = parse_job_file(args.import_jobs, options)
+        except (OSError, ValueError) as e:
+            print(t["jobs_import_error"].format(error=e), file=sys.stderr)
+            return 2
+        for job_options, priority in jobs:
+            job_queue.add(job_options, priority)
+        print(t["jobs_imported"].format(count=len(jobs)))
+    if args.enqueue:
+        job = job_queue.add(options, args.priority)
+        print(t["job_added"].format(id=job["id"], url=args.url))
+    if (args.enqueue or args.import_jobs) and not args.run_queue:
+        return 0
+    
+    # Строки приходят из рабочих потоков движка
+    print_lock = threading.Lock()
+    
+    def print_line(line):
+        with print_lock:
+            print(line, flush=True)
+    
+    # Консоль — один из подписчиков потока событий, журнал JSONL — другой
+    events = EventStream()
+    events.subscribe(log_consumer(print_line))
+    event_writer = None
+    if not args.no_event_log:
+        event_writer = JsonlEventWriter(args.event_log)
+        events.subscribe(event_writer)
+    metrics_server = None
+    if args.metrics_port:
+        metrics = MetricsRegistry(queue_depth=job_queue.pending_count if job_queue is not None else None)
+        events.subscribe(metrics)
+        try:
+            metrics_server = MetricsServer(metrics, args.metrics_port, args.metrics_host)
+        except OSError as e:
+            print(t["metrics_error"].format(address=f"{args.metrics_host}:{args.metrics_port}", error=e),
+                  file=sys.stderr)
+            return 2
+        print_line(t["metrics_started"].format(url=metrics_server.url))
+    
+    stop_requested = threading.Event()
+    current = {"runner": None}
+    
+    def request_stop(signum=None, frame=None):
+        stop_requested.set()
+        if current["runner"] is not None:
+            current["runner"].stop()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    succeeded = False
+    try:
+        first_run = True
+        while not stop_requested.is_set():
+            if args.run_queue:
+                # В режиме демона каждый цикл снова синхронизирует все задания
+                if not first_run:
+                    job_queue.requeue_finished()
+                runner = JobScheduler(job_queue, args.concurrency, lang=args.lang, events=events,
+                                      breaker_cooldown=clamp_int_option(options, RETRY_LIMITS, "breaker_cooldown"))
+            elif args.scan_archive:
+                if args.full_scan:
+                    LibraryScanner().forget(options["outdir"])
+                runner = DownloadEngine(options, lang=args.lang, events=events, archive_action=args.scan_archive)
+            else:
+                runner = DownloadEngine(options, lang=args.lang, events=events, plan_only=args.plan)
+                for line in runner.summary_lines():
+                    print_line(line)
+                warning = None if args.plan else runner.disk_space_warning()
+                if warning:
+                    print_line(f"⚠️ {warning}")
+            current["runner"] = runner
+            first_run = False
             
+            # Загрузка в отдельном потоке — главный поток остаётся отзывчивым к Ctrl+C
+            result = []
+            worker = threading.Thread(target=lambda: result.append(runner.run()), daemon=True)
+            worker.start()
             try:
-                for line in self.process.stdout:
-                    if self.stop_event.is_set():
-                        break
-                    line = line.rstrip()
-                    if line:
-                        self._parse_progress_from_line(line)
-                        self.root.after(0, self.log, line)
-                        # Только РЕАЛЬНЫЕ скачивания считаем для restart
-                        if self._is_download_complete_line(line):
-                            downloaded_in_this_run = True
-                        # Считаем архивные пропуски отдельно
-                        elif self._is_archive_skip_line(line):
-                            archive_skips_in_this_run += 1
-            finally:
-                try:
-                    if self.process.stdout:
-                        self.process.stdout.close()
-                except Exception:
-                    pass
+                while worker.is_alive():
+                    worker.join(0.5)
+            except KeyboardInterrupt:
+                print_line("")
+                print_line(t["stopping_download"])
+                request_stop()
+                worker.join()
+            # Дочерние процессы завершаются в фоне — выходим после них
+            runner.wait_stopped()
+            succeeded = bool(result and result[0])
             
-            self.process.wait()
-            exit_code = self.process.returncode
-            
-            if self.stop_event.is_set():
+            if not args.watch or stop_requested.is_set():
                 break
-            
-            if downloaded_in_this_run:
-                videos_downloaded_this_session += 1
-                consecutive_empty_runs = 0
-                self.root.after(0, self.log, "")
-                self.root.after(0, self.log, self.t["restarting_process"].format(count=videos_downloaded_this_session))
-                self.root.after(0, self.log, "")
-            else:
-                # Если были только архивные пропуски или вообще ничего — это пустой запуск
-                consecutive_empty_runs += 1
-                
-                # Выходим если: успешный код ИЛИ много пустых запусков ИЛИ много архивных пропусков подряд
-                should_stop = (
-                    exit_code == 0 or 
-                    consecutive_empty_runs >= MAX_CONSECUTIVE_EMPTY_RUNS or
-                    archive_skips_in_this_run > 0  # Все видео уже в архиве
-                )
-                
-                if should_stop:
-                    self.root.after(0, self.log, "")
-                    self.root.after(0, self.log, "=" * 70)
-                    self.root.after(0, self.log, f"{self.t['all_videos_downloaded']}".center(70))
-                    self.root.after(0, self.log, "=" * 70)
-                    if self.total_videos > 0:
-                        self.downloaded_videos = self.total_videos
-                        self.root.after(0, self._update_progress_display)
-                    break
-    
-    def _download_finished(self):
-        with self.process_lock:
-            self.process = None
-        self.start_btn.config(state="normal")
-        self.stop_btn.config(state="disabled")
-        self.update_btn.config(state="normal")
+            print_line(t["cli_next_run"].format(minutes=args.watch))
+            stop_requested.wait(args.watch * 60)
+    except KeyboardInterrupt:
+        request_stop()
+    finally:
+        close_archive_stores()
+        if metrics_server is not None:
+            metrics_server.close()
+        if event_writer is not None:
+            event_writer.close()
+            if event_writer.error is not None:
+                print(t["event_log_error"].format(path=event_writer.path, error=event_writer.error),
+                      file=sys.stderr)
     
-    def stop_download(self):
-        with self.process_lock:
-            if self.process and not self.stop_event.is_set():
-                self.log("")
-                self.log(self.t["stopping_download"])
-                self.log(self.t["stop_hint"])
-                
-                self.stop_event.set()
-                
-                try:
-                    self.process.terminate()
-                    try:
-                        self.process.wait(timeout=PROCESS_TERMINATE_TIMEOUT)
-                    except subprocess.TimeoutExpired:
-                        self.process.kill()
-                        self.process.wait(timeout=PROCESS_KILL_TIMEOUT)
-                except Exception:
-                    pass
+    if stop_requested.is_set():
+        return 130
+    return 0 if succeeded else 1
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -2031,6 +7340,18 @@ class YouTubeDownloader:
 # ══════════════════════════════════════════════════════════════════════════════
 
 def main():
+    if sys.version_info < MIN_PYTHON:
+        version = ".".join(map(str, MIN_PYTHON))
+        print(f"Python {version}+ is required / Требуется Python {version} или новее "
+              f"(current / текущая: {sys.version.split()[0]})", file=sys.stderr)
+        sys.exit(1)
+    
+    # С аргументами — консольный режим без GUI (tkinter не загружается)
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    
+    load_tkinter()
+    
     # DPI awareness для Windows
     if sys.platform == 'win32':
         try:
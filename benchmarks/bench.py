@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Сквозные бенчмарки DownloadEngine на заглушках yt-dlp и ffmpeg (без сети).
+
+Каждый сценарий выполняется в отдельном процессе (чтобы пиковая память
+не накапливалась между сценариями): движок запускается как в консольном
+режиме, но команды yt-dlp и ffmpeg подменены на fake_ytdlp.py и
+fake_ffmpeg.py. Измеряются:
+    lines/s      строк вывода yt-dlp, разобранных движком за секунду
+    per video    время сеанса на один ролик (накладные расходы без сети)
+    UI latency   задержка от печати строки заглушкой до её выборки окном
+                 (выборка как в окне: раз в LOG_REFRESH_MS, не больше
+                 LOG_MAX_LINES_PER_FRAME строк за кадр)
+    RSS          пиковая память процесса приложения (ru_maxrss)
+
+Примеры:
+    python benchmarks/bench.py
+    python benchmarks/bench.py -s lines -s parallel --items 200
+    python benchmarks/bench.py --json after.json --baseline before.json
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_PATH = BENCH_DIR.parent / "YouTube Download Master.py"
+FAKE_YTDLP = BENCH_DIR / "fake_ytdlp.py"
+FAKE_FFMPEG = BENCH_DIR / "fake_ffmpeg.py"
+
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLbenchmark"
+STAMP_MARK = "[bench] stamp "
+
+# Сценарии: описание, настройки движка, окружение заглушек ({items}, {progress} — из аргументов)
+SCENARIOS = {
+    "lines": {
+        "description": "one video, flood of progress lines (single process)",
+        "options": {"mode": "video", "url": "https://www.youtube.com/watch?v=benchlines1"},
+        "env": {"FAKE_YTDLP_PROGRESS": "{lines}", "FAKE_YTDLP_STAMP_EVERY": "100"},
+    },
+    "playlist": {
+        "description": "playlist in one yt-dlp process",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_STAMP_EVERY": "10"},
+    },
+    "skips": {
+        "description": "playlist, half of it already in the archive",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}"},
+        "archived": 0.5,
+    },
+    "restart": {
+        "description": "one yt-dlp process per video",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL, "restart_each_video": True},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_STAMP_EVERY": "10"},
+    },
+    "parallel": {
+        "description": "4 parallel workers",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL, "parallel_downloads": 4},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_STAMP_EVERY": "10"},
+    },
+    "errors": {
+        "description": "2 workers, every 5th video unavailable",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL, "parallel_downloads": 2},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_FAIL_EVERY": "5"},
+    },
+    "existing": {
+        "description": "2 workers, every 3rd video already on disk (\"has already been downloaded\")",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL, "parallel_downloads": 2},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_EXISTING": "3"},
+    },
+    "flaky": {
+        "description": "4 workers, every video retried once after a connection reset (info JSON from cache)",
+        "options": {"mode": "playlist", "url": PLAYLIST_URL, "parallel_downloads": 4, "retry_max_sleep": 1},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}", "FAKE_YTDLP_FLAKY": "1"},
+    },
+    "audio": {
+        "description": "audio from a playlist, 2 workers + ffmpeg transcode pipeline",
+        "options": {"mode": "audio", "audio_source": "audio_playlist", "url": PLAYLIST_URL,
+                    "parallel_downloads": 2, "audio_pipeline": True, "audio_format": "mp3"},
+        "env": {"FAKE_YTDLP_ITEMS": "{items}", "FAKE_YTDLP_PROGRESS": "{progress}"},
+    },
+}
+
+# Метрики для сравнения с базовым прогоном: (ключ, подпись, больше — лучше)
+COMPARED = (
+    ("lines_per_second", "lines/s", True),
+    ("per_video_ms", "per video ms", False),
+    ("latency_p95_ms", "UI p95 ms", False),
+    ("rss_mib", "RSS MiB", False),
+)
+
+
+def load_app():
+    """Загрузить модуль приложения и подменить команды yt-dlp/ffmpeg заглушками."""
+    spec = importlib.util.spec_from_file_location("ytdm", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    app.YTDLP_COMMAND = [sys.executable, str(FAKE_YTDLP)]
+    app.FFMPEG_COMMAND = [sys.executable, str(FAKE_FFMPEG)]
+    return app
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КиБ, macOS — байты
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class UiPoller:
+    """Выборка лога как в окне: раз в LOG_REFRESH_MS, не больше LOG_MAX_LINES_PER_FRAME строк."""
+
+    def __init__(self, app):
+        self.app = app
+        self.sink = app.LogSink()
+        self.latencies = []
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._poll(None)
+
+    def _run(self):
+        while not self._stop.wait(self.app.LOG_REFRESH_MS / 1000):
+            self._poll(self.app.LOG_MAX_LINES_PER_FRAME)
+
+    def _poll(self, max_lines):
+        lines, dropped = self.sink.drain(max_lines)
+        now = time.time()
+        self.dropped += dropped
+        for line in lines:
+            index = line.find(STAMP_MARK)
+            if index >= 0:
+                self.latencies.append(now - float(line[index + len(STAMP_MARK):]))
+
+
+def run_scenario(name, items, progress, lines, use_tracemalloc):
+    """Выполнить сценарий в текущем процессе. Returns: словарь результатов."""
+    scenario = SCENARIOS[name]
+    values = {"items": items, "progress": progress, "lines": lines}
+    for key, value in scenario["env"].items():
+        os.environ[key] = value.format(**values)
+
+    app = load_app()
+    workdir = Path(tempfile.mkdtemp(prefix=f"ytdm-bench-{name}-"))
+    app.REPORT_DIR = workdir / "reports"
+    try:
+        if scenario.get("archived"):
+            # Старые ролики плейлиста (с меньшими номерами) уже скачаны
+            with open(workdir / "archive.txt", "w", encoding="utf-8") as f:
+                for number in range(1, int(items * scenario["archived"]) + 1):
+                    f.write(f"youtube bench{number:06d}\n")
+
+        poller = UiPoller(app)
+        engine = counting_engine(app)(dict(scenario["options"], outdir=str(workdir)), lang="en",
+                                      on_log=poller.sink.write)
+        engine.listing_cache = app.ListingCache(workdir / "listings")
+        engine.info_cache = app.InfoJsonCache(workdir / "info")
+
+        if use_tracemalloc:
+            tracemalloc.start()
+        poller.start()
+        started = time.perf_counter()
+        ok = engine.run()
+        seconds = time.perf_counter() - started
+        poller.stop()
+        python_peak = tracemalloc.get_traced_memory()[1] if use_tracemalloc else None
+        tracemalloc.stop()
+        app.close_archive_stores()
+
+        report = engine.report.to_dict()
+        lines_seen = next(engine.line_counter)
+        videos = report["videos"] + report["failed"] + report["skipped"]
+        return {
+            "scenario": name,
+            "ok": ok,
+            "videos": report["videos"],
+            "failed": report["failed"],
+            "skipped": report["skipped"],
+            "lines": lines_seen,
+            "seconds": round(seconds, 3),
+            "lines_per_second": round(lines_seen / seconds) if seconds else None,
+            "per_video_ms": round(seconds * 1000 / videos, 2) if videos else None,
+            "latency_p50_ms": ms(percentile(poller.latencies, 0.5)),
+            "latency_p95_ms": ms(percentile(poller.latencies, 0.95)),
+            "latency_max_ms": ms(max(poller.latencies, default=None)),
+            "dropped_lines": poller.dropped,
+            "info_cache_hits": report["info_cache"]["hits"],
+            "info_cache_misses": report["info_cache"]["misses"],
+            "rss_mib": peak_rss_mib(),
+            "python_peak_mib": round(python_peak / 2 ** 20, 1) if python_peak is not None else None,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def counting_engine(app):
+    """Подкласс DownloadEngine, считающий строки вывода yt-dlp (из всех воркеров)."""
+    class CountingEngine(app.DownloadEngine):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # next() у itertools.count атомарен — блокировка для воркеров не нужна
+            self.line_counter = itertools.count()
+
+        def _dispatch_output_line(self, line, key=""):
+            next(self.line_counter)
+            return super()._dispatch_output_line(line, key)
+
+    return CountingEngine
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def run_in_child(name, args):
+    """Выполнить сценарий в отдельном процессе. Returns: словарь результатов."""
+    cmd = [sys.executable, __file__, "--child", name, "--items", str(args.items),
+           "--progress", str(args.progress), "--lines", str(args.lines)]
+    if args.tracemalloc:
+        cmd.append("--tracemalloc")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_results(results, baseline):
+    header = (f"{'scenario':<10} {'videos':>6} {'fail':>4} {'skip':>4} {'seconds':>8} {'lines/s':>9} "
+              f"{'per video ms':>12} {'UI p50/p95/max ms':>19} {'RSS MiB':>8}")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        latency = "/".join("-" if result[key] is None else f"{result[key]:g}"
+                           for key in ("latency_p50_ms", "latency_p95_ms", "latency_max_ms"))
+        print(f"{result['scenario']:<10} {result['videos']:>6} {result['failed']:>4} {result['skipped']:>4} "
+              f"{result['seconds']:>8.2f} {result['lines_per_second'] or 0:>9} "
+              f"{result['per_video_ms'] or 0:>12} {latency:>19} {result['rss_mib'] or 0:>8}")
+
+    if not baseline:
+        return
+    print()
+    print("Compared with the baseline (+ is better):")
+    before = {result["scenario"]: result for result in baseline["results"]}
+    for result in results:
+        old = before.get(result["scenario"])
+        if not old:
+            continue
+        changes = []
+        for key, label, higher_is_better in COMPARED:
+            if result.get(key) and old.get(key):
+                change = (result[key] - old[key]) / old[key] * 100
+                changes.append(f"{label} {change if higher_is_better else -change:+.1f}%")
+        print(f"  {result['scenario']:<10} " + ", ".join(changes))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks of the download engine with a fake yt-dlp.")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--items", type=int, default=100, help="videos in the fake playlist (default: 100)")
+    parser.add_argument("--progress", type=int, default=20, help="progress lines per video (default: 20)")
+    parser.add_argument("--lines", type=int, default=200000,
+                        help="progress lines in the 'lines' scenario (default: 200000)")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report the Python allocation peak (slows the run down)")
+    parser.add_argument("--json", metavar="FILE", help="write the results to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results saved by --json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        result = run_scenario(args.child, args.items, args.progress, args.lines, args.tracemalloc)
+        print(json.dumps(result))
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    for name in args.scenario or SCENARIOS:
+        print(f"… {name}: {SCENARIOS[name]['description']}", file=sys.stderr, flush=True)
+        results.append(run_in_child(name, args))
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "items": args.items, "progress": args.progress, "lines": args.lines,
+                       "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
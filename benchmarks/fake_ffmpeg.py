@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Заглушка ffmpeg для бенчмарков: «перекодирует» файл -i в последний аргумент.
+
+Поведение задаётся переменными окружения:
+    FAKE_FFMPEG_SECONDS  длительность перекодирования, секунд (0)
+    FAKE_FFMPEG_FAIL     подстрока имени исходного файла, на котором ffmpeg падает ("")
+    FAKE_FFMPEG_RATIO    размер результата относительно исходника (0.1)
+"""
+
+import os
+import sys
+import time
+
+
+def main(argv):
+    if "-version" in argv:
+        print("ffmpeg version 99.0-fake")
+        return 0
+    source = argv[argv.index("-i") + 1]
+    target = argv[-1]
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_SECONDS", 0)))
+
+    fail = os.environ.get("FAKE_FFMPEG_FAIL", "")
+    if fail and fail in os.path.basename(source):
+        print(f"{source}: Invalid data found when processing input", file=sys.stderr)
+        return 1
+    size = int(os.path.getsize(source) * float(os.environ.get("FAKE_FFMPEG_RATIO", 0.1)))
+    with open(target, "wb") as f:
+        f.truncate(size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
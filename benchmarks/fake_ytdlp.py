@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Заглушка yt-dlp для бенчмарков: воспроизводит вывод yt-dlp без сети.
+
+Понимает аргументы, которые строит DownloadEngine: -o (и "infojson:"), -f, -j,
+--flat-playlist, --print, --progress-template, --download-archive,
+--playlist-reverse, --no-playlist, --max-downloads, --write-info-json,
+--load-info-json. Адрес с watch?v= — один
+ролик, любой другой — плейлист. Файлы создаются пустыми (разреженными) нужного размера.
+
+Поведение задаётся переменными окружения:
+    FAKE_YTDLP_ITEMS        роликов в плейлисте (10)
+    FAKE_YTDLP_PROGRESS     строк прогресса на ролик (20)
+    FAKE_YTDLP_RATE         строк прогресса в секунду, 0 — без ограничения (0)
+    FAKE_YTDLP_SIZE         размер файла ролика, байт (1048576)
+    FAKE_YTDLP_DURATION     длительность ролика в info JSON (-j), секунд (300)
+    FAKE_YTDLP_NOISE        текстовых строк на ролик ([info], Destination...) (3)
+    FAKE_YTDLP_STAMP_EVERY  строка «[bench] stamp <время>» каждые N строк прогресса, 0 — нет (0)
+    FAKE_YTDLP_STARTUP      задержка запуска процесса, секунд (0)
+    FAKE_YTDLP_MERGE        длительность склейки форматов, секунд (0 — без [Merger])
+    FAKE_YTDLP_FAIL_EVERY   каждый N-й ролик плейлиста завершается ошибкой, 0 — нет (0)
+    FAKE_YTDLP_ERROR        строка ошибки ("ERROR: [youtube] {id}: Video unavailable")
+    FAKE_YTDLP_EXIT         код завершения при ошибке (1)
+    FAKE_YTDLP_FLAKY        1 — первая попытка каждого ролика обрывается сетевой ошибкой посреди загрузки (0)
+    FAKE_YTDLP_EXISTING     каждый N-й ролик уже лежит на диске («has already been downloaded»), 0 — нет (0)
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+PROGRESS_PREFIX = "download:"
+TEMPLATE_FIELD = re.compile(r'%\((\w+)\)(0?\d*)([sd])')
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def option(argv, name):
+    """Значение опции name или None."""
+    if name in argv:
+        index = argv.index(name)
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return None
+
+
+def output_template(argv, kind):
+    """Шаблон -o "kind:..." (например, infojson) или None."""
+    prefix = f"{kind}:"
+    for name, value in zip(argv, argv[1:]):
+        if name == "-o" and value.startswith(prefix):
+            return value[len(prefix):]
+    return None
+
+
+def playlist_entries(url):
+    """Ролики плейлиста в порядке источника (новые первыми, как у YouTube)."""
+    count = env_int("FAKE_YTDLP_ITEMS", 10)
+    return [{"id": f"bench{number:06d}", "title": f"Bench video {number}", "url": None, "ie_key": "Youtube",
+             "playlist_title": "Bench playlist", "playlist_uploader": "Bench channel"}
+            for number in range(count, 0, -1)]
+
+
+def fill_template(template, fields):
+    def replace(match):
+        value = fields.get(match.group(1), "NA")
+        if match.group(3) == "d":
+            return f"%{match.group(2)}d" % int(value)
+        return str(value)
+    return TEMPLATE_FIELD.sub(replace, template)
+
+
+def info_json(entry, argv):
+    """Ответ -j: info JSON с выбранным форматом (склейка — два requested_formats)."""
+    size = env_int("FAKE_YTDLP_SIZE", 1024 * 1024)
+    info = dict(entry, ext="webm", duration=env_int("FAKE_YTDLP_DURATION", 300), formats=[])
+    if "+" in (option(argv, "-f") or ""):
+        info["requested_formats"] = [{"format_id": "313", "filesize": size * 9 // 10},
+                                     {"format_id": "251", "filesize_approx": size - size * 9 // 10}]
+    else:
+        info["format_id"] = "251"
+        info["filesize"] = size
+    return info
+
+
+def emit(line):
+    sys.stdout.write(line + "\n")
+
+
+def download(entry, number, total, argv, in_playlist):
+    """Вывод yt-dlp для одного ролика. Returns: True, если ролик скачан."""
+    video_id = entry["id"]
+    template = option(argv, "-o") or "%(title)s [%(id)s].%(ext)s"
+    size = env_int("FAKE_YTDLP_SIZE", 1024 * 1024)
+    lines = env_int("FAKE_YTDLP_PROGRESS", 20)
+    rate = env_float("FAKE_YTDLP_RATE", 0)
+    stamp_every = env_int("FAKE_YTDLP_STAMP_EVERY", 0)
+    fail_every = env_int("FAKE_YTDLP_FAIL_EVERY", 0)
+
+    if in_playlist:
+        emit(f"[download] Downloading item {number} of {total}")
+    noise = [f"[youtube] {video_id}: Downloading webpage", f"[youtube] {video_id}: Downloading player API JSON",
+             f"[info] {video_id}: Downloading 1 format(s): 251"]
+    for index in range(env_int("FAKE_YTDLP_NOISE", 3)):
+        emit(noise[index % len(noise)])
+
+    # Номер ролика в плейлисте — и когда пул скачивает его отдельным процессом по watch?v=
+    match = re.fullmatch(r'bench(\d+)', video_id)
+    position = int(match.group(1)) if match else number
+    if fail_every and position % fail_every == 0:
+        error = os.environ.get("FAKE_YTDLP_ERROR", "ERROR: [youtube] {id}: Video unavailable")
+        emit(error.format(id=video_id))
+        return False
+
+    fields = {
+        "id": video_id, "title": entry["title"], "ext": "webm", "uploader": entry["playlist_uploader"],
+        "playlist_title": entry["playlist_title"], "playlist_autonumber": number, "playlist_index": number,
+    }
+    infojson = output_template(argv, "infojson")
+    if "--write-info-json" in argv and infojson:
+        path = fill_template(infojson, fields).replace("%%", "%") + ".info.json"
+        if os.path.exists(path):
+            emit("[info] Video metadata is already present")
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(info_json(entry, argv), f)
+            emit(f"[info] Writing video metadata as JSON to: {path}")
+
+    filename = fill_template(template, fields)
+    existing_every = env_int("FAKE_YTDLP_EXISTING", 0)
+    if existing_every and position % existing_every == 0:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, "wb") as f:
+            f.truncate(size)
+        emit(f"[download] {filename} has already been downloaded")
+        sys.stdout.flush()
+        return True
+    emit(f"[download] Destination: {filename}")
+    # Первая попытка «нестабильного» ролика обрывается на середине (отметка — рядом с файлом)
+    flaky_mark = filename + ".flaky"
+    flaky = os.environ.get("FAKE_YTDLP_FLAKY") == "1" and not os.path.exists(flaky_mark)
+    progress_template = option(argv, "--progress-template")
+    started = time.time()
+    for index in range(1, lines + 1):
+        done = size * index // (lines + 1)
+        elapsed = max(time.time() - started, 1e-3)
+        if progress_template and progress_template.startswith(PROGRESS_PREFIX):
+            emit("[ytdm] " + json.dumps({
+                "status": "downloading", "downloaded_bytes": done, "total_bytes": size,
+                "total_bytes_estimate": None, "speed": done / elapsed, "eta": 1, "fragment_index": None,
+                "fragment_count": None, "filename": filename, "text": f"{done * 100 / size:5.1f}%",
+                "id": video_id, "playlist_index": number}))
+        else:
+            emit(f"[download] {done * 100 / size:5.1f}% of {size}B at {done / elapsed:.0f}B/s ETA 00:01")
+        if stamp_every and index % stamp_every == 0:
+            emit(f"[bench] stamp {time.time():.6f}")
+        if rate:
+            sys.stdout.flush()
+            time.sleep(1 / rate)
+        if flaky and index * 2 >= lines:
+            os.makedirs(os.path.dirname(flaky_mark) or ".", exist_ok=True)
+            open(flaky_mark, "w").close()
+            emit("ERROR: unable to download video data: <urlopen error [Errno 104] Connection reset by peer>")
+            return False
+    if os.path.exists(flaky_mark):
+        os.remove(flaky_mark)
+
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, "wb") as f:
+        f.truncate(size)
+    if progress_template:
+        emit("[ytdm] " + json.dumps({
+            "status": "finished", "downloaded_bytes": size, "total_bytes": size, "filename": filename,
+            "text": f"100% of {size}B", "id": video_id, "playlist_index": number}))
+    else:
+        emit(f"[download] 100% of {size}B")
+
+    merge = env_float("FAKE_YTDLP_MERGE", 0)
+    if merge:
+        emit(f'[Merger] Merging formats into "{filename}"')
+        sys.stdout.flush()
+        time.sleep(merge)
+    sys.stdout.flush()
+    return True
+
+
+def main(argv):
+    if "--version" in argv:
+        emit("2099.01.01 (fake)")
+        return 0
+    time.sleep(env_float("FAKE_YTDLP_STARTUP", 0))
+    url = argv[-1]
+
+    match = re.search(r'[?&]v=([\w-]+)', url)
+    info_path = option(argv, "--load-info-json")
+    if info_path:
+        with open(info_path, encoding="utf-8") as f:
+            entries = [json.load(f)]
+        match = True
+    elif match:
+        # Ролик плейлиста, который пул скачивает отдельным процессом, сохраняет своё название
+        video_id = match.group(1)
+        entries = [entry for entry in playlist_entries(url) if entry["id"] == video_id] or [
+            {"id": video_id, "title": f"Bench video {video_id}", "url": url, "ie_key": "Youtube",
+             "playlist_title": "NA", "playlist_uploader": "Bench channel"}]
+    else:
+        entries = playlist_entries(url)
+
+    if "--flat-playlist" in argv:
+        for entry in entries:
+            emit(json.dumps(entry))
+        return 0
+    if "-j" in argv:
+        for entry in entries:
+            emit(json.dumps(info_json(entry, argv)))
+        return 0
+
+    in_playlist = not match and "--no-playlist" not in argv
+    if "--playlist-reverse" in argv:
+        entries.reverse()
+    archive_path = option(argv, "--download-archive")
+    archived = set()
+    if archive_path and os.path.exists(archive_path):
+        with open(archive_path, encoding="utf-8") as f:
+            archived = {line.strip() for line in f}
+    max_downloads = int(option(argv, "--max-downloads") or 0)
+
+    downloaded = 0
+    for number, entry in enumerate(entries, 1):
+        if f"youtube {entry['id']}" in archived:
+            emit(f"[download] {entry['title']} has already been recorded in the archive")
+            continue
+        if not download(entry, number, len(entries), argv, in_playlist):
+            return env_int("FAKE_YTDLP_EXIT", 1)
+        if archive_path:
+            with open(archive_path, "a", encoding="utf-8") as f:
+                f.write(f"youtube {entry['id']}\n")
+        downloaded += 1
+        if max_downloads and downloaded >= max_downloads:
+            emit("[info] Maximum number of downloads reached, stopping due to --max-downloads")
+            return 101
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))